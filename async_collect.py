@@ -0,0 +1,469 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: async_collect
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# asyncio based collection engine.
+#
+# This is an alternative to utils.conn_and_get_output for very large device
+# lists.  Instead of one thread (and one paramiko transport) per device, every
+# device runs as a task inside a single event loop using asyncssh, so thousands
+# of sessions can be in flight at once.
+#
+# The inputs and outputs mirror utils.conn_and_get_output: a Netmiko style
+# device dictionary and a list of commands in, the "!--- cmd" sectioned text out.
+#
+# asyncssh is an optional dependency:
+#
+#     uv pip install ".[async]"
+
+import asyncio
+import contextlib
+import re
+import socket
+import time
+
+import jump_hosts
+import session_limits
+import utils
+
+try:
+    import asyncssh
+except ImportError:  # pragma: no cover
+    asyncssh = None
+
+
+# Prompt at the end of the buffer, e.g. "switch01#", "switch01>", "(Cisco Controller) >"
+PROMPT_REGEX = re.compile(r"[>#]\s*$")
+
+# Login prompts presented inside the shell by devices like the AireOS WLC
+USER_REGEX = re.compile(r"(User|Username|login)\s*:\s*$", re.IGNORECASE)
+PASSWORD_REGEX = re.compile(r"Password\s*:\s*$", re.IGNORECASE)
+
+READ_SIZE = 65536
+
+# Commands that turn paging off, by device_type regex, as Netmiko session_preparation sends them.
+# The first match wins; the last entry covers IOS, IOS-XE, NX-OS and IOS-XR.
+PAGING_COMMANDS = [
+    (re.compile(r"wlc"), ["config paging disable"]),
+    (re.compile(r"asa"), ["terminal pager 0"]),
+    (re.compile(r""), ["terminal length 0", "terminal width 511"]),
+]
+
+
+def check_asyncssh():
+    """
+    Exit with a helpful message if the optional asyncssh module is not installed.
+    """
+    if asyncssh is None:
+        print(
+            "ERROR! The asyncssh module is required for the asyncio collection engine."
+            '\nInstall it with: uv pip install ".[async]"  or  pip install asyncssh'
+        )
+        exit("asyncssh not installed. Aborting Execution.")
+
+
+async def read_until(process, pattern, timeout):
+    """
+    Read from the shell until the buffer matches the compiled regex pattern, returning the buffer.
+    """
+    buffer = ""
+    async with asyncio.timeout(timeout):
+        while not pattern.search(buffer):
+            chunk = await process.stdout.read(READ_SIZE)
+            if not chunk:
+                raise ConnectionError("Channel closed while waiting for prompt")
+            buffer += chunk
+    return buffer
+
+
+async def drain(process, quiet=0.2):
+    """
+    Discard any output still arriving on the shell until it has been quiet for the given number of seconds.
+    """
+    while True:
+        try:
+            chunk = await asyncio.wait_for(process.stdout.read(READ_SIZE), quiet)
+        except TimeoutError:
+            return
+        if not chunk:
+            return
+
+
+async def find_prompt(process, dev_dict, timeout):
+    """
+    Wait for the initial device prompt, answering in-shell login prompts, and return the prompt string.
+    """
+    pattern = re.compile(
+        f"{PROMPT_REGEX.pattern}|{USER_REGEX.pattern}|{PASSWORD_REGEX.pattern}",
+        re.IGNORECASE,
+    )
+    try:
+        buffer = await read_until(process, pattern, min(timeout, 5))
+    except TimeoutError:
+        # Some devices only print the prompt once they see a keystroke
+        process.stdin.write("\n")
+        buffer = await read_until(process, pattern, timeout)
+
+    while True:
+        last_line = buffer.replace("\r", "").split("\n")[-1]
+        if USER_REGEX.search(last_line):
+            process.stdin.write(f"{dev_dict['username']}\n")
+        elif PASSWORD_REGEX.search(last_line):
+            process.stdin.write(f"{dev_dict['password']}\n")
+        else:
+            # Make sure no stray prompts are left to be mistaken for command output
+            await drain(process)
+            return last_line.strip()
+        buffer = await read_until(process, pattern, timeout)
+
+
+def paging_commands(device_type):
+    """
+    Return the commands that turn paging off for a Netmiko device_type.
+    """
+    for regex, cmds in PAGING_COMMANDS:
+        if regex.search(device_type or ""):
+            return cmds
+    return []
+
+
+async def disable_paging(process, dev_dict, prompt_regex, timeout):
+    """
+    Turn paging off so long output is not held at --More-- whatever the command list starts with.
+    """
+    for cmd in paging_commands(dev_dict.get("device_type")):
+        process.stdin.write(f"{cmd}\n")
+        await read_until(process, prompt_regex, timeout)
+
+
+def clean_output(raw, cmd):
+    """
+    Strip the echoed command and the trailing prompt from raw shell output, as Netmiko send_command does.
+    """
+    lines = raw.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    # Drop the trailing prompt line
+    if lines:
+        lines = lines[:-1]
+    # Drop the echoed command line
+    if lines and cmd.strip() in lines[0]:
+        lines = lines[1:]
+    return "\n".join(lines)
+
+
+async def open_socket(dev_dict, timeout):
+    """
+    Open a non-blocking TCP socket to the device so the TCP connect can be timed apart from the SSH handshake.
+    """
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(
+        dev_dict["ip"], int(dev_dict.get("port", 22)), type=socket.SOCK_STREAM
+    )
+    family, type_, proto, _, address = infos[0]
+    sock = socket.socket(family, type_, proto)
+    sock.setblocking(False)
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, address), timeout)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def iter_show_output_async(
+    dev_dict,
+    cmd_list,
+    debug=False,
+    cmd_timeout=60,
+    conn_timeout=30,
+    records=None,
+    timings=None,
+):
+    """
+    Connect to a network device with asyncssh and yield a (cmd, section) tuple as each show command finishes.
+
+    Nothing is yielded if the device cannot be reached or authenticated, like utils.iter_show_output,
+    and per-command manifest records and connection phase timings are collected in the same way.
+    """
+    check_asyncssh()
+    if timings is None:
+        timings = {}
+
+    start = time.perf_counter()
+    slot = None
+    try:
+        # Wait for a login token and session slot (see session_limits)
+        slot = await session_limits.acquire_async(dev_dict)
+        # Devices behind a jump host are tunnelled over its shared connection (see jump_hosts)
+        tunnel = await jump_hosts.get_tunnel_async(dev_dict, conn_timeout)
+        if tunnel is not None:
+            target = {
+                "host": dev_dict["ip"],
+                "port": int(dev_dict.get("port") or 22),
+                "tunnel": tunnel,
+            }
+        else:
+            target = {"sock": await open_socket(dev_dict, conn_timeout)}
+        timings["tcp_connect"] = round(time.perf_counter() - start, 3)
+        auth_start = time.perf_counter()
+        conn = await asyncio.wait_for(
+            asyncssh.connect(
+                **target,
+                username=dev_dict["username"],
+                password=dev_dict["password"],
+                known_hosts=None,
+                client_keys=None,
+            ),
+            timeout=conn_timeout,
+        )
+        timings["auth"] = round(time.perf_counter() - auth_start, 3)
+    except (OSError, asyncssh.Error, asyncio.TimeoutError) as e:
+        print(f"Cannot connect to device {dev_dict['ip']}.")
+        print(e)
+        status = f"connect failed: {type(e).__name__}"
+        utils.record_section(records, None, "", time.perf_counter() - start, status)
+        if slot is not None:
+            slot.release()
+        return
+    except BaseException:
+        # Cancelled while waiting or connecting
+        if slot is not None:
+            slot.release()
+        raise
+
+    try:
+        async with conn:
+            prompt_start = time.perf_counter()
+            process = await conn.create_process(term_type="vt100", term_size=(511, 24))
+            try:
+                prompt = await find_prompt(process, dev_dict, conn_timeout)
+                # Match the prompt by its base (hostname) so mode changes like (config)# still match
+                base_prompt = re.escape(prompt[:-1].strip())
+                prompt_regex = re.compile(f"{base_prompt}.*[>#]\\s*$")
+                await disable_paging(process, dev_dict, prompt_regex, conn_timeout)
+                timings["prompt"] = round(time.perf_counter() - prompt_start, 3)
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"Cannot find prompt on device {dev_dict['ip']}.")
+                print(e)
+                status = f"connect failed: {type(e).__name__}"
+                utils.record_section(
+                    records, None, "", time.perf_counter() - start, status
+                )
+                return
+
+            for cmd in cmd_list:
+                if debug:
+                    print(f"--- Show Command: {cmd}")
+                start = time.perf_counter()
+                try:
+                    process.stdin.write(f"{cmd.strip()}\n")
+                    raw = await read_until(process, prompt_regex, cmd_timeout)
+                except (OSError, asyncio.TimeoutError) as e:
+                    # The channel state is unknown after a timeout or reset, so stop here
+                    print(f"Cannot execute command {cmd} on device {dev_dict['ip']}.")
+                    print(e)
+                    status = f"failed: {type(e).__name__}"
+                    utils.record_section(
+                        records, cmd, "", time.perf_counter() - start, status
+                    )
+                    break
+                section = f"\n!--- {cmd} \n{clean_output(raw, cmd)}"
+                utils.record_section(records, cmd, section, time.perf_counter() - start)
+                yield cmd, section
+
+            process.stdin.write("exit\n")
+    finally:
+        slot.release()
+
+
+async def conn_and_get_output_async(
+    dev_dict, cmd_list, debug=False, records=None, timings=None
+):
+    """
+    Connect to a network device with asyncssh and run a list of show commands, returning the concatenated output.
+
+    Returns an empty string if the device cannot be reached or authenticated, like utils.conn_and_get_output.
+    """
+    sections = []
+    async with contextlib.aclosing(
+        iter_show_output_async(
+            dev_dict, cmd_list, debug=debug, records=records, timings=timings
+        )
+    ) as sections_iter:
+        async for _, section in sections_iter:
+            sections.append(section)
+    return "".join(sections)
+
+
+async def stream_output_async(
+    dev_dict, cmd_list, writer, debug=False, records=None, timings=None
+):
+    """
+    Run a list of show commands and hand each section to writer as soon as it finishes.
+
+    Returns the number of characters written.  See utils.stream_output.
+    """
+    written = 0
+    async with contextlib.aclosing(
+        iter_show_output_async(
+            dev_dict, cmd_list, debug=debug, records=records, timings=timings
+        )
+    ) as sections_iter:
+        async for _, section in sections_iter:
+            writer.write(section)
+            writer.flush()
+            written += len(section)
+    return written
+
+
+async def stream_output_to_file_async(
+    dev_dict, cmd_list, filename, debug=False, records=None, timings=None
+):
+    """
+    Run a list of show commands and append each section to filename as soon as it finishes.
+
+    Returns the number of characters written.  See utils.stream_output_to_file.
+    """
+    with open(filename, "w", encoding="utf-8") as f:
+        return await stream_output_async(
+            dev_dict, cmd_list, f, debug=debug, records=records, timings=timings
+        )
+
+
+async def collect_devices(
+    jobs,
+    concurrency=200,
+    device_timeout=600,
+    stream=False,
+    open_writer=None,
+    debug=False,
+    on_done=None,
+):
+    """
+    Collect every (dev_dict, cmd_list, filename) job in a single event loop and save the output to filename.
+
+    At most concurrency devices are connected at any time and each device is cancelled
+    after device_timeout seconds.  With stream each command section is written as soon as it
+    finishes instead of once per device.  If open_writer is given it is called with filename
+    and the sections are streamed to the writer it returns (see dedup_store.open_writer)
+    instead of a file.  Results are returned in job order as
+    (dev_dict, written, error, elapsed, records, timings) tuples where error is None on
+    success, records are the per-command manifest records and timings the connection
+    phase durations.  If on_done is given it is called with each result tuple and filename
+    as soon as that device finishes.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(dev_dict, cmd_list, filename):
+        result = await collect_one(dev_dict, cmd_list, filename)
+        if on_done is not None:
+            on_done(result, filename)
+        return result
+
+    async def collect_one(dev_dict, cmd_list, filename):
+        async with semaphore:
+            print(f"\n===============  Device {dev_dict['ip']} ===============")
+            start = time.perf_counter()
+            records = []
+            timings = {}
+            try:
+                async with asyncio.timeout(device_timeout):
+                    if open_writer is not None:
+                        with open_writer(filename) as writer:
+                            written = await stream_output_async(
+                                dev_dict,
+                                cmd_list,
+                                writer,
+                                debug=debug,
+                                records=records,
+                                timings=timings,
+                            )
+                    elif stream:
+                        written = await stream_output_to_file_async(
+                            dev_dict,
+                            cmd_list,
+                            filename,
+                            debug=debug,
+                            records=records,
+                            timings=timings,
+                        )
+                    else:
+                        resp = await conn_and_get_output_async(
+                            dev_dict,
+                            cmd_list,
+                            debug=debug,
+                            records=records,
+                            timings=timings,
+                        )
+                        utils.write_txt(filename, resp)
+                        written = len(resp)
+            except TimeoutError as e:
+                print(
+                    f"\n\txxx Device {dev_dict['ip']} timed out after {device_timeout}s"
+                )
+                error = f"Timed out after {device_timeout}s"
+                elapsed = time.perf_counter() - start
+                # Record the cause so the retry policy can tell transient failures apart
+                status = f"failed: {type(e).__name__}"
+                utils.record_section(records, None, "", 0, status)
+                return dev_dict, 0, error, elapsed, records, timings
+            except Exception as e:
+                print(f"\n\txxx Device {dev_dict['ip']} failed: {e}")
+                elapsed = time.perf_counter() - start
+                status = f"failed: {type(e).__name__}"
+                utils.record_section(records, None, "", 0, status)
+                return dev_dict, 0, str(e), elapsed, records, timings
+            return (
+                dev_dict,
+                written,
+                None,
+                time.perf_counter() - start,
+                records,
+                timings,
+            )
+
+    tasks = [asyncio.create_task(run_one(*job)) for job in jobs]
+    try:
+        return await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        await jump_hosts.close_async()
+
+
+def run_collection(
+    jobs,
+    concurrency=200,
+    device_timeout=600,
+    stream=False,
+    open_writer=None,
+    debug=False,
+    on_done=None,
+):
+    """
+    Blocking wrapper around collect_devices for use from the CLI scripts.
+    """
+    check_asyncssh()
+    return asyncio.run(
+        collect_devices(
+            jobs,
+            concurrency=concurrency,
+            device_timeout=device_timeout,
+            stream=stream,
+            open_writer=open_writer,
+            debug=debug,
+            on_done=on_done,
+        )
+    )
@@ -0,0 +1,508 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: benchmark
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Throughput benchmark for the collection engines against a fake device farm.
+#
+# Starts fake_device_farm.py in its own process, then runs each collection mode
+# (Netmiko threads, streaming, compressed output, pipelined commands, the asyncio
+# engine) in a fresh child process against the farm, and reports devices/minute,
+# per-command latency percentiles and the peak RSS of each child:
+#
+#     python benchmark.py -n 50 -w 20 --latency 0.1 --output_size 8192
+#
+# Save the results with -j and compare a later run against them with -b to fail
+# (exit code 1) when a mode's throughput drops by more than the tolerance.
+
+import argparse
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+import utils
+import async_collect
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+MODES = [
+    "threaded",
+    "threaded-stream",
+    "threaded-gz",
+    "threaded-pipeline",
+    "async",
+    "async-stream",
+]
+
+# Commands per batch in the threaded-pipeline mode
+PIPELINE_BATCH = 8
+
+# show_cmds.yml list used for each simulated device type
+CMD_KEYS = {
+    "cisco_ios": "ios_show_commands",
+    "cisco_nxos": "nxos_show_commands",
+    "cisco_wlc": "wlc_show_commands",
+}
+
+
+def percentile(values, pct):
+    """
+    Return the pct percentile of a list of numbers using the nearest-rank method, or None if empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of this process in MB, or None where the resource module is missing.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    if sys.platform == "darwin":
+        return rss / 1024 / 1024
+    return rss / 1024
+
+
+def collect_threaded(dev_dict, cmds, filename, mode):
+    """
+    Collect one device with Netmiko the way get_showcmds.py does for the given mode.
+
+    Returns a tuple of (characters written, per-command records).
+    """
+    records = []
+    if mode == "threaded-gz":
+        with utils.open_gzip_writer(filename) as writer:
+            written = utils.stream_output(dev_dict, cmds, writer, records=records)
+    elif mode == "threaded-pipeline":
+        resp = utils.conn_and_get_output(
+            dev_dict, cmds, records=records, pipeline=PIPELINE_BATCH
+        )
+        utils.write_txt(filename, resp)
+        written = len(resp)
+    elif mode == "threaded-stream":
+        written = utils.stream_output_to_file(dev_dict, cmds, filename, records=records)
+    else:
+        resp = utils.conn_and_get_output(dev_dict, cmds, records=records)
+        utils.write_txt(filename, resp)
+        written = len(resp)
+    return written, records
+
+
+def run_mode(mode, devdicts, cmds, output_dir, workers, timeout):
+    """
+    Collect every device with one mode and return a list of (written, error, records) tuples.
+    """
+    jobs = [
+        (d, cmds, os.path.join(output_dir, f"{d['ip']}_{d['port']}.txt"))
+        for d in devdicts
+    ]
+
+    if mode.startswith("async"):
+        collected = async_collect.run_collection(
+            jobs,
+            concurrency=workers,
+            device_timeout=timeout,
+            stream=mode == "async-stream",
+        )
+        return [
+            (written, error, records) for _, written, error, _, records, _ in collected
+        ]
+
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(collect_threaded, dev_dict, cmds, filename, mode)
+            for dev_dict, cmds, filename in jobs
+        ]
+        for future in futures:
+            try:
+                written, records = future.result()
+                results.append((written, None, records))
+            except Exception as e:
+                results.append((0, str(e), []))
+    return results
+
+
+def run_child():
+    """
+    Run one collection mode against the farm and print its metrics as a JSON line (child process).
+    """
+    # Measure the collection engines themselves, not the login rate and session limits
+    os.environ["SESSION_LIMITS"] = "none"
+    os.environ["JUMP_HOSTS"] = "none"
+    cmd_dict = utils.read_yaml(arguments.commands_file)
+    cmds = cmd_dict[CMD_KEYS[arguments.device_type]]
+    devdicts = [
+        {
+            "device_type": arguments.device_type,
+            "ip": "127.0.0.1",
+            "port": arguments.base_port + i,
+            "username": "bench",
+            "password": "bench",
+            "secret": "bench",
+        }
+        for i in range(arguments.count)
+    ]
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as output_dir:
+        if arguments.bastion_port:
+            # Reach every fake device through the farm's fake jump host
+            os.environ["JUMP_HOSTS"] = os.path.join(output_dir, "jump_hosts.yml")
+            os.environ["BENCH_JUMP_USR"] = os.environ["BENCH_JUMP_PWD"] = "bench"
+            with open(os.environ["JUMP_HOSTS"], "w", encoding="utf-8") as f:
+                yaml.safe_dump(
+                    {
+                        "jump_hosts": {
+                            "farm": {
+                                "host": "127.0.0.1",
+                                "port": arguments.bastion_port,
+                                "username_env": "BENCH_JUMP_USR",
+                                "password_env": "BENCH_JUMP_PWD",
+                            }
+                        },
+                        "groups": [{"name": "farm", "jump_host": "farm"}],
+                    },
+                    f,
+                )
+        start = time.perf_counter()
+        results = run_mode(
+            arguments.child,
+            devdicts,
+            cmds,
+            output_dir,
+            arguments.workers,
+            arguments.timeout,
+        )
+        elapsed = time.perf_counter() - start
+
+    # A device only counts as collected if every one of its commands succeeded
+    ok = [
+        r
+        for r in results
+        if r[0] and not r[1] and all(rec["status"] == "ok" for rec in r[2] or [])
+    ]
+    durations = [
+        rec["duration"]
+        for _, _, records in results
+        for rec in records or []
+        if rec["command"] is not None and rec["status"] == "ok"
+    ]
+    metrics = {
+        "mode": arguments.child,
+        "devices": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "commands": len(durations),
+        "elapsed": elapsed,
+        "devices_per_min": len(ok) / elapsed * 60 if elapsed else 0,
+        "bytes_written": sum(r[0] for r in results),
+        "p50_ms": None,
+        "p95_ms": None,
+        "p99_ms": None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    for pct in (50, 95, 99):
+        value = percentile(durations, pct)
+        metrics[f"p{pct}_ms"] = value * 1000 if value is not None else None
+
+    print(f"RESULT {json.dumps(metrics)}", flush=True)
+
+
+def start_farm_process():
+    """
+    Start fake_device_farm.py with the benchmark's farm options and wait until it is listening.
+    """
+    farm_cmd = [
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_device_farm.py"),
+        "-n",
+        str(arguments.count),
+        "-p",
+        str(arguments.base_port),
+        "-t",
+        arguments.device_type,
+        "--latency",
+        str(arguments.latency),
+        "--jitter",
+        str(arguments.jitter),
+        "--banner_delay",
+        str(arguments.banner_delay),
+        "--output_size",
+        str(arguments.output_size),
+        "--fail_rate",
+        str(arguments.fail_rate),
+        "--hang_time",
+        str(arguments.hang_time),
+    ]
+    if arguments.bastion_port:
+        farm_cmd += ["--bastion_port", str(arguments.bastion_port)]
+    farm = subprocess.Popen(farm_cmd, stdout=subprocess.PIPE, text=True)
+    for line in farm.stdout:
+        print(f"  farm: {line.rstrip()}")
+        if line.strip() == "READY":
+            return farm
+    farm.wait()
+    exit("The fake device farm did not start. Aborting Execution.")
+
+
+def run_mode_process(mode):
+    """
+    Run one mode in a fresh child process, so peak RSS is per mode, and return its metrics dictionary.
+    """
+    child_cmd = [sys.executable, os.path.abspath(__file__), "--child", mode] + [
+        arg for arg in sys.argv[1:]
+    ]
+    proc = subprocess.run(
+        child_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL if not arguments.verbose else None,
+        text=True,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT ") :])
+        if arguments.verbose:
+            print(line)
+    return {"mode": mode, "error": f"exit code {proc.returncode}"}
+
+
+def format_ms(value):
+    return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+
+def print_results(results):
+    """
+    Print one line of metrics per mode.
+    """
+    print(
+        f"\n{'Mode':<16} {'OK':>5} {'Fail':>5} {'Secs':>8} {'Dev/min':>9} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>8}"
+    )
+    for r in results:
+        if "error" in r:
+            print(f"{r['mode']:<16} failed: {r['error']}")
+            continue
+        rss = f"{r['peak_rss_mb']:8.1f}" if r["peak_rss_mb"] is not None else "       -"
+        print(
+            f"{r['mode']:<16} {r['succeeded']:>5} {r['failed']:>5} {r['elapsed']:>8.1f} "
+            f"{r['devices_per_min']:>9.1f} {format_ms(r['p50_ms'])} {format_ms(r['p95_ms'])} "
+            f"{format_ms(r['p99_ms'])} {rss}"
+        )
+
+
+def compare_to_baseline(results, baseline_file, tolerance):
+    """
+    Return the list of modes whose devices/minute dropped by more than tolerance from the baseline file.
+    """
+    baseline = {r["mode"]: r for r in utils.read_json(baseline_file)["results"]}
+    regressions = []
+    for r in results:
+        before = baseline.get(r["mode"])
+        if not before or "error" in before or not before["devices_per_min"]:
+            continue
+        after = r.get("devices_per_min", 0)
+        change = (after - before["devices_per_min"]) / before["devices_per_min"]
+        print(
+            f"{r['mode']:<16} {before['devices_per_min']:>9.1f} -> {after:>9.1f} dev/min ({change:+.0%})"
+        )
+        if change < -tolerance:
+            regressions.append(r["mode"])
+    return regressions
+
+
+def main():
+    """
+    Start the fake device farm, benchmark each collection mode against it and report the results.
+    """
+    modes = arguments.modes.split(",")
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        exit(f"Unknown mode(s) {', '.join(unknown)}. Choose from {', '.join(MODES)}.")
+    if async_collect.asyncssh is None:
+        skipped = [m for m in modes if m.startswith("async")]
+        if skipped:
+            print(f"asyncssh is not installed; skipping {', '.join(skipped)}")
+        modes = [m for m in modes if not m.startswith("async")]
+
+    print(
+        f"Benchmarking {len(modes)} modes against {arguments.count} fake "
+        f"{arguments.device_type} devices with {arguments.workers} workers"
+    )
+    farm = start_farm_process()
+    results = []
+    try:
+        for mode in modes:
+            print(f"\n===============  Mode {mode} ===============")
+            result = run_mode_process(mode)
+            results.append(result)
+            print_results([result])
+    finally:
+        farm.terminate()
+        farm.wait()
+
+    print(f"\n===============  Summary ===============")
+    print_results(results)
+
+    if arguments.json:
+        settings = {
+            k: v
+            for k, v in vars(arguments).items()
+            if k not in ("json", "baseline", "child", "verbose")
+        }
+        utils.save_json(arguments.json, {"settings": settings, "results": results})
+        print(f"\nSaved results to {arguments.json}")
+
+    if arguments.baseline:
+        print(f"\n===============  Compared to {arguments.baseline} ===============")
+        regressions = compare_to_baseline(
+            results, arguments.baseline, arguments.tolerance
+        )
+        if regressions:
+            exit(f"Throughput regression in: {', '.join(regressions)}")
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the collection engines against a farm of fake Cisco SSH devices",
+        epilog="Usage: ' python benchmark.py -n 50 -w 20 --latency 0.1 -j bench.json' ",
+    )
+    parser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        help="Number of fake devices. Default: 20",
+        default=20,
+    )
+    parser.add_argument(
+        "-p",
+        "--base_port",
+        type=int,
+        help="Port of the first fake device. Default: 9000",
+        default=9000,
+    )
+    parser.add_argument(
+        "-t",
+        "--device_type",
+        choices=list(CMD_KEYS),
+        help="Device type to simulate; its command list from show_cmds.yml is run. Default: cisco_ios",
+        default="cisco_ios",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Worker threads (or asyncio concurrency limit) per mode. Default: 20",
+        default=20,
+    )
+    parser.add_argument(
+        "-m",
+        "--modes",
+        help=f"Comma separated modes to run. Default: {','.join(MODES)}",
+        default=",".join(MODES),
+    )
+    parser.add_argument(
+        "--commands_file",
+        help="YAML file of show commands. Default: show_cmds.yml",
+        default="show_cmds.yml",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        help="Seconds before each command's output. Default: 0.05",
+        default=0.05,
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        help="Random extra latency of up to this many seconds per command. Default: 0",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--banner_delay",
+        type=float,
+        help="Seconds before the banner and first prompt. Default: 0",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--output_size",
+        type=int,
+        help="Approximate bytes of output per command. Default: 4096",
+        default=4096,
+    )
+    parser.add_argument(
+        "--fail_rate",
+        type=float,
+        help="Fraction of fake devices that refuse, reject the login or hang (0-1). Default: 0",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--hang_time",
+        type=float,
+        help="Seconds a hanging device stalls before dropping the session. Default: 30",
+        default=30.0,
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        help="Per-device timeout in seconds for the async modes. Default: 600",
+        default=600,
+    )
+    parser.add_argument(
+        "--bastion_port",
+        type=int,
+        help="Reach the fake devices through a fake jump host on this port (see jump_hosts.py)",
+    )
+    parser.add_argument(
+        "-j", "--json", help="Save the results to this JSON file", action="store"
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        help="JSON results of an earlier run to compare devices/minute against",
+        action="store",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        help="Allowed drop in devices/minute against the baseline (0-1). Default: 0.2",
+        default=0.2,
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Show the output of the collection runs",
+        default=False,
+    )
+    # Internal: run a single mode in a child process
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.child:
+        run_child()
+    else:
+        main()
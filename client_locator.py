@@ -0,0 +1,604 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: client_locator
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Client location correlation across a collection run.
+#
+# Joins the show ip arp, show mac address-table and show device-tracking
+# database output saved by get_showcmds.py into a MAC index and an IP index,
+# so "which access port is this IP/MAC on" is a dictionary lookup.
+#
+#   - MAC entries learned on trunks (show interfaces trunk) and on ports with a
+#     switch or router CDP neighbor (show cdp neighbors [detail]) are uplinks
+#     and are dropped, so a MAC is placed on the access port it is connected to.
+#     Ports with a phone or access point neighbor stay access ports.
+#   - If a MAC is still seen on more than one access port, the port with the
+#     fewest MACs wins (an edge port rather than an unmanaged switch or a
+#     missed uplink).
+#   - ARP and device-tracking entries map IPs to MACs; device-tracking entries
+#     also place the MAC on their port.
+#
+# The five commands are read with small line parsers instead of TextFSM, both
+# for speed on tables with millions of entries and because ntc-templates has
+# no template for some of them.  Each location is packed into a single int
+# (port MAC count, device, port, VLAN) so the indexes stay compact.  When the
+# OUI database has been compiled (see oui_db.py) the vendor of every MAC is shown.
+#
+#     python client_locator.py -i local -q 10.1.10.55 0050.56aa.bbcc -o clients.csv
+
+import argparse
+import concurrent.futures
+import csv
+import functools
+import itertools
+import ipaddress
+import os
+import re
+import time
+
+import utils
+import oui_db
+import parse_showcmds
+
+# Bit layout of a packed location: count | device | port | vlan
+VLAN_BITS = 12
+PORT_BITS = 20
+DEVICE_BITS = 16
+
+MAC_REGEX = re.compile(
+    r"\b([0-9a-fA-F]{4}\.[0-9a-fA-F]{4}\.[0-9a-fA-F]{4}|"
+    r"[0-9a-fA-F]{2}(?:[:-][0-9a-fA-F]{2}){5})\b"
+)
+IPV4_REGEX = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3})\b")
+INTERFACE_REGEX = re.compile(r"^[A-Za-z][A-Za-z-]*\d+(?:[/.:]\d+)*$")
+
+# Short interface names as they appear in show mac address-table.  A name matches the
+# first entry it is the start of (an abbreviation) or that it starts with.
+INTERFACE_PREFIXES = [
+    ("twogigabitethernet", "Tw"),
+    ("twentyfivegige", "Twe"),
+    ("tengigabitethernet", "Te"),
+    ("fivegigabitethernet", "Fi"),
+    ("fastethernet", "Fa"),
+    ("fortygigabitethernet", "Fo"),
+    ("hundredgige", "Hu"),
+    ("gigabitethernet", "Gi"),
+    ("appgigabitethernet", "Ap"),
+    ("port-channel", "Po"),
+    ("ethernet", "Eth"),
+]
+
+# Which saved command a section is, by its (possibly abbreviated) command line.  The
+# MAC table may be filtered to dynamic entries, a VLAN or an interface, but not
+# replaced by a summary such as "count" or "aging-time".
+COMMAND_KINDS = [
+    ("device_tracking", re.compile(r"^sh\w*\s+device-tracking\s+d")),
+    ("arp", re.compile(r"^sh\w*\s+(ip\s+)?arp\b")),
+    (
+        "mac",
+        re.compile(
+            r"^sh\w*\s+mac(\s+address-table|-address-table|\s+add\w*)?"
+            r"(\s+(dyn\w*|vlan\s+\d+|int\w*\s+\S+))*\s*$"
+        ),
+    ),
+    ("trunk", re.compile(r"^sh\w*\s+int\w*\s+trunk")),
+    ("cdp", re.compile(r"^sh\w*\s+cd\w*\s+nei\w*")),
+]
+
+# CDP neighbors with these capabilities are switches and routers (uplinks); phones
+# and access points are not, even when they also report Router
+UPLINK_CAPABILITIES = {"Switch", "Router", "S", "R"}
+EDGE_CAPABILITIES = {"Phone", "Trans-Bridge", "P", "T", "H"}
+
+
+def normalize_mac(mac):
+    """
+    Return a MAC address in any common notation as a 48-bit int, or None.
+    """
+    digits = mac.replace(".", "").replace(":", "").replace("-", "")
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+def format_mac(value):
+    """
+    Return a 48-bit MAC int in Cisco notation, e.g. 0050.56aa.bbcc.
+    """
+    digits = f"{value:012x}"
+    return f"{digits[0:4]}.{digits[4:8]}.{digits[8:12]}"
+
+
+def normalize_ip(ip):
+    """
+    Return an IPv4 or IPv6 address as an int, or None.
+    """
+    try:
+        return int(ipaddress.ip_address(ip))
+    except ValueError:
+        return None
+
+
+def format_ip(value):
+    """
+    Return an IP int as text (IPv4 for values that fit in 32 bits).
+    """
+    if value is None:
+        return None
+    if value < 2**32:
+        return str(ipaddress.IPv4Address(value))
+    return str(ipaddress.IPv6Address(value))
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_interface(name):
+    """
+    Return the short form of an interface name, e.g. Gi1/0/1 for GigabitEthernet1/0/1 or "Gig 1/0/1".
+    """
+    name = name.strip().replace(" ", "")
+    match = re.match(r"^([A-Za-z-]+)(\d.*)$", name)
+    if not match:
+        return name
+    prefix, number = match.group(1).lower(), match.group(2)
+    for long_name, short in INTERFACE_PREFIXES:
+        if long_name.startswith(prefix) or prefix.startswith(long_name):
+            return f"{short}{number}"
+    return name
+
+
+def command_kind(cmd):
+    """
+    Return which correlation input a saved command is (arp, mac, device_tracking, trunk, cdp) or None.
+    """
+    cmd = " ".join(cmd.lower().split())
+    for kind, regex in COMMAND_KINDS:
+        if regex.search(cmd):
+            return kind
+    return None
+
+
+def parse_arp(output):
+    """
+    Return (ip, mac) tuples from show ip arp (IOS or NX-OS) output.
+    """
+    entries = []
+    for line in output.splitlines():
+        ip = IPV4_REGEX.search(line)
+        mac = MAC_REGEX.search(line)
+        if ip and mac:
+            entries.append((ip.group(1), mac.group(1)))
+    return entries
+
+
+def parse_mac_table(output):
+    """
+    Return (mac, vlan, port) tuples from show mac address-table (IOS or NX-OS) output.
+
+    Entries on the CPU, router or supervisor and multi-port entries are skipped.
+    """
+    entries = []
+    for line in output.splitlines():
+        mac = MAC_REGEX.search(line)
+        if not mac:
+            continue
+        before = line[: mac.start()].split()
+        after = line[mac.end() :].split()
+        vlan = next((t for t in reversed(before) if t.isdigit()), None)
+        if vlan is None or not after:
+            continue
+        port = after[-1]
+        if "," in port or not INTERFACE_REGEX.match(port):
+            continue
+        entries.append((mac.group(1), int(vlan), normalize_interface(port)))
+    return entries
+
+
+def parse_device_tracking(output):
+    """
+    Return (ip, mac, port, vlan) tuples from show device-tracking database output.
+    """
+    entries = []
+    for line in output.splitlines():
+        fields = line.split()
+        mac = MAC_REGEX.search(line)
+        if len(fields) < 5 or not mac:
+            continue
+        try:
+            i = fields.index(mac.group(1))
+        except ValueError:
+            continue
+        if i < 1 or i + 2 >= len(fields) or not fields[i + 2].isdigit():
+            continue
+        ip, port = fields[i - 1], fields[i + 1]
+        if normalize_ip(ip) is None or not INTERFACE_REGEX.match(port):
+            continue
+        entries.append(
+            (ip, mac.group(1), normalize_interface(port), int(fields[i + 2]))
+        )
+    return entries
+
+
+def parse_trunks(output):
+    """
+    Return the set of ports listed in show interfaces trunk (IOS or NX-OS) output.
+    """
+    ports = set()
+    for line in output.splitlines():
+        fields = line.split()
+        if fields and INTERFACE_REGEX.match(fields[0]):
+            ports.add(normalize_interface(fields[0]))
+    return ports
+
+
+def is_uplink_neighbor(capabilities):
+    """
+    Return True if CDP capabilities (words or one letter codes) are those of a switch or router.
+    """
+    capabilities = set(capabilities)
+    return bool(capabilities & UPLINK_CAPABILITIES) and not (
+        capabilities & EDGE_CAPABILITIES
+    )
+
+
+def parse_cdp_uplinks(output):
+    """
+    Return the set of local ports with a switch or router neighbor from show cdp neighbors [detail] output.
+    """
+    ports = set()
+    if "Device ID:" in output:
+        # Detail output: one block per neighbor
+        for block in re.split(r"^-{5,}\s*$|^(?=Device ID:)", output, flags=re.M):
+            if not block:
+                continue
+            interface = re.search(r"^Interface:\s*([^,]+),", block, re.M)
+            capabilities = re.search(r"Capabilities:\s*(.*)$", block, re.M)
+            if interface and capabilities:
+                if is_uplink_neighbor(capabilities.group(1).split()):
+                    ports.add(normalize_interface(interface.group(1)))
+        return ports
+
+    # Summary output: local interface, hold time, capability codes, platform, port ID
+    line_regex = re.compile(
+        r"(?:^|\s)([A-Za-z]{2,}\s?\d+(?:/\d+)*)\s+(\d+)\s+((?:[A-Za-z]\s)*[A-Za-z])\s"
+    )
+    for line in output.splitlines():
+        match = line_regex.search(line)
+        if match and is_uplink_neighbor(match.group(3).split()):
+            ports.add(normalize_interface(match.group(1)))
+    return ports
+
+
+def parse_device(filename):
+    """
+    Read the correlation inputs of one saved transcript.  Runs in a worker process.
+
+    Returns a dictionary with the device, timestamp, arp, mac and device_tracking entries, the
+    set of uplink ports and whether a MAC address table section was found.
+    """
+    info = parse_showcmds.transcript_info(filename) or {}
+    data = {
+        "device": info.get("device", os.path.basename(filename)),
+        "timestamp": info.get("timestamp"),
+        "arp": [],
+        "mac": [],
+        "device_tracking": [],
+        "uplinks": set(),
+        "mac_table": False,
+    }
+    for cmd, output in utils.split_transcript(parse_showcmds.read_transcript(filename)):
+        kind = command_kind(cmd)
+        if kind == "arp":
+            data["arp"].extend(parse_arp(output))
+        elif kind == "mac":
+            data["mac_table"] = True
+            data["mac"].extend(parse_mac_table(output))
+        elif kind == "device_tracking":
+            data["device_tracking"].extend(parse_device_tracking(output))
+        elif kind == "trunk":
+            data["uplinks"].update(parse_trunks(output))
+        elif kind == "cdp":
+            data["uplinks"].update(parse_cdp_uplinks(output))
+    return data
+
+
+class ClientIndex:
+    """
+    MAC and IP indexes of client locations across the devices of a run.
+
+    mac_locations maps a MAC int to a packed location, ip_macs an IP int to a MAC int and
+    mac_ips a MAC int to the last IP int seen for it.  Devices and ports are interned.
+    """
+
+    def __init__(self):
+        self.devices = []
+        self.device_ids = {}
+        self.ports = []
+        self.port_ids = {}
+        self.mac_locations = {}
+        self.ip_macs = {}
+        self.mac_ips = {}
+        self.uplink_entries = 0
+
+    def intern(self, names, ids, name, bits):
+        value = ids.get(name)
+        if value is None:
+            value = len(names)
+            if value >= 1 << bits:
+                raise OverflowError(f"More than {1 << bits} distinct names")
+            names.append(name)
+            ids[name] = value
+        return value
+
+    def pack(self, count, device, port, vlan):
+        return (
+            (
+                (
+                    count << DEVICE_BITS
+                    | self.intern(self.devices, self.device_ids, device, DEVICE_BITS)
+                )
+                << PORT_BITS
+                | self.intern(self.ports, self.port_ids, port, PORT_BITS)
+            )
+            << VLAN_BITS
+        ) | (vlan & ((1 << VLAN_BITS) - 1))
+
+    def unpack(self, location):
+        vlan = location & ((1 << VLAN_BITS) - 1)
+        location >>= VLAN_BITS
+        port = self.ports[location & ((1 << PORT_BITS) - 1)]
+        location >>= PORT_BITS
+        device = self.devices[location & ((1 << DEVICE_BITS) - 1)]
+        count = location >> DEVICE_BITS
+        return {
+            "device": device,
+            "interface": port,
+            "vlan": vlan,
+            "macs_on_port": count,
+        }
+
+    def add_location(self, mac, count, device, port, vlan):
+        """
+        Place a MAC on a port, keeping the existing location if its port has fewer MACs.
+        """
+        location = self.pack(count, device, port, vlan)
+        current = self.mac_locations.get(mac)
+        # The MAC count is the most significant field, so the smaller location wins
+        if current is None or location < current:
+            self.mac_locations[mac] = location
+
+    def add_ip(self, ip, mac):
+        ip, mac = normalize_ip(ip), normalize_mac(mac)
+        if ip is None or mac is None:
+            return
+        self.ip_macs[ip] = mac
+        self.mac_ips[mac] = ip
+
+    def add_device(self, data):
+        """
+        Add the parsed inputs of one device (see parse_device).
+        """
+        device = data["device"]
+        uplinks = data["uplinks"]
+
+        port_counts = {}
+        access = []
+        for mac, vlan, port in data["mac"]:
+            if port in uplinks:
+                self.uplink_entries += 1
+                continue
+            port_counts[port] = port_counts.get(port, 0) + 1
+            access.append((mac, vlan, port))
+        for mac, vlan, port in access:
+            mac = normalize_mac(mac)
+            if mac is not None:
+                self.add_location(mac, port_counts[port], device, port, vlan)
+
+        for ip, mac in data["arp"]:
+            self.add_ip(ip, mac)
+        for ip, mac, port, vlan in data["device_tracking"]:
+            self.add_ip(ip, mac)
+            if port not in uplinks and normalize_mac(mac) is not None:
+                self.add_location(
+                    normalize_mac(mac), port_counts.get(port, 1), device, port, vlan
+                )
+
+    def locate(self, query):
+        """
+        Return the location of a client given its MAC or IP address, or None if it is not known.
+
+        The result has the mac, ip, device, interface, vlan and the number of MACs on that port.
+        """
+        mac = normalize_ip(query)
+        if mac is not None:
+            ip = mac
+            mac = self.ip_macs.get(ip)
+        else:
+            mac = normalize_mac(query)
+            ip = self.mac_ips.get(mac) if mac is not None else None
+        if mac is None:
+            return None
+        location = self.mac_locations.get(mac)
+        result = {"mac": format_mac(mac), "ip": format_ip(ip)}
+        if location is None:
+            result.update(device=None, interface=None, vlan=None, macs_on_port=None)
+        else:
+            result.update(self.unpack(location))
+        return result
+
+    def clients(self):
+        """
+        Yield the location of every client MAC on an access port.
+        """
+        for mac, location in self.mac_locations.items():
+            yield {
+                "mac": format_mac(mac),
+                "ip": format_ip(self.mac_ips.get(mac)),
+                **self.unpack(location),
+            }
+
+
+def latest_transcripts(files):
+    """
+    Keep only the newest transcript of each device.
+    """
+    latest = {}
+    for filename in files:
+        info = parse_showcmds.transcript_info(filename) or {}
+        device = info.get("device", filename)
+        key = info.get("timestamp") or ""
+        if device not in latest or key > latest[device][0]:
+            latest[device] = (key, filename)
+    return sorted(filename for _, filename in latest.values())
+
+
+def build_index(files, workers=None, debug=True):
+    """
+    Parse transcripts in a pool of processes and return a ClientIndex of every device.
+    """
+    index = ClientIndex()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(parse_device, f): f for f in files}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                data = future.result()
+            except Exception as e:
+                print(f"\txxx Cannot read {futures[future]}: {e}")
+                continue
+            index.add_device(data)
+            if data["arp"] and not data["mac_table"]:
+                print(
+                    f"\txxx {data['device']}: {len(data['arp'])} ARP entries but no "
+                    f"show mac address-table section was recognised"
+                )
+            if debug:
+                print(
+                    f"{data['device']}: {len(data['mac'])} MAC, {len(data['arp'])} ARP, "
+                    f"{len(data['device_tracking'])} device-tracking entries, "
+                    f"{len(data['uplinks'])} uplink ports"
+                )
+    return index
+
+
+def save_clients(index, filename, oui=None):
+    """
+    Save every located client to a CSV file and return the number of rows.
+
+    With an oui_db.OuiIndex the vendor of every MAC is added.
+    """
+    fields = ["mac", "ip", "device", "interface", "vlan", "macs_on_port"]
+    if oui is not None:
+        fields.append("vendor")
+    rows = 0
+    with open(filename, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        clients = index.clients()
+        while True:
+            chunk = list(itertools.islice(clients, 100000))
+            if not chunk:
+                break
+            if oui is not None:
+                oui.enrich_rows(chunk, mac_field="mac")
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def main():
+    """
+    Build the client indexes from saved transcripts, answer queries and optionally save every client location.
+    """
+    files = parse_showcmds.find_transcripts(arguments.input)
+    if not files:
+        exit(f"No transcript files found in {arguments.input}. Aborting Execution.")
+    if not arguments.all_runs:
+        files = latest_transcripts(files)
+
+    start = time.perf_counter()
+    index = build_index(files, workers=arguments.workers, debug=arguments.verbose)
+    print(
+        f"\nIndexed {len(index.mac_locations)} client MACs and {len(index.ip_macs)} IPs "
+        f"from {len(files)} transcripts ({index.uplink_entries} uplink entries dropped) "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+    oui = oui_db.load_index()
+    for query in arguments.query or []:
+        result = index.locate(query)
+        if result is None:
+            print(f"  {query}: not found")
+            continue
+        client = f"{result['mac']} {result['ip'] or ''}"
+        if oui is not None:
+            client += f" ({oui.lookup(result['mac']) or 'unknown vendor'})"
+        if result["device"] is None:
+            print(f"  {query}: {client} not on an access port")
+        else:
+            print(
+                f"  {query}: {client} on {result['device']} "
+                f"{result['interface']} vlan {result['vlan']} ({result['macs_on_port']} MACs on port)"
+            )
+
+    if arguments.output:
+        rows = save_clients(index, arguments.output, oui=oui)
+        print(f"\nSaved {rows} client locations to {arguments.output}")
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find the access port of client IPs and MACs from saved show command transcripts",
+        epilog="Usage: ' python client_locator.py -i local -q 10.1.10.55 -o clients.csv' ",
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        nargs="+",
+        help="Transcript files, directories or glob patterns. Default: local",
+        default=["local"],
+    )
+    parser.add_argument(
+        "-q",
+        "--query",
+        nargs="+",
+        help="IP or MAC addresses to locate",
+    )
+    parser.add_argument(
+        "-o", "--output", help="Save the location of every client to this CSV file"
+    )
+    parser.add_argument(
+        "-a",
+        "--all_runs",
+        action="store_true",
+        help="Use every transcript instead of only the newest one of each device",
+        default=False,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of parser processes. Default: one per CPU core",
+        default=None,
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Show the entries read from each device",
+        default=False,
+    )
+    arguments = parser.parse_args()
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: dedup_store
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Content-addressed, deduplicated output store.
+#
+# Most command sections (show version, show inventory, show license all and often
+# show run) are identical from one nightly run to the next.  Instead of writing a
+# complete transcript per run, each "!--- cmd" section is hashed (SHA-256) and
+# stored once under <output_subdir>/store/objects/<2 hex>/<hash>.  Each run only
+# writes a small JSON file under <output_subdir>/store/runs/ listing its sections
+# in order, from which the familiar <device>_<timestamp>[_note].txt transcript is
+# rebuilt on demand:
+#
+#     python dedup_store.py -o local -r 10.1.10.66_2026-10-18_01-00-00
+
+import argparse
+import hashlib
+import os
+
+import utils
+
+STORE_DIR = "store"
+OBJECTS_DIR = "objects"
+RUNS_DIR = "runs"
+
+
+def store_path(output_subdir):
+    """
+    Return the directory of the deduplicated store for an output subdirectory.
+    """
+    return os.path.join(output_subdir, STORE_DIR)
+
+
+def run_path(store_dir, basefn):
+    """
+    Return the path of the run file for a transcript name (with or without the .txt extension).
+    """
+    basefn = os.path.basename(basefn)
+    if basefn.endswith(".txt"):
+        basefn = basefn[:-4]
+    return os.path.join(store_dir, RUNS_DIR, f"{basefn}.json")
+
+
+def object_path(store_dir, digest):
+    """
+    Return the path of a stored section object from its SHA-256 hex digest.
+    """
+    return os.path.join(store_dir, OBJECTS_DIR, digest[:2], digest)
+
+
+def put_section(store_dir, section):
+    """
+    Store one section if its content is not already in the store and return its SHA-256 hex digest.
+    """
+    data = section.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = object_path(store_dir, digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a unique temporary name and rename so concurrent writers never see a partial object
+        tmp_path = f"{path}.{os.getpid()}.{id(data)}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return digest
+
+
+def get_section(store_dir, digest):
+    """
+    Return the text of a stored section from its digest.
+    """
+    with open(object_path(store_dir, digest), "rb") as f:
+        return f.read().decode("utf-8")
+
+
+class DedupWriter:
+    """
+    File-like writer that stores each section written to it and records the run file on close().
+
+    Used in place of an open transcript file by utils.stream_output.
+    """
+
+    def __init__(self, store_dir, basefn):
+        self.store_dir = store_dir
+        self.path = run_path(store_dir, basefn)
+        self.sections = []
+
+    def write(self, section):
+        digest = put_section(self.store_dir, section)
+        match = utils.SECTION_REGEX.search(section)
+        self.sections.append(
+            {
+                "command": match.group(1) if match else None,
+                "hash": digest,
+                "length": len(section.encode("utf-8")),
+            }
+        )
+
+    def flush(self):
+        pass
+
+    def close(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        utils.save_json(self.path, {"sections": self.sections})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_writer(filename):
+    """
+    Return a DedupWriter for the transcript that would have been written to filename.
+
+    The store lives in the same directory as filename.
+    """
+    store_dir = store_path(os.path.dirname(filename))
+    return DedupWriter(store_dir, os.path.basename(filename))
+
+
+def iter_run_sections(path):
+    """
+    Yield the text of each section of a run file in order.
+    """
+    store_dir = os.path.dirname(os.path.dirname(path))
+    for entry in utils.read_json(path)["sections"]:
+        yield get_section(store_dir, entry["hash"])
+
+
+def rebuild_transcript(path):
+    """
+    Rebuild the full transcript text of a run file.
+    """
+    return "".join(iter_run_sections(path))
+
+
+def read_range(path, offset, length):
+    """
+    Return the bytes offset to offset + length of the rebuilt transcript of a run file, as text.
+
+    Only the stored sections that overlap the range are read, so manifest lookups of one
+    command do not rebuild the whole transcript.
+    """
+    store_dir = os.path.dirname(os.path.dirname(path))
+    chunks = []
+    position = 0
+    end = offset + length
+    for entry in utils.read_json(path)["sections"]:
+        next_position = position + entry["length"]
+        if next_position > offset and position < end:
+            with open(object_path(store_dir, entry["hash"]), "rb") as f:
+                data = f.read()
+            chunks.append(data[max(0, offset - position) : end - position])
+        if next_position >= end:
+            break
+        position = next_position
+    return b"".join(chunks).decode("utf-8", errors="ignore")
+
+
+def store_stats(store_dir):
+    """
+    Return the logical (rebuilt) and stored (deduplicated) size of the store in bytes.
+    """
+    logical = 0
+    runs_dir = os.path.join(store_dir, RUNS_DIR)
+    for fn in os.listdir(runs_dir) if os.path.isdir(runs_dir) else []:
+        logical += sum(
+            e["length"] for e in utils.read_json(os.path.join(runs_dir, fn))["sections"]
+        )
+
+    stored = 0
+    objects = 0
+    for root, _, files in os.walk(os.path.join(store_dir, OBJECTS_DIR)):
+        for fn in files:
+            stored += os.path.getsize(os.path.join(root, fn))
+            objects += 1
+    return {"logical_bytes": logical, "stored_bytes": stored, "objects": objects}
+
+
+def main():
+    """
+    Rebuild transcripts from the deduplicated store or report how much space it saves.
+    """
+    store_dir = store_path(arguments.output_subdir)
+
+    if arguments.rebuild:
+        for basefn in arguments.rebuild:
+            path = run_path(store_dir, basefn)
+            out_fn = os.path.join(
+                arguments.output_subdir, f"{os.path.basename(path)[:-5]}.txt"
+            )
+            utils.write_txt(out_fn, rebuild_transcript(path))
+            print(f"Rebuilt {out_fn}")
+    else:
+        stats = store_stats(store_dir)
+        ratio = (
+            stats["logical_bytes"] / stats["stored_bytes"]
+            if stats["stored_bytes"]
+            else 0
+        )
+        print(f"Store:          {store_dir}")
+        print(f"Objects:        {stats['objects']}")
+        print(f"Transcripts:    {stats['logical_bytes']:,} bytes")
+        print(f"Stored:         {stats['stored_bytes']:,} bytes")
+        print(f"Dedup ratio:    {ratio:.1f}x")
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild transcripts from the deduplicated output store",
+        epilog="Usage: ' python dedup_store.py -o local -r my_switch_2026-10-18_01-00-00' ",
+    )
+    parser.add_argument(
+        "-o",
+        "--output_subdir",
+        help="Output subdirectory holding the store. Default: local",
+        action="store",
+        default="local",
+    )
+    parser.add_argument(
+        "-r",
+        "--rebuild",
+        nargs="+",
+        help="Transcript names (<device>_<timestamp>[_note]) to rebuild as .txt files in the output subdirectory",
+        default=[],
+    )
+    arguments = parser.parse_args()
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: device_rules
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Data-driven device classification.
+#
+# The ordered rules in device_rules.yml map a regular expression on the device
+# name or IP to a Netmiko device_type and a credential profile.  The file is read
+# and every pattern compiled once per process (DEVICE_RULES overrides the path),
+# and credential profiles are resolved from environment variables once, so large
+# inventories can be classified in a single pass:
+#
+#     python device_rules.py -f inventory.txt -o classified.json
+
+import argparse
+import collections
+import os
+import re
+import threading
+
+import dotenv
+
+import utils
+
+RULES_FN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "device_rules.yml")
+
+Rule = collections.namedtuple("Rule", ["name", "regex", "device_type", "profile"])
+
+_lock = threading.Lock()
+_state = {
+    "path": None,
+    "rules": None,
+    "default_device_type": "unknown",
+    "profiles": {},
+    # profile name -> (username, password, secret) resolved from the environment
+    "credentials": {},
+}
+
+
+def rules_path():
+    """
+    Return the path of the rules file: DEVICE_RULES or device_rules.yml next to this module.
+    """
+    return os.environ.get("DEVICE_RULES") or RULES_FN
+
+
+def load_rules(path=None, reload=False):
+    """
+    Read the rules file and compile its patterns on first use, returning the ordered list of Rule tuples.
+    """
+    path = path or rules_path()
+    with _lock:
+        if _state["rules"] is not None and _state["path"] == path and not reload:
+            return _state["rules"]
+
+        data = utils.read_yaml(path) or {}
+        profiles = data.get("credential_profiles") or {}
+        rules = []
+        for i, entry in enumerate(data.get("rules") or []):
+            profile = entry.get("credential_profile", "default")
+            if profile != "default" and profile not in profiles:
+                raise ValueError(
+                    f"Rule {entry.get('name', i)} in {path} uses unknown credential profile {profile}"
+                )
+            rules.append(
+                Rule(
+                    entry.get("name", f"rule_{i + 1}"),
+                    re.compile(entry["pattern"], re.IGNORECASE),
+                    entry["device_type"],
+                    profile,
+                )
+            )
+
+        _state.update(
+            {
+                "path": path,
+                "rules": rules,
+                "default_device_type": data.get("default_device_type", "unknown"),
+                "profiles": profiles,
+                "credentials": {},
+            }
+        )
+        return rules
+
+
+def classify(device):
+    """
+    Return (device_type, credential profile, rule name) for a device name or IP.
+
+    The rule name is None when no rule matched and the default device type is used.
+    """
+    device = device.strip()
+    rules = _state["rules"] if _state["rules"] is not None else load_rules()
+    for rule in rules:
+        if rule.regex.search(device):
+            return rule.device_type, rule.profile, rule.name
+    return _state["default_device_type"], "default", None
+
+
+def classify_bulk(devices):
+    """
+    Classify an iterable of device names or IPs in one pass.
+
+    Returns a list of dictionaries with the device, device_type, credential_profile and the
+    rule that matched (None for the default).  Blank lines and duplicates are skipped.
+    """
+    load_rules()
+    seen = set()
+    results = []
+    for line in devices:
+        device = line.strip()
+        if not device or device in seen:
+            continue
+        seen.add(device)
+        device_type, profile, rule = classify(device)
+        results.append(
+            {
+                "device": device,
+                "device_type": device_type,
+                "credential_profile": profile,
+                "rule": rule,
+            }
+        )
+    return results
+
+
+def get_credentials(profile="default"):
+    """
+    Return the (username, password, secret) of a credential profile from the environment, loading .env once.
+
+    The default profile uses NET_USR and NET_PWD unless the rules file says otherwise.  A profile
+    whose variables are not set falls back to the default profile with a warning.
+    """
+    load_rules()
+    with _lock:
+        if profile in _state["credentials"]:
+            return _state["credentials"][profile]
+        if not _state["credentials"]:
+            dotenv.load_dotenv()
+
+        spec = _state["profiles"].get(profile) or {}
+        username_env = spec.get("username_env", "NET_USR")
+        password_env = spec.get("password_env", "NET_PWD")
+        secret_env = spec.get("secret_env", password_env)
+
+        if profile != "default" and not (
+            os.environ.get(username_env) and os.environ.get(password_env)
+        ):
+            print(
+                f"WARNING! {username_env}/{password_env} for credential profile {profile} are not set; "
+                f"using the default credentials."
+            )
+            creds = None
+        else:
+            creds = (
+                os.environ[username_env],
+                os.environ[password_env],
+                os.environ.get(secret_env, os.environ[password_env]),
+            )
+            _state["credentials"][profile] = creds
+
+    if creds is None:
+        creds = get_credentials("default")
+        with _lock:
+            _state["credentials"][profile] = creds
+    return creds
+
+
+def build_dev_obj(device, port=22):
+    """
+    Return the Netmiko device dictionary for a device name or IP using the classification rules.
+    """
+    device_type, profile, _ = classify(device)
+    usr, pwd, sec = get_credentials(profile)
+    return {
+        "ip": device.strip(),
+        "username": usr,
+        "password": pwd,
+        "secret": sec,
+        "port": port,
+        "device_type": device_type,
+    }
+
+
+def main():
+    """
+    Classify an inventory file and report which rule matched each device.
+    """
+    if arguments.rules:
+        os.environ["DEVICE_RULES"] = arguments.rules
+    load_rules()
+
+    fh = utils.open_file(arguments.file_of_devs)
+    results = classify_bulk(fh)
+    fh.close()
+
+    counts = collections.Counter(r["rule"] or "(default)" for r in results)
+    if arguments.verbose:
+        for r in results:
+            print(
+                f"{r['device']:<40} {r['device_type']:<12} {r['credential_profile']:<15} {r['rule'] or '(default)'}"
+            )
+    print(f"\nClassified {len(results)} devices")
+    for rule, count in counts.most_common():
+        print(f"  {count:>8}  {rule}")
+
+    if arguments.output:
+        utils.save_json(arguments.output, results)
+        print(f"\nSaved classification to {arguments.output}")
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Classify devices into Netmiko device types with the rules in device_rules.yml",
+        epilog="Usage: ' python device_rules.py -f inventory.txt -o classified.json' ",
+    )
+    parser.add_argument(
+        "-f",
+        "--file_of_devs",
+        help="Text file with one device (IP or FQDN) per line",
+        action="store",
+        required=True,
+    )
+    parser.add_argument(
+        "-r",
+        "--rules",
+        help="Rules file. Default: $DEVICE_RULES or device_rules.yml",
+        action="store",
+    )
+    parser.add_argument(
+        "-o", "--output", help="Save the classification to this JSON file"
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Print the device type and matching rule of every device",
+        default=False,
+    )
+    arguments = parser.parse_args()
+    main()
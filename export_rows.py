@@ -0,0 +1,376 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: export_rows
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Fleet-wide export of parsed show command rows.
+#
+# Loading thousands of per-device JSON files to look at show ip arp or show mac
+# address-table across the fleet is slow and memory hungry.  A RowExporter writes
+# the parsed TextFSM rows of every device into one file per command, with the
+# device, timestamp, note and device_type added as columns, as each device
+# finishes:
+#
+#   - jsonl    <command>.jsonl, one JSON object per row, appended and flushed per
+#              device so it can be scanned while a run is still going
+#   - arrow    <command>.<device_type>.arrow, an Arrow IPC file that can be
+#              memory-mapped
+#   - parquet  <command>.<device_type>.parquet, one row group per device
+#
+# The schema of a columnar file is fixed by its first rows, and the templates of
+# different platforms name their fields differently (e.g. destination_address on
+# IOS and mac_address on NX-OS), so each device_type gets its own columnar file.
+#
+# The columnar formats need the optional pyarrow module:
+#
+#     uv pip install ".[columnar]"
+#
+# parse_showcmds.py --export and utils.get_show_cmd_parsed(export=...) use it, and
+# existing per-device JSON files can be converted with
+#
+#     python export_rows.py -i parsed -f arrow -o export
+
+import argparse
+import glob
+import json
+import os
+import re
+import threading
+import time
+
+import oui_db
+import utils
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+EXPORT_FORMATS = ["jsonl", "arrow", "parquet"]
+
+EXTENSIONS = {"jsonl": ".jsonl", "arrow": ".arrow", "parquet": ".parquet"}
+
+# Columns added to every row
+META_COLUMNS = ["device", "timestamp", "note", "device_type"]
+
+
+def check_pyarrow(fmt):
+    """
+    Exit with a helpful message if a columnar format is requested without the optional pyarrow module.
+    """
+    if fmt != "jsonl" and pyarrow is None:
+        print(
+            f"ERROR! The pyarrow module is required for the {fmt} export format."
+            '\nInstall it with: uv pip install ".[columnar]"  or  pip install pyarrow'
+        )
+        exit("pyarrow not installed. Aborting Execution.")
+
+
+def export_filename(output_dir, cmd, fmt, device_type=None):
+    """
+    Return the path of the export file of a command, e.g. export/show_ip_arp.jsonl.
+
+    With a device_type the file is that platform's, e.g. export/show_ip_arp.cisco_ios.arrow.
+    """
+    basefn = re.sub(r"[^\w.-]+", "_", cmd.strip())
+    if device_type:
+        basefn += "." + re.sub(r"[^\w.-]+", "_", device_type)
+    return os.path.join(output_dir, f"{basefn}{EXTENSIONS[fmt]}")
+
+
+def make_schema(rows):
+    """
+    Return an Arrow schema with the meta columns and the fields of the first row as strings or lists of strings.
+    """
+    fields = [pyarrow.field(name, pyarrow.string()) for name in META_COLUMNS]
+    for name, value in rows[0].items():
+        if name in META_COLUMNS:
+            continue
+        if isinstance(value, list):
+            fields.append(pyarrow.field(name, pyarrow.list_(pyarrow.string())))
+        else:
+            fields.append(pyarrow.field(name, pyarrow.string()))
+    return pyarrow.schema(fields)
+
+
+def coerce_rows(rows, schema):
+    """
+    Return the rows as a dictionary of columns matching schema.
+
+    Fields the schema does not have are dropped, missing fields are null, and a value is
+    wrapped in or joined from a list when a template returns it the other way round.
+    """
+    columns = {}
+    for field in schema:
+        is_list = pyarrow.types.is_list(field.type)
+        values = []
+        for row in rows:
+            value = row.get(field.name)
+            if value is None:
+                values.append(None)
+            elif is_list:
+                values.append(
+                    [str(v) for v in value] if isinstance(value, list) else [str(value)]
+                )
+            else:
+                values.append(
+                    " ".join(str(v) for v in value)
+                    if isinstance(value, list)
+                    else str(value)
+                )
+        columns[field.name] = values
+    return columns
+
+
+class RowExporter:
+    """
+    Append parsed rows from many devices to one export file per command.  Safe to share between threads.
+
+    arrow and parquet files are split by device_type as well, since each platform's template has
+    its own fields.  With an oui_db.OuiIndex, rows with a MAC column also get a vendor column.
+
+    jsonl files are appended to across runs; arrow and parquet files are rewritten by each
+    exporter and are complete once close() has been called.
+    """
+
+    def __init__(self, output_dir, fmt="jsonl", oui=None):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(
+                f"Unknown export format {fmt}. Choose from {', '.join(EXPORT_FORMATS)}"
+            )
+        check_pyarrow(fmt)
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.oui = oui
+        self.writers = {}
+        self.rows = {}
+        self.lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, device, cmd, rows, timestamp=None, note=None, device_type=None):
+        """
+        Write the parsed rows of one command from one device.  Returns the number of rows written.
+
+        Output that could not be parsed (a string instead of a list of rows) is skipped.
+        """
+        if not isinstance(rows, list) or not rows:
+            return 0
+        meta = {
+            "device": device,
+            "timestamp": timestamp,
+            "note": note,
+            "device_type": device_type,
+        }
+        rows = [{**row, **meta} for row in rows if isinstance(row, dict)]
+        if not rows:
+            return 0
+        if self.oui is not None:
+            self.oui.enrich_rows(rows)
+
+        with self.lock:
+            if self.fmt == "jsonl":
+                path = self.write_jsonl(cmd, rows)
+            else:
+                path = self.write_columnar(cmd, device_type, rows)
+            self.rows[path] = self.rows.get(path, 0) + len(rows)
+        return len(rows)
+
+    def add_parsed(self, data):
+        """
+        Write every command of a parse_showcmds.py result (device, timestamp, note, device_type, commands).
+        """
+        return sum(
+            self.add(
+                data.get("device"),
+                cmd,
+                rows,
+                timestamp=data.get("timestamp"),
+                note=data.get("note"),
+                device_type=data.get("device_type"),
+            )
+            for cmd, rows in (data.get("commands") or {}).items()
+        )
+
+    def write_jsonl(self, cmd, rows):
+        path = export_filename(self.output_dir, cmd, "jsonl")
+        f = self.writers.get(path)
+        if f is None:
+            f = open(path, "a", encoding="utf-8")
+            self.writers[path] = f
+        f.write("".join(json.dumps(row) + "\n" for row in rows))
+        # Flush per device so readers can scan the file while the run goes on
+        f.flush()
+        return path
+
+    def write_columnar(self, cmd, device_type, rows):
+        path = export_filename(self.output_dir, cmd, self.fmt, device_type)
+        entry = self.writers.get(path)
+        if entry is None:
+            schema = make_schema(rows)
+            if self.fmt == "arrow":
+                sink = pyarrow.OSFile(path, "wb")
+                writer = pyarrow.ipc.new_file(sink, schema)
+            else:
+                sink = None
+                writer = pyarrow.parquet.ParquetWriter(path, schema)
+            entry = (schema, sink, writer, set(schema.names))
+            self.writers[path] = entry
+        schema, _, writer, known = entry
+        dropped = {name for row in rows for name in row} - known
+        if dropped:
+            print(
+                f"\txxx Dropping fields not in the schema of {path}: "
+                f"{', '.join(sorted(dropped))}"
+            )
+            # Warn once per field and file
+            known.update(dropped)
+        table = pyarrow.table(coerce_rows(rows, schema), schema=schema)
+        writer.write_table(table)
+        return path
+
+    def close(self):
+        """
+        Close every export file.  Columnar files can only be read after this.
+        """
+        with self.lock:
+            for entry in self.writers.values():
+                if self.fmt == "jsonl":
+                    entry.close()
+                else:
+                    _, sink, writer, _ = entry
+                    writer.close()
+                    if sink is not None:
+                        sink.close()
+            self.writers = {}
+
+    def summary(self):
+        """
+        Return a dictionary of export file -> rows written.
+        """
+        with self.lock:
+            return dict(self.rows)
+
+
+def read_export(path):
+    """
+    Return the rows of an export file as a list of dictionaries (arrow files are memory-mapped).
+    """
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    check_pyarrow("arrow")
+    if path.endswith(".parquet"):
+        return pyarrow.parquet.read_table(path).to_pylist()
+    with pyarrow.memory_map(path) as source:
+        return pyarrow.ipc.open_file(source).read_all().to_pylist()
+
+
+def command_from_filename(filename):
+    """
+    Return (device, command) from a utils.get_show_cmd_parsed file name such as 10.1.10.66_show_ip_arp.json.
+    """
+    basefn = os.path.basename(filename)[: -len(".json")]
+    device, sep, cmd = basefn.partition("_show_")
+    if not sep:
+        return basefn, None
+    return device, "show " + cmd.replace("_", " ")
+
+
+def export_json_file(exporter, filename):
+    """
+    Add the rows of a parse_showcmds.py per-device JSON file or a get_show_cmd_parsed per-command JSON file.
+    """
+    data = utils.read_json(filename)
+    if isinstance(data, dict) and "commands" in data:
+        return exporter.add_parsed(data)
+    device, cmd = command_from_filename(filename)
+    if cmd is None:
+        print(f"\txxx Cannot tell the command of {filename}; skipping")
+        return 0
+    return exporter.add(device, cmd, data)
+
+
+def main():
+    """
+    Convert existing per-device JSON files into one export file per command.
+    """
+    files = []
+    for path in arguments.input:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*.json")))
+        else:
+            files.extend(glob.glob(path))
+    files = sorted(set(files))
+    if not files:
+        exit(f"No JSON files found in {arguments.input}. Aborting Execution.")
+
+    start = time.perf_counter()
+    oui = oui_db.require_index() if arguments.vendor else None
+    with RowExporter(arguments.output_subdir, arguments.format, oui=oui) as exporter:
+        for filename in files:
+            try:
+                export_json_file(exporter, filename)
+            except (OSError, ValueError) as e:
+                print(f"\txxx Cannot export {filename}: {e}")
+        summary = exporter.summary()
+
+    for path, count in sorted(summary.items()):
+        print(f"{count:>10} rows  {path}")
+    print(
+        f"\nExported {sum(summary.values())} rows from {len(files)} files in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export parsed show command JSON files into one JSON Lines or columnar file per command "
+        "(and device type for the columnar formats)",
+        epilog="Usage: ' python export_rows.py -i parsed -f arrow -o export' ",
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        nargs="+",
+        help="JSON files, directories or glob patterns to export. Default: parsed",
+        default=["parsed"],
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=EXPORT_FORMATS,
+        help="Export format. 'arrow' and 'parquet' require the optional pyarrow module. Default: jsonl",
+        default="jsonl",
+    )
+    parser.add_argument(
+        "-o",
+        "--output_subdir",
+        help="Name of output subdirectory for the export files. Default: export",
+        default="export",
+    )
+    parser.add_argument(
+        "--vendor",
+        action="store_true",
+        help="Add the vendor of the MAC address to rows with one (see oui_db.py)",
+        default=False,
+    )
+    arguments = parser.parse_args()
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: facts_cache
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Persistent cache of device facts.
+#
+# The device_type, hostname, platform and OS version of a device rarely change,
+# but today they are guessed from hostname regexes or re-learned with extra show
+# commands on every run.  This module keeps them in a JSON file (device_facts.json
+# by default, or the path in DEVICE_FACTS_CACHE) keyed by the device name or IP
+# used to reach it, with the time each device was last seen.  Entries older than
+# the TTL are ignored so changes are eventually picked up.
+#
+#     python facts_cache.py -d 10.1.10.66 10.1.10.67 --autodetect
+#     python facts_cache.py --list
+
+import argparse
+import atexit
+import datetime
+import json
+import os
+import threading
+import time
+
+import utils
+import jump_hosts
+import session_limits
+import textfsm_cache
+
+FACTS_FN = "device_facts.json"
+
+# Facts older than this are treated as missing and gathered again
+DEFAULT_TTL = 7 * 24 * 3600
+
+# ntc-templates platform names that differ from the Netmiko device_type
+TEMPLATE_PLATFORMS = {"cisco_wlc": "cisco_wlc_ssh"}
+
+_lock = threading.Lock()
+_state = {
+    "path": None,
+    "facts": None,
+    "dirty": False,
+}
+
+
+def facts_path():
+    """
+    Return the path of the facts cache file: DEVICE_FACTS_CACHE or device_facts.json in the current directory.
+    """
+    return os.environ.get("DEVICE_FACTS_CACHE") or FACTS_FN
+
+
+def load_facts(path=None):
+    """
+    Load the facts cache file on first use (or when a different path is given).  Call with _lock held.
+    """
+    path = path or facts_path()
+    if _state["facts"] is not None and _state["path"] == path:
+        return _state["facts"]
+
+    facts = {}
+    if os.path.isfile(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                facts = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable device facts cache {path}: {e}")
+    _state.update({"path": path, "facts": facts, "dirty": False})
+    return facts
+
+
+def is_fresh(entry, ttl=DEFAULT_TTL):
+    """
+    Return True if a facts entry was seen within the last ttl seconds (a ttl of None never expires).
+    """
+    if ttl is None:
+        return True
+    return time.time() - entry.get("last_seen", 0) <= ttl
+
+
+def lookup(device, ttl=DEFAULT_TTL, path=None):
+    """
+    Return a copy of the cached facts for a device, or None if there are none or they are older than ttl.
+    """
+    with _lock:
+        entry = load_facts(path).get(device.strip())
+    if entry is None or not is_fresh(entry, ttl):
+        return None
+    return dict(entry)
+
+
+def verified_device_type(entry):
+    """
+    Return the device_type of a facts entry if it was autodetected or confirmed by show version, otherwise None.
+    """
+    if not entry or "autodetected" not in entry:
+        # Written by something that did not check the device_type (e.g. an older seed_devlist.py)
+        return None
+    if not entry["autodetected"] and not entry.get("hostname"):
+        # The show version output of the assumed type did not parse, so it was never confirmed
+        return None
+    return entry.get("device_type")
+
+
+def remember(device, path=None, **facts):
+    """
+    Add or update the facts for a device and stamp it as seen now.  Facts given as None are left unchanged.
+    """
+    with _lock:
+        entry = load_facts(path).setdefault(device.strip(), {})
+        entry.update({k: v for k, v in facts.items() if v is not None})
+        entry["last_seen"] = time.time()
+        _state["dirty"] = True
+        return dict(entry)
+
+
+def forget(device, path=None):
+    """
+    Remove a device from the facts cache.
+    """
+    with _lock:
+        if load_facts(path).pop(device.strip(), None) is not None:
+            _state["dirty"] = True
+
+
+def save_facts(path=None):
+    """
+    Write the facts cache to disk if it has changed.
+
+    The file is written under a temporary name and renamed so an interrupted run never leaves a partial file.
+    """
+    with _lock:
+        if _state["facts"] is None or not _state["dirty"]:
+            return
+        path = path or _state["path"]
+        data = json.dumps(_state["facts"], indent=4, sort_keys=True)
+        _state["dirty"] = False
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+atexit.register(save_facts)
+
+
+def autodetect_device_type(dev_dict, debug=False):
+    """
+    Return the Netmiko device_type reported by SSHDetect for a device, or None if it cannot be determined.
+    """
+    from netmiko import SSHDetect
+
+    detect_dict = {k: v for k, v in dev_dict.items() if k != "device_type"}
+    detect_dict["device_type"] = "autodetect"
+    try:
+        # SSHDetect logs in too, so it takes a login token and session slot like any session
+        slot = session_limits.acquire(dev_dict)
+    except TimeoutError as e:
+        print(f"Cannot autodetect the device type of {dev_dict['ip']}: {e}")
+        return None
+    sock = None
+    try:
+        if "sock" not in detect_dict:
+            # Devices behind a jump host are reached over a channel, as in utils.connect_timed
+            sock = jump_hosts.open_channel(
+                dev_dict, timeout=dev_dict.get("conn_timeout", 10)
+            )
+            if sock is not None:
+                detect_dict["sock"] = sock
+        guesser = SSHDetect(**detect_dict)
+        best_match = guesser.autodetect()
+        guesser.connection.disconnect()
+    except Exception as e:
+        if sock is not None:
+            sock.close()
+        print(f"Cannot autodetect the device type of {dev_dict['ip']}: {e}")
+        return None
+    finally:
+        slot.release()
+    if debug:
+        print(f"Autodetected {dev_dict['ip']} as {best_match}")
+    return best_match
+
+
+def parse_version(device_type, parsed):
+    """
+    Return the hostname, platform and OS version from parsed show version (or WLC show sysinfo) output.
+    """
+    if not parsed or isinstance(parsed, str):
+        return {}
+    row = parsed[0]
+    if device_type == "cisco_wlc":
+        return {
+            "hostname": row.get("system_name"),
+            "platform": "Cisco Controller",
+            "os_version": row.get("product_version"),
+        }
+    if device_type == "cisco_nxos":
+        return {
+            "hostname": row.get("hostname"),
+            "platform": row.get("platform"),
+            "os_version": row.get("os"),
+        }
+    hardware = row.get("hardware") or []
+    return {
+        "hostname": row.get("hostname"),
+        "platform": hardware[0] if isinstance(hardware, list) and hardware else None,
+        "os_version": row.get("version"),
+    }
+
+
+def gather_facts(dev_dict, autodetect=False, debug=False):
+    """
+    Log into a device and return its facts: device_type (optionally from SSHDetect), hostname, platform and OS version.
+
+    The autodetected key is only set when the device_type was autodetected or confirmed by a
+    parsed show version.  Returns None if the device does not respond.
+    """
+    device_type = dev_dict.get("device_type")
+    detected = False
+    if autodetect or device_type in (None, "", "unknown", "autodetect"):
+        detected_type = autodetect_device_type(dev_dict, debug=debug)
+        if detected_type:
+            device_type = detected_type
+            detected = True
+    if device_type in (None, "", "unknown", "autodetect"):
+        return None
+
+    dev_dict = dict(dev_dict, device_type=device_type)
+    show_cmd = "show sysinfo" if device_type == "cisco_wlc" else "show version"
+    parsed = utils.conn_and_get_output_parsed(dev_dict, show_cmd, debug=debug)
+    utils.close_session(dev_dict)
+    if not parsed:
+        return None
+    if isinstance(parsed, str) and device_type in TEMPLATE_PLATFORMS:
+        parsed = textfsm_cache.parse_output(
+            TEMPLATE_PLATFORMS[device_type], show_cmd, parsed
+        )
+
+    facts = parse_version(device_type, parsed)
+    facts["device_type"] = device_type
+    if detected or facts.get("hostname"):
+        facts["autodetected"] = detected
+    return facts
+
+
+def get_facts(dev_dict, ttl=DEFAULT_TTL, autodetect=False, refresh=False, debug=False):
+    """
+    Return the facts for a device from the cache, gathering and caching them if missing, stale or refresh is set.
+
+    Returns None if the facts are not cached and the device does not respond.
+    """
+    device = dev_dict["ip"]
+    if not refresh:
+        facts = lookup(device, ttl)
+        if verified_device_type(facts):
+            if debug:
+                print(f"Using cached facts for {device}")
+            return facts
+
+    facts = gather_facts(dev_dict, autodetect=autodetect, debug=debug)
+    if facts is None:
+        return None
+    if "autodetected" not in facts:
+        # Do not cache a device_type that was neither autodetected nor confirmed
+        device_type = facts.pop("device_type")
+        return dict(remember(device, **facts), device_type=device_type)
+    return remember(device, **facts)
+
+
+def main():
+    """
+    Gather, refresh or list cached device facts.
+    """
+    path = arguments.facts_file or facts_path()
+    with _lock:
+        facts = load_facts(path)
+
+    if arguments.list:
+        for device, entry in sorted(facts.items()):
+            last_seen = datetime.datetime.fromtimestamp(entry.get("last_seen", 0))
+            stale = "" if is_fresh(entry, arguments.ttl) else "  (stale)"
+            print(
+                f"{device:<30} {entry.get('device_type') or '':<12} {entry.get('hostname') or '':<25} "
+                f"{entry.get('platform') or '':<20} {entry.get('os_version') or '':<12} "
+                f"{last_seen:%Y-%m-%d %H:%M}{stale}"
+            )
+        print(f"\n{len(facts)} devices in {path}")
+        return
+
+    if not arguments.devices:
+        exit("Provide devices with -d or use --list. Aborting Execution.")
+
+    utils.load_environment()
+    usr = os.environ["NET_USR"]
+    pwd = os.environ["NET_PWD"]
+    for device in arguments.devices:
+        dev_dict = {
+            "device_type": arguments.device_type,
+            "ip": device,
+            "username": usr,
+            "password": pwd,
+            "secret": pwd,
+            "port": arguments.port,
+        }
+        entry = get_facts(
+            dev_dict,
+            ttl=arguments.ttl,
+            autodetect=arguments.autodetect,
+            refresh=arguments.refresh,
+            debug=True,
+        )
+        print(f"{device}: {entry}")
+    save_facts(path)
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gather and list cached device facts (device type, hostname, platform, OS version)",
+        epilog="Usage: ' python facts_cache.py -d 10.1.10.66 --autodetect' ",
+    )
+    parser.add_argument(
+        "-d", "--devices", nargs="+", help="Devices (IP or FQDN) to gather facts for"
+    )
+    parser.add_argument(
+        "-t",
+        "--device_type",
+        help="Device type to use when not autodetecting. Default: cisco_ios",
+        action="store",
+        default="cisco_ios",
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        help="Port for ssh connection. Default: 22",
+        action="store",
+        default="22",
+    )
+    parser.add_argument(
+        "-a",
+        "--autodetect",
+        action="store_true",
+        help="Confirm the device type with Netmiko SSHDetect",
+        default=False,
+    )
+    parser.add_argument(
+        "-r",
+        "--refresh",
+        action="store_true",
+        help="Gather facts again even if the cached facts are still fresh",
+        default=False,
+    )
+    parser.add_argument(
+        "--ttl",
+        type=int,
+        help=f"Seconds cached facts stay fresh. Default: {DEFAULT_TTL}",
+        default=DEFAULT_TTL,
+    )
+    parser.add_argument(
+        "-f",
+        "--facts_file",
+        help=f"Facts cache file. Default: $DEVICE_FACTS_CACHE or {FACTS_FN}",
+        action="store",
+    )
+    parser.add_argument(
+        "-l",
+        "--list",
+        action="store_true",
+        help="List the cached facts",
+        default=False,
+    )
+    arguments = parser.parse_args()
+    main()
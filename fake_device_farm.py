@@ -0,0 +1,618 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: fake_device_farm
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Simulated farm of Cisco SSH devices for benchmarking without real gear.
+#
+# Each fake device is a paramiko SSH server on its own local port that behaves
+# enough like IOS, NX-OS or an AireOS WLC for Netmiko and the asyncio engine:
+# it accepts any credentials, prints a banner and a prompt, echoes commands and
+# answers every command (including those in show_cmds.yml) with canned output of
+# a configurable size after a configurable latency.  A fraction of the devices
+# can be made to refuse connections, reject the login or stall mid-run and then
+# drop the session.  Like a real device, output longer than a screen stops at
+# --More-- until paging is turned off (terminal length 0, config paging
+# disable).  With --bastion_port a fake jump host forwards SSH channels
+# to the devices, so jump_hosts.py can be tested without a real bastion.
+#
+#     python fake_device_farm.py -n 50 -p 9000 -t cisco_ios --latency 0.2
+#
+# benchmark.py starts a farm like this in a separate process.
+
+import argparse
+import random
+import re
+import socket
+import threading
+import time
+
+import paramiko
+
+FAILURE_MODES = ["refuse", "auth", "hang"]
+
+PROMPTS = {
+    "cisco_ios": "{hostname}#",
+    "cisco_nxos": "{hostname}#",
+    "cisco_wlc": "({hostname}) >",
+}
+
+# Lines per screen while paging is on
+PAGE_LINES = 24
+
+# Commands that turn paging off (answered with just the prompt)
+PAGING_OFF_REGEX = re.compile(
+    r"^(term\w*\s+len\w*\s+0|term\w*\s+pag\w*\s+0|config\s+paging\s+disable)$"
+)
+MORE_PROMPT = " --More-- "
+
+# One representative row per command family, repeated to reach the requested output size
+ROW_TEMPLATES = [
+    (
+        "show ip arp",
+        "Internet  10.{a}.{b}.{c}  {age:>6}   0050.56{a:02x}.{b:02x}{c:02x}  ARPA   Vlan{vlan}",
+    ),
+    (
+        "show arp",
+        "Internet  10.{a}.{b}.{c}  {age:>6}   0050.56{a:02x}.{b:02x}{c:02x}  ARPA   Vlan{vlan}",
+    ),
+    (
+        "show mac",
+        " {vlan:>4}    0050.56{a:02x}.{b:02x}{c:02x}    DYNAMIC     Gi1/0/{port}",
+    ),
+    (
+        "show int status",
+        "Gi1/0/{port:<5} Access port {c:<10} connected    {vlan:<10} a-full a-1000 10/100/1000BaseTX",
+    ),
+    (
+        "show interface status",
+        "Gi1/0/{port:<5} Access port {c:<10} connected    {vlan:<10} a-full a-1000 10/100/1000BaseTX",
+    ),
+    (
+        "show cdp",
+        "Device ID: sw{c:03d}.example.net\n  IP address: 10.{a}.{b}.{c}\nPlatform: cisco WS-C3850-48P,  Capabilities: Switch IGMP\nInterface: GigabitEthernet1/0/{port},  Port ID (outgoing port): TenGigabitEthernet1/1/1",
+    ),
+    (
+        "show ip route",
+        "O        10.{a}.{b}.0/24 [110/{age}] via 10.0.{b}.{c}, 2w1d, Vlan{vlan}",
+    ),
+    (
+        "show log",
+        "*Oct 18 01:{b:02d}:{c:02d}: %LINK-3-UPDOWN: Interface GigabitEthernet1/0/{port}, changed state to up",
+    ),
+    (
+        "show client",
+        "00:50:56:{a:02x}:{b:02x}:{c:02x}  ap{c:03d}          Associated     {vlan}   Yes    802.11ac(5 GHz)  {port}",
+    ),
+    (
+        "show ap",
+        "ap{c:03d}              2     AIR-AP3802I-B-K9      00:50:56:{a:02x}:{b:02x}:{c:02x}  Floor{b}  US  10.{a}.{b}.{c}",
+    ),
+]
+DEFAULT_ROW = "  line {n:>6}  10.{a}.{b}.{c}  Vlan{vlan}  GigabitEthernet1/0/{port}  {age} packets input, {c} errors"
+
+
+def show_version(device_type, hostname):
+    """
+    Return a short show version (or show sysinfo) header so the hostname and platform can be parsed.
+    """
+    if device_type == "cisco_wlc":
+        return (
+            "Manufacturer's Name.............................. Cisco Systems Inc.\n"
+            "Product Name..................................... Cisco Controller\n"
+            "Product Version.................................. 8.10.185.0\n"
+            f"System Name...................................... {hostname}\n"
+        )
+    if device_type == "cisco_nxos":
+        return (
+            "Cisco Nexus Operating System (NX-OS) Software\n"
+            "  NXOS: version 9.3(10)\n"
+            "  cisco Nexus9000 C93180YC-FX Chassis\n"
+            f"  Device name: {hostname}\n"
+        )
+    return (
+        "Cisco IOS XE Software, Version 17.09.04a\n"
+        f"{hostname} uptime is 12 weeks, 3 days, 4 hours, 5 minutes\n"
+        "cisco C9300-48P (X86) processor with 1419044K/6147K bytes of memory.\n"
+        "Model Number                       : C9300-48P\n"
+    )
+
+
+def canned_output(device_type, hostname, cmd, size):
+    """
+    Return fake output of roughly size bytes for a command, built from rows that look like the real command.
+    """
+    cmd = cmd.strip()
+    if "version" in cmd or "sysinfo" in cmd:
+        return show_version(device_type, hostname)
+
+    template = DEFAULT_ROW
+    for prefix, row in ROW_TEMPLATES:
+        if cmd.startswith(prefix):
+            template = row
+            break
+
+    rng = random.Random(f"{hostname} {cmd}")
+    lines = []
+    total = 0
+    n = 0
+    while total < size:
+        n += 1
+        line = template.format(
+            n=n,
+            a=rng.randrange(256),
+            b=rng.randrange(256),
+            c=rng.randrange(1, 255),
+            vlan=rng.randrange(1, 4095),
+            port=rng.randrange(1, 49),
+            age=rng.randrange(240),
+        )
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)
+
+
+class FakeServer(paramiko.ServerInterface):
+    """
+    paramiko server interface that accepts any password (unless the device fails logins) and a single shell.
+    """
+
+    def __init__(self, reject_auth=False):
+        self.reject_auth = reject_auth
+        self.shell_requested = threading.Event()
+
+    def check_auth_password(self, username, password):
+        if self.reject_auth:
+            return paramiko.AUTH_FAILED
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell_requested.set()
+        return True
+
+
+class BastionServer(paramiko.ServerInterface):
+    """
+    paramiko server interface for a fake jump host: any password, and direct-tcpip channels to any TCP port.
+    """
+
+    def __init__(self):
+        self.sockets = {}
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        try:
+            self.sockets[chanid] = socket.create_connection(destination, timeout=10)
+        except OSError:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+        return paramiko.OPEN_SUCCEEDED
+
+
+class FakeBastion:
+    """
+    A local jump host that forwards direct-tcpip channels, like an OpenSSH bastion, for testing jump_hosts.py.
+
+    transports and channels count the SSH connections and forwarded channels it has accepted.
+    """
+
+    def __init__(self, port, host_key, host="127.0.0.1"):
+        self.host = host
+        self.port = port
+        self.host_key = host_key
+        self.transports = 0
+        self.channels = 0
+        self.sock = None
+
+    def start(self):
+        """
+        Open the listening socket and start accepting connections in a daemon thread.
+        """
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(100)
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=self.handle_client, args=(client,), daemon=True
+            ).start()
+
+    def handle_client(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        server = BastionServer()
+        try:
+            transport.start_server(server=server)
+            self.transports += 1
+            while transport.is_active():
+                channel = transport.accept(1)
+                if channel is None:
+                    continue
+                self.channels += 1
+                sock = server.sockets.pop(channel.get_id())
+                for src, dst in ((channel, sock), (sock, channel)):
+                    threading.Thread(
+                        target=self.pump, args=(src, dst), daemon=True
+                    ).start()
+        except (EOFError, OSError, paramiko.SSHException):
+            pass
+        finally:
+            transport.close()
+
+    def pump(self, src, dst):
+        """
+        Copy bytes from src to dst until either side closes, then close both.
+        """
+        try:
+            while True:
+                data = src.recv(32768)
+                if not data:
+                    break
+                dst.sendall(data)
+        except (OSError, EOFError):
+            pass
+        finally:
+            src.close()
+            dst.close()
+
+
+class FakeDevice:
+    """
+    One simulated device listening on a local port.
+
+    latency is the delay before each command's output (plus up to jitter seconds), banner_delay
+    the delay before the banner and prompt, and output_size the approximate bytes per command.
+    failure is None or one of FAILURE_MODES; a "hang" device stops answering after three commands
+    and drops the session after hang_time seconds.
+    """
+
+    def __init__(
+        self,
+        port,
+        host_key,
+        device_type="cisco_ios",
+        hostname=None,
+        latency=0.0,
+        jitter=0.0,
+        banner_delay=0.0,
+        output_size=2048,
+        failure=None,
+        hang_time=30.0,
+        host="127.0.0.1",
+    ):
+        self.host = host
+        self.port = port
+        self.host_key = host_key
+        self.device_type = device_type
+        self.hostname = hostname or f"sw{port}"
+        self.latency = latency
+        self.jitter = jitter
+        self.banner_delay = banner_delay
+        self.output_size = output_size
+        self.failure = failure
+        self.hang_time = hang_time
+        self.outputs = {}
+        self.sock = None
+
+    @property
+    def prompt(self):
+        return PROMPTS.get(self.device_type, PROMPTS["cisco_ios"]).format(
+            hostname=self.hostname
+        )
+
+    def start(self):
+        """
+        Open the listening socket and start accepting connections in a daemon thread.
+        """
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(100)
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def stop(self):
+        if self.sock is not None:
+            self.sock.close()
+
+    def accept_loop(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            if self.failure == "refuse":
+                client.close()
+                continue
+            threading.Thread(
+                target=self.handle_client, args=(client,), daemon=True
+            ).start()
+
+    def output_for(self, cmd):
+        if cmd not in self.outputs:
+            self.outputs[cmd] = canned_output(
+                self.device_type, self.hostname, cmd, self.output_size
+            )
+        return self.outputs[cmd]
+
+    def handle_client(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        server = FakeServer(reject_auth=self.failure == "auth")
+        try:
+            transport.start_server(server=server)
+            channel = transport.accept(30)
+            if channel is None or not server.shell_requested.wait(30):
+                return
+            self.run_shell(channel)
+        except (EOFError, OSError, paramiko.SSHException):
+            pass
+        finally:
+            transport.close()
+
+    def read_line(self, channel, buffer):
+        """
+        Return (line, rest of buffer) once a full line has been received, or (None, buffer) on disconnect.
+        """
+        while "\n" not in buffer and "\r" not in buffer:
+            data = channel.recv(4096)
+            if not data:
+                return None, buffer
+            buffer += data.decode("utf-8", errors="ignore")
+        for i, ch in enumerate(buffer):
+            if ch in "\r\n":
+                rest = buffer[i + 1 :]
+                if ch == "\r" and rest.startswith("\n"):
+                    rest = rest[1:]
+                return buffer[:i], rest
+
+    def read_key(self, channel, buffer):
+        """
+        Return (key, rest of buffer) for the next key pressed at a --More-- prompt, or (None, buffer) on disconnect.
+        """
+        if not buffer:
+            data = channel.recv(4096)
+            if not data:
+                return None, buffer
+            buffer = data.decode("utf-8", errors="ignore")
+        return buffer[0], buffer[1:]
+
+    def run_shell(self, channel):
+        time.sleep(self.banner_delay)
+        channel.sendall(f"\r\nFake {self.device_type} device {self.hostname}\r\n")
+        buffer = ""
+        if self.device_type == "cisco_wlc":
+            # AireOS asks for the credentials again inside the shell
+            for login_prompt in ("User: ", "Password:"):
+                channel.sendall(login_prompt)
+                line, buffer = self.read_line(channel, buffer)
+                if line is None:
+                    return
+                channel.sendall("\r\n")
+        channel.sendall(f"\r\n{self.prompt}")
+
+        commands = 0
+        paging = True
+        while True:
+            line, buffer = self.read_line(channel, buffer)
+            if line is None:
+                return
+            cmd = line.strip()
+            channel.sendall(f"{line}\r\n")
+            if cmd in ("exit", "logout"):
+                return
+            if cmd:
+                commands += 1
+                if self.failure == "hang" and commands > 3:
+                    # Stop answering part way through the run, then drop the session
+                    time.sleep(self.hang_time)
+                    return
+                time.sleep(self.latency + random.uniform(0, self.jitter))
+                if PAGING_OFF_REGEX.match(cmd):
+                    paging = False
+                elif not cmd.startswith(("term", "config paging")):
+                    lines = self.output_for(cmd).split("\n")
+                    while paging and len(lines) > PAGE_LINES - 1:
+                        page, lines = lines[: PAGE_LINES - 1], lines[PAGE_LINES - 1 :]
+                        channel.sendall("\r\n".join(page) + f"\r\n{MORE_PROMPT}")
+                        key, buffer = self.read_key(channel, buffer)
+                        if key is None:
+                            return
+                        # Erase the --More-- prompt; anything but space ends the output
+                        channel.sendall("\r" + " " * len(MORE_PROMPT) + "\r")
+                        if key != " ":
+                            lines = []
+                    if lines:
+                        channel.sendall("\r\n".join(lines) + "\r\n")
+            channel.sendall(self.prompt)
+
+
+def start_farm(
+    count,
+    base_port=9000,
+    device_type="cisco_ios",
+    latency=0.0,
+    jitter=0.0,
+    banner_delay=0.0,
+    output_size=2048,
+    fail_rate=0.0,
+    fail_modes=None,
+    hang_time=30.0,
+    seed=0,
+    host="127.0.0.1",
+):
+    """
+    Start count fake devices on consecutive ports from base_port and return the list of FakeDevice objects.
+
+    fail_rate is the fraction of devices that fail, each with a random mode from fail_modes.
+    """
+    host_key = paramiko.RSAKey.generate(2048)
+    fail_modes = fail_modes or FAILURE_MODES
+    rng = random.Random(seed)
+    devices = []
+    for i in range(count):
+        failure = rng.choice(fail_modes) if rng.random() < fail_rate else None
+        device = FakeDevice(
+            base_port + i,
+            host_key,
+            device_type=device_type,
+            hostname=f"sw{i + 1:04d}",
+            latency=latency,
+            jitter=jitter,
+            banner_delay=banner_delay,
+            output_size=output_size,
+            failure=failure,
+            hang_time=hang_time,
+            host=host,
+        )
+        device.start()
+        devices.append(device)
+    return devices
+
+
+def main():
+    """
+    Run a farm of fake devices until interrupted.
+    """
+    devices = start_farm(
+        arguments.count,
+        base_port=arguments.base_port,
+        device_type=arguments.device_type,
+        latency=arguments.latency,
+        jitter=arguments.jitter,
+        banner_delay=arguments.banner_delay,
+        output_size=arguments.output_size,
+        fail_rate=arguments.fail_rate,
+        fail_modes=arguments.fail_modes.split(","),
+        hang_time=arguments.hang_time,
+        seed=arguments.seed,
+    )
+    failed = [f"{d.port}:{d.failure}" for d in devices if d.failure]
+    print(
+        f"Started {len(devices)} fake {arguments.device_type} devices on ports "
+        f"{arguments.base_port}-{arguments.base_port + len(devices) - 1}"
+    )
+    if arguments.bastion_port:
+        FakeBastion(arguments.bastion_port, paramiko.RSAKey.generate(2048)).start()
+        print(f"Started a fake jump host on port {arguments.bastion_port}")
+    if failed:
+        print(f"Failing devices: {', '.join(failed)}")
+    # benchmark.py waits for this line before starting a run
+    print("READY", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a farm of fake Cisco SSH devices for benchmarking",
+        epilog="Usage: ' python fake_device_farm.py -n 50 -p 9000 --latency 0.2' ",
+    )
+    parser.add_argument(
+        "-n", "--count", type=int, help="Number of devices. Default: 10", default=10
+    )
+    parser.add_argument(
+        "-p",
+        "--base_port",
+        type=int,
+        help="Port of the first device; each device listens on the next port. Default: 9000",
+        default=9000,
+    )
+    parser.add_argument(
+        "-t",
+        "--device_type",
+        choices=list(PROMPTS),
+        help="Device type to simulate. Default: cisco_ios",
+        default="cisco_ios",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        help="Seconds before each command's output. Default: 0",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        help="Random extra latency of up to this many seconds per command. Default: 0",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--banner_delay",
+        type=float,
+        help="Seconds before the banner and first prompt. Default: 0",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--output_size",
+        type=int,
+        help="Approximate bytes of output per command. Default: 2048",
+        default=2048,
+    )
+    parser.add_argument(
+        "--fail_rate",
+        type=float,
+        help="Fraction of devices that fail (0-1). Default: 0",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--fail_modes",
+        help=f"Comma separated failure modes to choose from. Default: {','.join(FAILURE_MODES)}",
+        default=",".join(FAILURE_MODES),
+    )
+    parser.add_argument(
+        "--hang_time",
+        type=float,
+        help="Seconds a 'hang' device stalls before dropping the session. Default: 30",
+        default=30.0,
+    )
+    parser.add_argument(
+        "--bastion_port",
+        type=int,
+        help="Also run a fake jump host on this port that forwards to the devices (see jump_hosts.py)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Random seed for picking failing devices. Default: 0",
+        default=0,
+    )
+    arguments = parser.parse_args()
+    main()
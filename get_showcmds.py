@@ -13,15 +13,31 @@ __copyright__ = "Copyright (c) 2018 Claudia"
 __license__ = "Python"
 
 import argparse
+import concurrent.futures
 import netmiko
 import datetime
+import time
 import utils
+import async_collect
+import manifest
+import journal
+import retry_policy
+import preflight
+import dedup_store
+import metrics
+import facts_cache
 import add_2env
 import os
 import re
 import dotenv
 import getpass
 
+# Device types with a show command list in show_cmds.yml (cisco_xe, as reported by
+# Netmiko autodetect for IOS-XE, uses the IOS commands)
+SUPPORTED_DEVICE_TYPES = ["cisco_ios", "cisco_xe", "cisco_nxos", "cisco_wlc"]
+
+NO_OUTPUT_ERROR = "No output collected; possible login or connection issue"
+
 
 def main():
     """
@@ -44,8 +60,24 @@ def main():
     # Set the environment variable for Netmiko to use TextFMS ntc-templates library
     # os.environ["NET_TEXTFSM"] = "./ntc-templates/templates"
 
+    resume = None
+    if arguments.resume:
+        try:
+            resume = journal.load_journal(
+                journal.journal_path(arguments.output_subdir, arguments.resume)
+            )
+        except (OSError, ValueError) as e:
+            exit(f"Cannot resume run {arguments.resume}: {e}. Aborting Execution.")
+        # Reuse the settings of the interrupted run so file names and commands match
+        timestamp = resume["timestamp"]
+        arguments.note = resume["note"]
+        arguments.show_cmd = resume["show_cmd"]
+        arguments.store = resume["store"] or arguments.store
+
     device_list = []
-    if arguments.file_of_devs:
+    if resume:
+        device_list = [d["ip"] for d in resume["devices"]]
+    elif arguments.file_of_devs:
         fh = utils.open_file(arguments.file_of_devs)
         devlist = fh.readlines()
         for line in devlist:
@@ -83,6 +115,7 @@ def main():
         mfa = pwd
         sec = pwd
 
+    devdicts = []
     for dev in device_list:
         devdict = {
             "device_type": arguments.device_type,
@@ -92,39 +125,671 @@ def main():
             "secret": sec,
             "port": arguments.port,
         }
+        devdicts.append(devdict)
+
+    resumed = {}
+    if resume:
+        # The device types were resolved (and possibly autodetected) by the interrupted run
+        for devdict, saved in zip(devdicts, resume["devices"]):
+            devdict.update(device_type=saved["device_type"], port=saved["port"])
+        devdicts, resumed = plan_resume(resume, devdicts)
+
+    # Leave out devices whose SSH port does not answer before any session is started
+    unreachable = []
+    if not arguments.no_preflight:
+        devdicts, unreachable = preflight.check_devices(
+            devdicts, timeout=arguments.preflight_timeout
+        )
+
+    # Devices that were unreachable when an autodetect run started still need a type
+    autodetect_devdicts = [d for d in devdicts if d["device_type"] == "autodetect"]
+    if autodetect_devdicts:
+        resolve_device_types(autodetect_devdicts)
+
+    # Journal every finished device so an interrupted run can be resumed
+    note_text = utils.replace_space(arguments.note) if arguments.note else None
+    run_id = journal.make_run_id(timestamp, note_text)
+    journal_fn = journal.journal_path(arguments.output_subdir, run_id)
+    run_journal = journal.open_journal(journal_fn)
+    if resume:
+        journal.write_event(run_journal, {"event": "resume", "run_id": run_id})
+    else:
+        journal.start_run(
+            run_journal,
+            run_id,
+            timestamp,
+            note_text,
+            devdicts + [devdict for devdict, _ in unreachable],
+            show_cmd=arguments.show_cmd,
+            store=arguments.store,
+        )
+    print(
+        f"Run journal {journal_fn} (resume an interrupted run with --resume {run_id})"
+    )
+
+    # Record every run in the SQLite manifest in the output subdirectory
+    if arguments.no_manifest:
+        manifest_conn = None
+    else:
+        manifest_conn = manifest.open_manifest(
+            manifest.manifest_path(arguments.output_subdir)
+        )
 
-        # RAW Parsing with Python
-        print(f"\n===============  Device {dev} ===============")
-
-        # Set the Show Commands to execute by device type or command provided via CLI
-        if devdict["device_type"] in ["cisco_ios", "cisco_nxos", "cisco_wlc"]:
-            if arguments.show_cmd:
-                cmds = []
-                cmds.append(arguments.show_cmd)
-            elif re.search("ios", devdict["device_type"]):
-                cmds = cmd_dict["ios_show_commands"]
-            elif re.search("nxos", devdict["device_type"]):
-                cmds = cmd_dict["nxos_show_commands"]
-            elif re.search("wlc", devdict["device_type"]):
-                cmds = cmd_dict["wlc_show_commands"]
-            else:
-                cmds = cmd_dict["general_show_commands"]
-            resp = utils.conn_and_get_output(devdict, cmds, debug=True)
-
-            # Optional Note to distinguish or annotate the show commands
-            if arguments.note:
-                note_text = utils.replace_space(arguments.note)
-                basefn = f"{dev}_{timestamp}_{note_text}.txt"
-            else:
-                basefn = f"{dev}_{timestamp}.txt"
-
-            output_dir = os.path.join(os.getcwd(), arguments.output_subdir, basefn)
-            utils.write_txt(output_dir, resp)
-
-            print(f"\nSaving show command output to {output_dir}\n\n")
+    try:
+        # Unreachable devices are journaled as failed so a resumed run tries them again
+        results = []
+        for devdict, error in unreachable:
+            result = {
+                "device": devdict["ip"],
+                "device_type": devdict["device_type"],
+                "error": f"Unreachable on TCP port {devdict['port']} ({error})",
+            }
+            results.append(
+                finish_device(
+                    devdict, result, cmd_dict, timestamp, run_journal=run_journal
+                )
+            )
 
+        start = time.perf_counter()
+        if arguments.engine == "async":
+            if arguments.pipeline:
+                print("--pipeline applies to the Netmiko engine only and is ignored")
+            collect = collect_devices_async
         else:
-            print(f"\n\n\txxx Skip Device {dev} Type {devdict['device_type']}")
+            collect = collect_devices_threaded
+        results += collect(
+            devdicts, cmd_dict, timestamp, manifest_conn, run_journal, resumed
+        )
+        if not arguments.no_retry:
+            results = requeue_failed(
+                collect,
+                results,
+                devdicts,
+                cmd_dict,
+                timestamp,
+                manifest_conn,
+                run_journal,
+            )
+
+        elapsed = time.perf_counter() - start
+        journal.finish_run(run_journal, results, elapsed)
+    finally:
+        # Closing the manifest checkpoints its WAL into the database file
+        if manifest_conn is not None:
+            manifest_conn.close()
+        run_journal.close()
+    print_summary(results, elapsed)
+
+    if arguments.metrics or arguments.prom_file:
+        save_run_metrics(results, timestamp, elapsed)
+
+
+def resolve_device_types(devdicts):
+    """
+    Set the device_type of each device from the facts cache, detecting it with Netmiko SSHDetect when not cached.
+
+    Devices whose type cannot be determined are left as "unknown" and skipped by the collection.
+    """
+    workers = max(1, int(arguments.workers or 1))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        facts_list = list(
+            executor.map(
+                lambda d: facts_cache.get_facts(d, autodetect=True, debug=True),
+                devdicts,
+            )
+        )
+    for devdict, facts in zip(devdicts, facts_list):
+        devdict["device_type"] = facts["device_type"] if facts else "unknown"
+        print(f"Device {devdict['ip']} is {devdict['device_type']}")
+    facts_cache.save_facts()
+
+
+def collect_devices_threaded(
+    devdicts, cmd_dict, timestamp, manifest_conn=None, run_journal=None, resumed=None
+):
+    """
+    Collect from every device with Netmiko using a bounded pool of worker threads.
+    """
+    resumed = resumed or {}
+    workers = max(1, int(arguments.workers or 1))
+    if workers > 1:
+        print(f"Collecting from {len(devdicts)} devices with {workers} workers")
+
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for devdict in devdicts:
+            future = executor.submit(
+                collect_device,
+                devdict,
+                cmd_dict,
+                timestamp,
+                arguments.output_subdir,
+                completed_commands(resumed.get(devdict["ip"])),
+            )
+            futures[future] = devdict
+
+        for future in concurrent.futures.as_completed(futures):
+            devdict = futures[future]
+            dev = devdict["ip"]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Keep one misbehaving device from aborting the rest of the run
+                print(f"\n\txxx Device {dev} failed: {e}")
+                result = {"device": dev, "error": str(e)}
+            result = finish_device(
+                devdict,
+                result,
+                cmd_dict,
+                timestamp,
+                manifest_conn,
+                run_journal,
+                resumed.get(dev),
+            )
+            results.append(result)
+
+    return results
+
+
+def collect_devices_async(
+    devdicts, cmd_dict, timestamp, manifest_conn=None, run_journal=None, resumed=None
+):
+    """
+    Collect from every device inside a single asyncio event loop using the async_collect engine.
+    """
+    resumed = resumed or {}
+    concurrency = int(arguments.workers or 200)
+    print(
+        f"Collecting from {len(devdicts)} devices with the asyncio engine (limit {concurrency})"
+    )
+
+    results = []
+    jobs = []
+    for devdict in devdicts:
+        if devdict["device_type"] not in SUPPORTED_DEVICE_TYPES:
+            print(
+                f"\n\n\txxx Skip Device {devdict['ip']} Type {devdict['device_type']}"
+            )
+            result = {
+                "device": devdict["ip"],
+                "device_type": devdict["device_type"],
+                "error": f"Skipped device type {devdict['device_type']}",
+                "skipped": True,
+            }
+            results.append(
+                finish_device(
+                    devdict, result, cmd_dict, timestamp, manifest_conn, run_journal
+                )
+            )
+        else:
+            output_path = get_output_path(
+                devdict["ip"], timestamp, arguments.output_subdir
+            )
+            done_cmds = completed_commands(resumed.get(devdict["ip"]))
+            jobs.append(
+                (
+                    devdict,
+                    get_cmds_for_device(devdict, cmd_dict, done_cmds),
+                    output_path,
+                )
+            )
+
+    def on_done(collected_device, output_path):
+        # Runs in the event loop as each device finishes, so the journal is always current
+        devdict, written, error, elapsed, records, timings = collected_device
+        if get_open_writer() is not None:
+            output_path = get_open_writer()(output_path).path
+        print(f"\nSaved show command output to {output_path}\n\n")
+        result = make_result(devdict, output_path, written, elapsed, records, timings)
+        if error:
+            result.update({"error": error})
+        result = finish_device(
+            devdict,
+            result,
+            cmd_dict,
+            timestamp,
+            manifest_conn,
+            run_journal,
+            resumed.get(devdict["ip"]),
+        )
+        results.append(result)
+
+    async_collect.run_collection(
+        jobs,
+        concurrency=concurrency,
+        device_timeout=arguments.timeout,
+        stream=arguments.stream,
+        open_writer=get_open_writer(),
+        debug=True,
+        on_done=on_done,
+    )
+
+    return results
+
+
+def get_cmds_for_device(devdict, cmd_dict, done_cmds=()):
+    """
+    Return the list of show commands to run for a device based on its device_type or the -s option.
+
+    Commands in done_cmds (already collected by an interrupted run) are left out.
+    """
+    if arguments.show_cmd:
+        cmds = []
+        cmds.append(arguments.show_cmd)
+    else:
+        cmds = cmd_dict[get_cmd_set(devdict)]
+    return [cmd for cmd in cmds if cmd not in done_cmds]
+
+
+def get_cmd_set(devdict):
+    """
+    Return the name of the show_cmds.yml command set for a device, or "show_cmd" when -s is used.
+    """
+    if arguments.show_cmd:
+        return "show_cmd"
+    elif re.search("ios", devdict["device_type"]):
+        return "ios_show_commands"
+    elif re.search("nxos", devdict["device_type"]):
+        return "nxos_show_commands"
+    elif re.search("wlc", devdict["device_type"]):
+        return "wlc_show_commands"
+    return "general_show_commands"
+
+
+def collect_device(devdict, cmd_dict, timestamp, output_subdir, done_cmds=()):
+    """
+    Run the show commands for a single device and save the output to a timestamped file.
+
+    Commands in done_cmds are skipped.  Returns a result dictionary with the device, elapsed
+    time and either the output_path or an error.
+    """
+    dev = devdict["ip"]
+    start = time.perf_counter()
+
+    # RAW Parsing with Python
+    print(f"\n===============  Device {dev} ===============")
+
+    # Set the Show Commands to execute by device type or command provided via CLI
+    if devdict["device_type"] not in SUPPORTED_DEVICE_TYPES:
+        print(f"\n\n\txxx Skip Device {dev} Type {devdict['device_type']}")
+        return {
+            "device": dev,
+            "device_type": devdict["device_type"],
+            "error": f"Skipped device type {devdict['device_type']}",
+            "skipped": True,
+        }
+
+    cmds = get_cmds_for_device(devdict, cmd_dict, done_cmds)
+    output_path = get_output_path(dev, timestamp, output_subdir)
+    policy = retry_policy.get_policy(cmd_dict, get_cmd_set(devdict))
+
+    records = []
+    timings = {}
+    open_writer = get_open_writer()
+    if open_writer is not None:
+        with open_writer(output_path) as writer:
+            written = utils.stream_output(
+                devdict,
+                cmds,
+                writer,
+                debug=True,
+                records=records,
+                timings=timings,
+                max_failures=policy.max_failures,
+                pipeline=arguments.pipeline,
+            )
+        output_path = writer.path
+        print(f"\nSaved show command output to {output_path}\n")
+    elif arguments.stream:
+        print(f"\nStreaming show command output to {output_path}\n")
+        written = utils.stream_output_to_file(
+            devdict,
+            cmds,
+            output_path,
+            debug=True,
+            records=records,
+            timings=timings,
+            max_failures=policy.max_failures,
+            pipeline=arguments.pipeline,
+        )
+    else:
+        resp = utils.conn_and_get_output(
+            devdict,
+            cmds,
+            debug=True,
+            records=records,
+            timings=timings,
+            max_failures=policy.max_failures,
+            pipeline=arguments.pipeline,
+        )
+        utils.write_txt(output_path, resp)
+        written = len(resp)
+        print(f"\nSaving show command output to {output_path}\n\n")
+
+    return make_result(
+        devdict, output_path, written, time.perf_counter() - start, records, timings
+    )
+
+
+def get_open_writer():
+    """
+    Return the function that opens a section writer for the --store format, or None for plain .txt files.
+    """
+    if arguments.store == "dedup":
+        return dedup_store.open_writer
+    if arguments.store == "gz":
+        return utils.open_gzip_writer
+    return None
+
+
+def get_output_path(dev, timestamp, output_subdir):
+    """
+    Return the full path of the timestamped output file for a device, including the optional note.
+    """
+    # Optional Note to distinguish or annotate the show commands
+    if arguments.note:
+        note_text = utils.replace_space(arguments.note)
+        basefn = f"{dev}_{timestamp}_{note_text}.txt"
+    else:
+        basefn = f"{dev}_{timestamp}.txt"
+
+    return os.path.join(os.getcwd(), output_subdir, basefn)
+
+
+def make_result(devdict, output_path, written, elapsed, records=None, timings=None):
+    """
+    Return the result dictionary for a device given the amount of output written to its file.
+    """
+    result = {
+        "device": devdict["ip"],
+        "device_type": devdict["device_type"],
+        "path": output_path,
+        "records": records,
+        "timings": timings,
+        "elapsed": elapsed,
+    }
+    if written:
+        result.update({"output_path": output_path})
+    else:
+        result.update({"error": NO_OUTPUT_ERROR})
+    return result
+
+
+def requeue_failed(
+    collect,
+    results,
+    devdicts,
+    cmd_dict,
+    timestamp,
+    manifest_conn=None,
+    run_journal=None,
+):
+    """
+    Collect again, at the end of the run, the devices that failed with a transient error.
+
+    Each round waits an exponential backoff with jitter and runs only the commands each device
+    is still missing, until every device is done, fails with an error that is not transient or
+    reaches the attempts of the retry policy of its command set.  A device whose failed connects
+    and commands add up to max_failures over all its attempts fails fast: it is not requeued
+    again and is marked failed_fast in the summary and the journal.  Returns the updated results.
+    """
+    devdicts_by_ip = {devdict["ip"]: devdict for devdict in devdicts}
+    # Failed connects and commands of each device over every attempt so far
+    failures = {
+        r["device"]: retry_policy.failure_count(r.get("records")) for r in results
+    }
+    attempt = 1
+    while True:
+        attempt += 1
+        retry = []
+        for result in results:
+            devdict = devdicts_by_ip.get(result["device"])
+            if devdict is None or result.get("skipped"):
+                continue
+            policy = retry_policy.get_policy(cmd_dict, get_cmd_set(devdict))
+            cmds = get_cmds_for_device(devdict, cmd_dict)
+            if journal.device_status(result, cmds) == "done":
+                continue
+            if not retry_policy.is_transient(result.get("records"), policy):
+                continue
+            count = failures[result["device"]]
+            if policy.max_failures and count >= policy.max_failures:
+                if not result.get("failed_fast"):
+                    result["failed_fast"] = count
+                    journal.record_device(run_journal, result, cmds)
+                continue
+            if attempt <= policy.attempts:
+                retry.append((devdict, result, policy))
+        if not retry:
+            return results
+
+        delay = max(
+            retry_policy.backoff_delay(policy, attempt - 1) for _, _, policy in retry
+        )
+        print(
+            f"\n===============  Requeue {len(retry)} failed devices (attempt {attempt}) "
+            f"in {delay:.1f}s ==============="
+        )
+        time.sleep(delay)
+
+        # Keep what the failed attempt collected and run only the missing commands
+        resumed = {}
+        for devdict, result, _ in retry:
+            entry = {"path": result.get("path"), "commands": result.get("records")}
+            try:
+                sections = journal.read_completed_sections(entry)
+            except OSError as e:
+                print(f"Cannot read the saved output of {devdict['ip']} ({e})")
+                sections = []
+            if sections:
+                resumed[devdict["ip"]] = sections
+
+        retried = collect(
+            [devdict for devdict, _, _ in retry],
+            cmd_dict,
+            timestamp,
+            manifest_conn,
+            run_journal,
+            resumed,
+        )
+        for r in retried:
+            failures[r["device"]] += retry_policy.failure_count(r.get("records"))
+        retried_by_device = {r["device"]: r for r in retried}
+        results = [retried_by_device.get(r["device"], r) for r in results]
+
+
+def plan_resume(run, devdicts):
+    """
+    Return the devices a resumed run still has to collect from and the sections already collected.
+
+    Devices the journal records as done (or skipped) are dropped.  For partly finished devices
+    the sections they completed are read from their output file now, before it is rewritten,
+    and returned as a dictionary of device -> [(record, section)].
+    """
+    pending = []
+    resumed = {}
+    for devdict in devdicts:
+        entry = run["entries"].get(devdict["ip"])
+        status = entry["status"] if entry else None
+        if status in ("done", "skipped"):
+            continue
+        if status == "partial":
+            try:
+                resumed[devdict["ip"]] = journal.read_completed_sections(entry)
+            except (OSError, ValueError, KeyError) as e:
+                print(
+                    f"Cannot read the saved output of {devdict['ip']} ({e}); collecting it again"
+                )
+        pending.append(devdict)
+
+    print(
+        f"Resuming run {run['run_id']}: {len(devdicts) - len(pending)} devices done, "
+        f"{len(resumed)} partly done, {len(pending) - len(resumed)} to collect"
+    )
+    return pending, resumed
+
+
+def completed_commands(sections):
+    """
+    Return the set of commands in a list of (record, section) tuples from an interrupted run.
+    """
+    return {rec["command"] for rec, _ in sections or []}
+
+
+def merge_resumed(result, timestamp, sections):
+    """
+    Rewrite the output file of a partly finished device of a resumed run.
+
+    The sections saved by the interrupted run are written first, followed by the commands
+    collected now, and the records are rebuilt so the manifest and journal match the new file.
+    """
+    new_records = result.get("records") or []
+    sections = sections + [
+        (rec, manifest.read_section(dict(rec, path=result["path"])))
+        for rec in new_records
+        if rec["command"] and rec["status"] == "ok"
+    ]
+
+    output_path = get_output_path(result["device"], timestamp, arguments.output_subdir)
+    open_writer = get_open_writer()
+    if open_writer is not None:
+        with open_writer(output_path) as writer:
+            for _, section in sections:
+                writer.write(section)
+        output_path = writer.path
+    else:
+        utils.write_txt(output_path, "".join(section for _, section in sections))
+
+    records = []
+    for rec, section in sections:
+        utils.record_section(records, rec["command"], section, rec["duration"] or 0)
+    for rec in new_records:
+        if rec["status"] != "ok":
+            utils.record_section(
+                records, rec["command"], "", rec["duration"] or 0, rec["status"]
+            )
+
+    result.update({"path": output_path, "output_path": output_path, "records": records})
+    if result.get("error") == NO_OUTPUT_ERROR:
+        result.pop("error")
+    return result
+
+
+def finish_device(
+    devdict,
+    result,
+    cmd_dict,
+    timestamp,
+    manifest_conn=None,
+    run_journal=None,
+    sections=None,
+):
+    """
+    Record a finished device in the manifest and the run journal, merging the output of a resumed device first.
+    """
+    if sections:
+        result = merge_resumed(result, timestamp, sections)
+    cmds = get_cmds_for_device(devdict, cmd_dict)
+    if "error" not in result and journal.device_status(result, cmds) == "partial":
+        # Output was saved but the session ended early (e.g. too many failed commands)
+        result.update(
+            {
+                "missing": len(journal.missing_commands(result, cmds)),
+                "commands": len(cmds),
+            }
+        )
+    record_manifest(manifest_conn, result, timestamp)
+    journal.record_device(run_journal, result, cmds)
+    return result
+
+
+def record_manifest(manifest_conn, result, timestamp):
+    """
+    Add the per-command records of a device result to the run manifest (if one is open).
+    """
+    if manifest_conn is None or result.get("records") is None:
+        return
+    note = utils.replace_space(arguments.note) if arguments.note else None
+    manifest.record_run(
+        manifest_conn,
+        result["device"],
+        result["device_type"],
+        timestamp,
+        note,
+        result["path"],
+        result["records"],
+    )
+
+
+def print_summary(results, elapsed):
+    """
+    Print the successes, partly collected devices, failures and wall-clock time of a collection run.
+    """
+    failures = [r for r in results if "error" in r]
+    partial = [r for r in results if "error" not in r and r.get("missing")]
+    successes = [r for r in results if "error" not in r and not r.get("missing")]
+
+    print(f"\n===============  Summary ===============")
+    print(
+        f"Devices: {len(results)}  Succeeded: {len(successes)}  "
+        f"Partial: {len(partial)}  Failed: {len(failures)}"
+    )
+    for r in successes:
+        print(f"  OK    {r['device']}: {r['output_path']} ({r['elapsed']:.1f}s)")
+    for r in partial:
+        failed = next(
+            (rec for rec in r.get("records") or [] if rec["status"] != "ok"), None
+        )
+        print(
+            f"  PARTIAL {r['device']}: {r['output_path']} ({r['missing']} of "
+            f"{r['commands']} commands missing"
+            + (f", {failed['command']}: {failed['status']}" if failed else "")
+            + ")"
+            + failed_fast_note(r)
+        )
+    for r in failures:
+        print(f"  FAIL  {r['device']}: {r['error']}" + failed_fast_note(r))
+    print(f"Wall-clock time: {elapsed:.1f}s")
+
+
+def failed_fast_note(result):
+    """
+    Return the summary note of a device that was not requeued again after too many failures.
+    """
+    if not result.get("failed_fast"):
+        return ""
+    return f" [failed fast after {result['failed_fast']} failures, not retried]"
+
+
+def save_run_metrics(results, timestamp, elapsed):
+    """
+    Save the connection, command timing and byte count metrics of a run as JSON and/or a Prometheus textfile.
+    """
+    note = utils.replace_space(arguments.note) if arguments.note else None
+    devices = [
+        metrics.device_metrics(
+            r["device"],
+            r.get("device_type"),
+            r.get("records"),
+            r.get("timings"),
+            r.get("elapsed"),
+            error=r.get("error"),
+        )
+        for r in results
+    ]
+    run = metrics.run_metrics(
+        devices, timestamp, note=note, engine=arguments.engine, elapsed=elapsed
+    )
+    metrics.print_top(run)
+
+    if arguments.metrics:
+        path = metrics.metrics_path(arguments.output_subdir, timestamp, note)
+        metrics.save_metrics(path, run)
+        print(f"\nSaved run metrics to {path}")
+    if arguments.prom_file:
+        metrics.save_prometheus(arguments.prom_file, run)
+        print(f"Saved Prometheus metrics to {arguments.prom_file}")
 
 
 # Standard call to the main() function.
@@ -144,7 +809,8 @@ if __name__ == "__main__":
     parser.add_argument(
         "-t",
         "--device_type",
-        help="Device Types include cisco_nxos, cisco_asa, cisco_wlc Default: cisco_ios",
+        help="Device Types include cisco_nxos, cisco_asa, cisco_wlc, or autodetect to use the "
+        "device facts cache and Netmiko SSHDetect (see facts_cache.py) Default: cisco_ios",
         action="store",
         default="cisco_ios",
     )
@@ -193,5 +859,100 @@ if __name__ == "__main__":
         "to execute show commands on multiple devices with the same credentials.",
         default="",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        action="store",
+        type=int,
+        help="Number of devices to collect from concurrently. "
+        "Default: 1 (one device at a time), or 200 with the async engine",
+        default=None,
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        action="store",
+        choices=["netmiko", "async"],
+        help="Collection engine. 'async' runs all devices in a single asyncio event loop "
+        "and requires the optional asyncssh module. Default: netmiko",
+        default="netmiko",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write each show command to the output file as soon as it finishes instead of "
+        "holding the whole device transcript in memory",
+        default=False,
+    )
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        metavar="N",
+        help="Send show commands N at a time and split the output at the prompts instead of waiting "
+        "for each prompt before sending the next command (Netmiko engine). Default: 0 (off)",
+        default=0,
+    )
+    parser.add_argument(
+        "--store",
+        action="store",
+        choices=["txt", "gz", "dedup"],
+        help="Output format. 'gz' writes a compressed .txt.gz transcript with an index so single "
+        "commands can be read without decompressing the file. 'dedup' stores each command "
+        "section once in a content-addressed store under <output_subdir>/store "
+        "(see dedup_store.py). Default: txt",
+        default="txt",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Save per-device connect, auth and prompt times and per-command latency and bytes "
+        "to <output_subdir>/metrics/<timestamp>[_note].json",
+        default=False,
+    )
+    parser.add_argument(
+        "--prom_file",
+        action="store",
+        help="Also write the run metrics to this Prometheus textfile collector file (*.prom)",
+        default="",
+    )
+    parser.add_argument(
+        "--no_manifest",
+        action="store_true",
+        help="Do not record this run in the SQLite manifest (manifest.sqlite3) in the output subdirectory",
+        default=False,
+    )
+    parser.add_argument(
+        "--no_preflight",
+        action="store_true",
+        help="Do not check that the SSH port of every device answers before collecting",
+        default=False,
+    )
+    parser.add_argument(
+        "--preflight_timeout",
+        type=float,
+        help=f"Seconds to wait for the SSH port of each device in the pre-flight check. Default: {preflight.DEFAULT_TIMEOUT}",
+        default=preflight.DEFAULT_TIMEOUT,
+    )
+    parser.add_argument(
+        "--no_retry",
+        action="store_true",
+        help="Do not requeue devices that failed with a transient error (see retry_policies in show_cmds.yml)",
+        default=False,
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Resume an interrupted run: skip the devices its journal records as done and "
+        "re-run only the missing commands of partly finished devices. "
+        "RUN_ID is the timestamp (and note) printed at the start of the run",
+        action="store",
+    )
+    parser.add_argument(
+        "--timeout",
+        action="store",
+        type=int,
+        help="Per-device timeout in seconds for the async engine. Default: 600",
+        default=600,
+    )
     arguments = parser.parse_args()
     main()
@@ -19,6 +19,20 @@ import dotenv
 import streamlit as st
 
 import utils
+import gui_jobs
+import preflight
+import manifest
+
+from datetime import datetime
+
+# Seconds between refreshes of the job progress while the page is open
+JOB_POLL_INTERVAL = 2
+
+# Command sections listed per page of the output preview
+PREVIEW_PAGE_SIZE = 10
+
+# Bytes of a section shown before the user asks for the full section
+PREVIEW_MAX_BYTES = 200_000
 
 
 def main() -> None:
@@ -113,12 +127,65 @@ def main() -> None:
         language="bash",
     )
 
+    st.sidebar.header("Execution")
+    workers = st.sidebar.number_input(
+        "Concurrent devices",
+        min_value=1,
+        max_value=64,
+        value=gui_jobs.DEFAULT_WORKERS,
+        help="Number of devices collected at the same time by the background job.",
+    )
+    use_preflight = st.sidebar.checkbox(
+        "TCP pre-flight check",
+        value=True,
+        help=(
+            "Check that the SSH port of every device answers before any SSH session "
+            "starts, and skip the devices that do not."
+        ),
+    )
+    preflight_timeout = st.sidebar.number_input(
+        "Pre-flight timeout (seconds)",
+        min_value=0.1,
+        max_value=30.0,
+        value=preflight.DEFAULT_TIMEOUT,
+        disabled=not use_preflight,
+    )
+
     st.subheader("Run Discovery")
     st.write(
         "Fill in the options in the sidebar, then click **Run get_showcmds** "
-        "to execute the show commands and save output files."
+        "to start a background job that executes the show commands and saves "
+        "output files.  The job keeps running if you change options or refresh "
+        "the page."
     )
 
+    # Credential fields are rendered on every run (not only when the button is clicked)
+    # so their values are still there when the button triggers the next script run.
+    if use_mfa:
+        usr = os.environ.get("INET_USR", "")
+        pwd = os.environ.get("INET_PWD", "")
+        sec = os.environ.get("INET_PWD", "")
+        mfa_code = st.text_input(
+            "Enter your MFA code (VIP / MS Auth / etc.)",
+            "",
+            type="password",
+        )
+        mfa = f"{pwd}{mfa_code.strip()}" if mfa_code else ""
+    elif use_cli_creds:
+        st.info(
+            "Enter credentials (these are not stored). "
+            "Equivalent to using the -c / --credentials option."
+        )
+        usr = st.text_input("Username", os.environ.get("NET_USR", ""))
+        pwd = st.text_input("Password", "", type="password")
+        sec = st.text_input("Enable password", "", type="password")
+        mfa = pwd
+    else:
+        usr = os.environ.get("NET_USR", "")
+        pwd = os.environ.get("NET_PWD", "")
+        sec = os.environ.get("NET_PWD", "")
+        mfa = pwd
+
     if st.button("Run get_showcmds"):
         combined_devices_text = devices_text or ""
 
@@ -135,37 +202,9 @@ def main() -> None:
             st.error("Please provide at least one device (single or list).")
             return
 
-        total_devices = len(devices)
-        progress_bar = st.progress(0, text="Starting device processing...")
-
-        # Prepare credentials in a way that mirrors get_showcmds.py
-        if use_mfa:
-            usr = os.environ.get("INET_USR", "")
-            pwd = os.environ.get("INET_PWD", "")
-            sec = os.environ.get("INET_PWD", "")
-            mfa_code = st.text_input(
-                "Enter your MFA code (VIP / MS Auth / etc.)",
-                "",
-                type="password",
-            )
-            if not mfa_code:
-                st.error("Please enter an MFA code.")
-                return
-            mfa = f"{pwd}{mfa_code.strip()}"
-        elif use_cli_creds:
-            st.info(
-                "Enter credentials (these are not stored). "
-                "Equivalent to using the -c / --credentials option."
-            )
-            usr = st.text_input("Username", os.environ.get("NET_USR", ""))
-            pwd = st.text_input("Password", "", type="password")
-            sec = st.text_input("Enable password", "", type="password")
-            mfa = pwd
-        else:
-            usr = os.environ.get("NET_USR", "")
-            pwd = os.environ.get("NET_PWD", "")
-            sec = os.environ.get("NET_PWD", "")
-            mfa = pwd
+        if use_mfa and not mfa:
+            st.error("Please enter an MFA code.")
+            return
 
         if not usr or not mfa:
             st.error(
@@ -174,93 +213,182 @@ def main() -> None:
             )
             return
 
-        # Ensure output directory exists
-        utils.sub_dir(output_subdir)
-
         # Load command dictionary once
         cmd_dict = utils.read_yaml("show_cmds.yml")
 
-        results = []
+        # Determine commands as in get_showcmds.py
+        if device_type in ["cisco_ios", "cisco_nxos", "cisco_wlc"]:
+            if show_cmd:
+                cmds = [show_cmd]
+            elif re.search("ios", device_type):
+                cmds = cmd_dict["ios_show_commands"]
+            elif re.search("nxos", device_type):
+                cmds = cmd_dict["nxos_show_commands"]
+            elif re.search("wlc", device_type):
+                cmds = cmd_dict["wlc_show_commands"]
+            else:
+                cmds = cmd_dict["general_show_commands"]
+        else:
+            cmds = cmd_dict.get("general_show_commands", [])
 
-        for index, dev in enumerate(devices, start=1):
-            with st.expander(f"Device {dev}", expanded=False):
-                devdict = {
+        device_cmds = [
+            (
+                {
                     "device_type": device_type,
                     "ip": dev,
                     "username": usr,
                     "password": mfa,
                     "secret": sec,
                     "port": int(port),
-                }
-
-                # Determine commands as in get_showcmds.py
-                if device_type in ["cisco_ios", "cisco_nxos", "cisco_wlc"]:
-                    if show_cmd:
-                        cmds = [show_cmd]
-                    elif re.search("ios", device_type):
-                        cmds = cmd_dict["ios_show_commands"]
-                    elif re.search("nxos", device_type):
-                        cmds = cmd_dict["nxos_show_commands"]
-                    elif re.search("wlc", device_type):
-                        cmds = cmd_dict["wlc_show_commands"]
-                    else:
-                        cmds = cmd_dict["general_show_commands"]
-                else:
-                    cmds = cmd_dict.get("general_show_commands", [])
-
-                st.write("Running commands:")
-                for c in cmds:
-                    st.code(c)
-
-                # Attempt to connect and collect output
-                try:
-                    resp = utils.conn_and_get_output(devdict, cmds, debug=True)
-                except Exception as e:  # defensive, in case utils raises
-                    st.error(f"Error connecting to device {dev}: {e}")
-                    results.append({"device": dev, "error": "Login/connection error"})
-                    resp = ""
-
-                if not resp:
-                    # Treat empty response as a login/connection issue
-                    st.warning("No output collected; possible login or connection issue.")
-                    results.append({"device": dev, "error": "Login/connection issue"})
-                else:
-                    # Construct output filename similar to get_showcmds.py timestamped files
-                    from datetime import datetime
-
-                    now = datetime.now()
-                    timestamp = now.strftime("%Y-%m-%d_%H-%M-%S")
-
-                    if note:
-                        note_text = utils.replace_space(note)
-                        basefn = f"{dev}_{timestamp}_{note_text}.txt"
-                    else:
-                        basefn = f"{dev}_{timestamp}.txt"
-
-                    output_path = os.path.join(os.getcwd(), output_subdir, basefn)
-                    utils.write_txt(output_path, resp)
-
-                    st.success(f"Saved output to {output_path}")
-                    st.text_area(
-                        "Output preview",
-                        resp,
-                        height=200,
-                        key=f"output_preview_{dev}",
-                    )
-
-                    results.append({"device": dev, "output_path": output_path})
-
-            # Update progress after each device
-            progress = int(index / total_devices * 100)
-            progress_bar.progress(progress, text=f"Processed {index}/{total_devices} devices")
-
-        if results:
-            st.subheader("Summary")
-            for r in results:
-                if "error" in r:
-                    st.write(f"{r['device']}: {r['error']}")
-                else:
-                    st.write(f"{r['device']}: {r['output_path']}")
+                },
+                cmds,
+            )
+            for dev in devices
+        ]
+
+        # One timestamp per run so all the devices in the run share it
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        note_text = utils.replace_space(note) if note else None
+
+        st.session_state["job_id"] = gui_jobs.start_job(
+            device_cmds,
+            output_subdir,
+            timestamp,
+            note_text,
+            workers=workers,
+            preflight_timeout=preflight_timeout if use_preflight else None,
+        )
+
+    show_jobs()
+    show_preview()
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def show_jobs() -> None:
+    """
+    Render the progress of the selected background job, re-running every JOB_POLL_INTERVAL seconds.
+
+    Only this fragment is re-run while polling, so the sidebar and any credentials being
+    typed are left alone.
+    """
+    jobs = gui_jobs.list_jobs()
+    if not jobs:
+        return
+
+    st.subheader("Jobs")
+    job_ids = [job["id"] for job in jobs]
+    current = st.session_state.get("job_id")
+    index = job_ids.index(current) if current in job_ids else 0
+    job_id = st.selectbox(
+        "Job",
+        job_ids,
+        index=index,
+        format_func=lambda i: next(
+            f"{j['id']}  ({j['status']}, {j['finished']}/{j['total']} devices)"
+            for j in jobs
+            if j["id"] == i
+        ),
+    )
+    st.session_state["job_id"] = job_id
+    job = next(j for j in jobs if j["id"] == job_id)
+
+    progress = int(job["finished"] / job["total"] * 100) if job["total"] else 100
+    counts = ", ".join(f"{n} {s}" for s, n in sorted(job["counts"].items()))
+    st.progress(
+        progress,
+        text=f"{job['status']}: {job['finished']}/{job['total']} devices ({counts})",
+    )
+
+    if gui_jobs.is_active(job):
+        if st.button(
+            "Cancel job", key=f"cancel_{job_id}", disabled=job["status"] != "running"
+        ):
+            gui_jobs.cancel_job(job_id)
+    elif job["elapsed"] is not None:
+        st.write(f"Started {job['started']}, finished in {job['elapsed']} seconds.")
+    if job["error"]:
+        st.error(f"The job failed: {job['error']}")
+
+    st.dataframe(
+        [
+            {
+                "Device": d["device"],
+                "Status": d["status"],
+                "Commands": f"{d['commands_done']}/{d['commands_total']}",
+                "Current command": d["command"] or "",
+                "Seconds": d["elapsed"],
+                "Output": d["output_path"] or "",
+                "Error": d["error"] or "",
+            }
+            for d in job["devices"]
+        ],
+        width="stretch",
+        hide_index=True,
+    )
+
+
+@st.cache_resource
+def get_manifest(path):
+    """
+    Return a manifest connection shared by every script run for the output subdirectory.
+    """
+    return manifest.open_manifest(path)
+
+
+@st.fragment
+def show_preview() -> None:
+    """
+    Preview the saved output of one device of the selected job, one command section at a time.
+
+    Only the manifest rows (command, size, status) of a page of sections are rendered.  The
+    text of a section is read from the saved file when the user opens it, so large
+    transcripts are never held in memory or sent to the browser as a whole.
+    """
+    job = gui_jobs.get_job(st.session_state.get("job_id"))
+    if job is None:
+        return
+    devices = [d for d in job["devices"] if d["output_path"]]
+    if not devices:
+        return
+
+    st.subheader("Output preview")
+    device = st.selectbox(
+        "Device", [d["device"] for d in devices], key=f"preview_device_{job['id']}"
+    )
+    output_path = next(d["output_path"] for d in devices if d["device"] == device)
+    conn = get_manifest(manifest.manifest_path(job["output_subdir"]))
+    rows = [row for row in manifest.file_sections(conn, output_path) if row["command"]]
+    if not rows:
+        st.info(f"No command sections recorded for {output_path}")
+        return
+
+    pages = (len(rows) + PREVIEW_PAGE_SIZE - 1) // PREVIEW_PAGE_SIZE
+    page = 1
+    if pages > 1:
+        page = st.number_input(
+            f"Page (of {pages})",
+            min_value=1,
+            max_value=pages,
+            value=1,
+            key=f"preview_page_{output_path}",
+        )
+    first = (page - 1) * PREVIEW_PAGE_SIZE
+    st.caption(
+        f"{output_path}: commands {first + 1}-{min(first + PREVIEW_PAGE_SIZE, len(rows))} of {len(rows)}"
+    )
+
+    for row in rows[first : first + PREVIEW_PAGE_SIZE]:
+        label = f"{row['command']}  ({row['length']:,} bytes, {row['status']})"
+        if not st.toggle(label, key=f"preview_{output_path}_{row['id']}"):
+            continue
+        limit = PREVIEW_MAX_BYTES
+        if row["length"] > PREVIEW_MAX_BYTES:
+            if st.checkbox(
+                f"Show all {row['length']:,} bytes (first {PREVIEW_MAX_BYTES:,} shown)",
+                key=f"preview_all_{output_path}_{row['id']}",
+            ):
+                limit = None
+        st.code(manifest.read_section(row, limit=limit), language=None)
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -0,0 +1,317 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: gui_jobs
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Background collection jobs for the Streamlit GUI.
+#
+# Streamlit re-executes the whole script on every widget interaction, so a device
+# loop run inside the script blocks the page and is killed by the next rerun.
+# Jobs started here run in a background thread with a pool of device workers and
+# live in a process-wide registry, so they survive reruns and browser refreshes.
+# Every device publishes its status (queued, unreachable, running, done, failed,
+# cancelled),
+# the command it is on and how many commands have finished, which the page polls
+# to render live progress.  A running job can be cancelled: queued devices are
+# skipped and running devices stop after their current command.  A job that cannot
+# start (e.g. the output directory or manifest cannot be opened) ends as failed with
+# its error.
+
+import concurrent.futures
+import contextlib
+import datetime
+import os
+import threading
+import time
+import uuid
+
+import utils
+import manifest
+import preflight
+
+# Finished jobs kept in the registry so their results can still be shown
+MAX_FINISHED_JOBS = 20
+
+DEFAULT_WORKERS = 4
+
+_lock = threading.Lock()
+_state = {
+    "jobs": {},
+}
+
+
+def start_job(
+    device_cmds,
+    output_subdir,
+    timestamp,
+    note=None,
+    workers=DEFAULT_WORKERS,
+    preflight_timeout=preflight.DEFAULT_TIMEOUT,
+):
+    """
+    Start collecting from devices in the background and return the job id.
+
+    device_cmds is a list of (devdict, cmds) tuples.  Output is streamed to the same
+    timestamped files get_showcmds.py writes and every device is recorded in the manifest.
+    Devices whose SSH port does not answer within preflight_timeout seconds are marked
+    unreachable and skipped (None skips the pre-flight check).
+    """
+    job_id = f"{timestamp}_{uuid.uuid4().hex[:6]}"
+    job = {
+        "id": job_id,
+        "timestamp": timestamp,
+        "note": note,
+        "output_subdir": output_subdir,
+        "workers": max(1, int(workers or 1)),
+        "preflight_timeout": preflight_timeout,
+        "started": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "status": "running",
+        "error": None,
+        "elapsed": None,
+        "devices": {
+            devdict["ip"]: {
+                "device": devdict["ip"],
+                "status": "queued",
+                "command": None,
+                "commands_done": 0,
+                "commands_total": len(cmds),
+                "output_path": None,
+                "error": None,
+                "elapsed": None,
+            }
+            for devdict, cmds in device_cmds
+        },
+        "cancel": threading.Event(),
+    }
+
+    with _lock:
+        prune_jobs()
+        _state["jobs"][job_id] = job
+
+    thread = threading.Thread(
+        target=run_job, args=(job, device_cmds), name=f"job-{job_id}", daemon=True
+    )
+    thread.start()
+    return job_id
+
+
+def run_job(job, device_cmds):
+    """
+    Collect from every device of a job with a bounded pool of worker threads.
+    """
+    start = time.perf_counter()
+    manifest_conn = None
+    error = None
+    try:
+        utils.sub_dir(job["output_subdir"])
+        manifest_conn = manifest.open_manifest(
+            manifest.manifest_path(job["output_subdir"])
+        )
+
+        if job["preflight_timeout"]:
+            reachable, unreachable = preflight.check_devices(
+                [devdict for devdict, _ in device_cmds],
+                timeout=job["preflight_timeout"],
+                debug=False,
+            )
+            for devdict, reason in unreachable:
+                update_device(job, devdict["ip"], status="unreachable", error=reason)
+            reachable_ids = {id(devdict) for devdict in reachable}
+            device_cmds = [
+                (devdict, cmds)
+                for devdict, cmds in device_cmds
+                if id(devdict) in reachable_ids
+            ]
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=job["workers"]
+        ) as executor:
+            futures = {
+                executor.submit(
+                    collect_device, job, devdict, cmds, manifest_conn
+                ): devdict["ip"]
+                for devdict, cmds in device_cmds
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    # Keep one misbehaving device from aborting the rest of the job
+                    update_device(job, futures[future], status="failed", error=str(e))
+    except Exception as e:
+        # The job could not be set up; report it instead of leaving it running forever
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        if manifest_conn is not None:
+            manifest_conn.close()
+        with _lock:
+            if error is not None:
+                for d in job["devices"].values():
+                    if d["status"] == "queued":
+                        d.update(status="failed", error=error)
+                job["status"] = "failed"
+                job["error"] = error
+            else:
+                job["status"] = "cancelled" if job["cancel"].is_set() else "done"
+            job["elapsed"] = round(time.perf_counter() - start, 2)
+
+
+def collect_device(job, devdict, cmds, manifest_conn):
+    """
+    Run the show commands for one device of a job, streaming each section to its output file.
+    """
+    dev = devdict["ip"]
+    if job["cancel"].is_set():
+        update_device(job, dev, status="cancelled")
+        return
+
+    start = time.perf_counter()
+    update_device(job, dev, status="running", command=cmds[0] if cmds else None)
+
+    if job["note"]:
+        basefn = f"{dev}_{job['timestamp']}_{job['note']}.txt"
+    else:
+        basefn = f"{dev}_{job['timestamp']}.txt"
+    output_path = os.path.join(os.getcwd(), job["output_subdir"], basefn)
+
+    records = []
+    written = 0
+    cancelled = False
+    with (
+        open(output_path, "w", encoding="utf-8") as f,
+        contextlib.closing(
+            utils.iter_show_output(devdict, cmds, records=records)
+        ) as sections,
+    ):
+        for cmd, section in sections:
+            f.write(section)
+            f.flush()
+            written += len(section)
+            done = len(records)
+            update_device(
+                job,
+                dev,
+                commands_done=done,
+                command=cmds[done] if done < len(cmds) else None,
+            )
+            if job["cancel"].is_set():
+                # Closing the generator disconnects from the device
+                cancelled = True
+                break
+
+    elapsed = round(time.perf_counter() - start, 2)
+    if not written:
+        os.remove(output_path)
+        failure = next((r["status"] for r in records if r["status"] != "ok"), None)
+        update_device(
+            job,
+            dev,
+            status="cancelled" if cancelled else "failed",
+            command=None,
+            error=failure or "No output collected; possible login or connection issue",
+            elapsed=elapsed,
+        )
+        return
+
+    manifest.record_run(
+        manifest_conn,
+        dev,
+        devdict["device_type"],
+        job["timestamp"],
+        job["note"],
+        output_path,
+        records,
+    )
+    failed = [r for r in records if r["status"] != "ok"]
+    update_device(
+        job,
+        dev,
+        status="cancelled" if cancelled else "done",
+        command=None,
+        commands_done=len(records),
+        output_path=output_path,
+        error=f"{failed[0]['command']}: {failed[0]['status']}" if failed else None,
+        elapsed=elapsed,
+    )
+
+
+def update_device(job, dev, **status):
+    """
+    Update the published status of one device of a job.
+    """
+    with _lock:
+        job["devices"][dev].update(status)
+
+
+def cancel_job(job_id):
+    """
+    Ask a running job to stop.  Queued devices are skipped and running devices stop after their current command.
+    """
+    with _lock:
+        job = _state["jobs"].get(job_id)
+        if job is None or job["status"] != "running":
+            return False
+        job["cancel"].set()
+        job["status"] = "cancelling"
+        return True
+
+
+def get_job(job_id):
+    """
+    Return a snapshot of a job that is safe to render while the job keeps running, or None if unknown.
+    """
+    with _lock:
+        job = _state["jobs"].get(job_id)
+        if job is None:
+            return None
+        snapshot = {k: v for k, v in job.items() if k not in ("cancel", "devices")}
+        snapshot["devices"] = [dict(d) for d in job["devices"].values()]
+
+    counts = {}
+    for d in snapshot["devices"]:
+        counts[d["status"]] = counts.get(d["status"], 0) + 1
+    snapshot["counts"] = counts
+    snapshot["finished"] = sum(
+        counts.get(s, 0) for s in ("done", "failed", "cancelled", "unreachable")
+    )
+    snapshot["total"] = len(snapshot["devices"])
+    return snapshot
+
+
+def list_jobs():
+    """
+    Return a summary of every job in the registry, newest first.
+    """
+    with _lock:
+        job_ids = list(_state["jobs"])
+    jobs = [get_job(job_id) for job_id in reversed(job_ids)]
+    return [job for job in jobs if job is not None]
+
+
+def is_active(job):
+    """
+    Return True if a job snapshot is still running or being cancelled.
+    """
+    return job["status"] in ("running", "cancelling")
+
+
+def prune_jobs():
+    """
+    Drop the oldest finished jobs beyond MAX_FINISHED_JOBS.  Call with _lock held.
+    """
+    finished = [
+        job_id
+        for job_id, job in _state["jobs"].items()
+        if job["status"] in ("done", "cancelled", "failed")
+    ]
+    for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _state["jobs"][job_id]
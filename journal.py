@@ -0,0 +1,215 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: journal
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Crash-safe run journal for get_showcmds.py.
+#
+# Every run appends to <output_subdir>/journal/<run-id>.jsonl, where the run id is
+# the file timestamp plus the optional note.  The first line lists the devices of
+# the run; then one line is written per device as soon as it finishes, with the
+# path of its output file and the offset, length and status of every command.
+# Each line is written with a single write and fsync'd, so after a crash (VPN
+# drop, laptop sleep, Ctrl-C) the journal holds every device that finished and at
+# worst one torn last line, which is ignored.
+#
+#     python get_showcmds.py --resume 2026-10-18_09-30-00_pre
+#
+# skips the devices the journal records as done and re-runs only the missing
+# commands of devices that finished partly.
+
+import datetime
+import json
+import os
+import threading
+
+import manifest
+
+JOURNAL_DIR = "journal"
+
+_lock = threading.Lock()
+
+
+def make_run_id(timestamp, note=None):
+    """
+    Return the run id of a run: its file timestamp plus the optional note.
+    """
+    return f"{timestamp}_{note}" if note else timestamp
+
+
+def journal_path(output_subdir, run_id):
+    """
+    Return the path of the journal of a run: <output_subdir>/journal/<run_id>.jsonl.
+    """
+    return os.path.join(output_subdir, JOURNAL_DIR, f"{run_id}.jsonl")
+
+
+def open_journal(path):
+    """
+    Open a run journal for appending, creating the journal directory if needed.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    torn = False
+    if os.path.isfile(path) and os.path.getsize(path):
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+    fh = open(path, "a", encoding="utf-8")
+    if torn:
+        # Terminate a line torn by a crash so the next event starts on its own line
+        fh.write("\n")
+    return fh
+
+
+def write_event(fh, event):
+    """
+    Append one event to the journal and force it to disk before returning.
+    """
+    if fh is None:
+        return
+    event = dict(event, time=datetime.datetime.now().isoformat(timespec="seconds"))
+    line = json.dumps(event) + "\n"
+    with _lock:
+        fh.write(line)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def start_run(fh, run_id, timestamp, note, devdicts, show_cmd=None, store=None):
+    """
+    Record the start of a run with the devices (and their device types) it will collect from.
+    """
+    write_event(
+        fh,
+        {
+            "event": "start",
+            "run_id": run_id,
+            "timestamp": timestamp,
+            "note": note,
+            "show_cmd": show_cmd,
+            "store": store,
+            "devices": [
+                {"ip": d["ip"], "device_type": d["device_type"], "port": d["port"]}
+                for d in devdicts
+            ],
+        },
+    )
+
+
+def device_status(result, cmds):
+    """
+    Return the journal status of a device result: done, partial, failed or skipped.
+
+    A device is done only if every command in cmds was collected successfully.
+    """
+    if result.get("skipped"):
+        return "skipped"
+    if not any(
+        r["command"] and r["status"] == "ok" for r in result.get("records") or []
+    ):
+        return "failed"
+    if missing_commands(result, cmds):
+        return "partial"
+    return "done"
+
+
+def missing_commands(result, cmds):
+    """
+    Return the commands in cmds that a device result did not collect successfully.
+    """
+    ok = {
+        r["command"]
+        for r in result.get("records") or []
+        if r["command"] and r["status"] == "ok"
+    }
+    return [cmd for cmd in cmds if cmd not in ok]
+
+
+def record_device(fh, result, cmds):
+    """
+    Record that a device finished, with its output file and the records of every command.
+    """
+    write_event(
+        fh,
+        {
+            "event": "device",
+            "device": result["device"],
+            "device_type": result.get("device_type"),
+            "status": device_status(result, cmds),
+            "path": result.get("path"),
+            "error": result.get("error"),
+            "failed_fast": result.get("failed_fast"),
+            "commands": [
+                {
+                    "command": r["command"],
+                    "offset": r["offset"],
+                    "length": r["length"],
+                    "duration": r["duration"],
+                    "status": r["status"],
+                }
+                for r in result.get("records") or []
+            ],
+        },
+    )
+
+
+def finish_run(fh, results, elapsed):
+    """
+    Record the end of a run with the number of devices that failed.
+    """
+    write_event(
+        fh,
+        {
+            "event": "end",
+            "devices": len(results),
+            "failed": sum(1 for r in results if "error" in r),
+            "elapsed": round(elapsed, 3),
+        },
+    )
+
+
+def load_journal(path):
+    """
+    Read a run journal and return the run settings, its devices and the last entry of each finished device.
+
+    Lines that cannot be decoded (a line torn by a crash) are ignored.  Raises FileNotFoundError
+    if there is no journal.
+    """
+    run = None
+    entries = {}
+    finished = False
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("event") == "start" and run is None:
+                run = event
+            elif event.get("event") == "device":
+                entries[event["device"]] = event
+            elif event.get("event") == "end":
+                finished = True
+    if run is None:
+        raise ValueError(f"Journal {path} has no start event")
+    return dict(run, entries=entries, finished=finished)
+
+
+def read_completed_sections(entry):
+    """
+    Return (record, section) tuples for the commands a partly finished device completed, read from its output file.
+    """
+    sections = []
+    for rec in entry["commands"]:
+        if rec["command"] and rec["status"] == "ok":
+            sections.append((rec, manifest.read_section(dict(rec, path=entry["path"]))))
+    return sections
@@ -0,0 +1,301 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: jump_hosts
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Jump host (bastion) support for devices that are only reachable through one.
+#
+# Proxying each device session through its own SSH hop doubles the handshake
+# cost and quickly uses up the bastion's session limits.  Instead one
+# authenticated SSH transport is opened to each jump host and kept for the run;
+# every device session is a direct-tcpip channel multiplexed over it, handed to
+# Netmiko as its socket (utils.connect_timed) or used as the asyncssh tunnel
+# (async_collect).  A jump host can spread the channels over several transports.
+#
+# Which devices go through which jump host is set per group in jump_hosts.yml
+# next to this module (JUMP_HOSTS overrides the path; set it to "none" to connect
+# to every device directly).  Groups match devices like session_limits groups:
+# by a regex on the name or IP, a subnet, or a regex on the device_type.
+
+import asyncio
+import atexit
+import collections
+import itertools
+import os
+import threading
+
+import paramiko
+
+import session_limits
+import utils
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+JUMP_HOSTS_FN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "jump_hosts.yml"
+)
+
+Route = collections.namedtuple(
+    "Route", ["name", "pattern", "subnet", "device_type", "jump_host"]
+)
+
+_lock = threading.Lock()
+_state = {
+    "path": None,
+    "loaded": False,
+    "jump_hosts": {},
+    "routes": [],
+    # jump host name -> list of paramiko SSHClients, one per transport
+    "clients": {},
+    "client_locks": {},
+    "counters": {},
+    # (jump host name, event loop) -> list of asyncio futures of asyncssh connections
+    "async_conns": {},
+}
+
+
+def jump_hosts_path():
+    """
+    Return the path of the jump host file: JUMP_HOSTS or jump_hosts.yml next to this module.
+    """
+    return os.environ.get("JUMP_HOSTS") or JUMP_HOSTS_FN
+
+
+def load_jump_hosts(path=None, reload=False):
+    """
+    Read the jump host file on first use.  Without one (or with JUMP_HOSTS=none) devices are reached directly.
+    """
+    path = path or jump_hosts_path()
+    with _lock:
+        if _state["loaded"] and _state["path"] == path and not reload:
+            return
+        config = {}
+        if path.lower() != "none" and os.path.isfile(path):
+            config = utils.read_yaml(path) or {}
+
+        jump_hosts = config.get("jump_hosts") or {}
+        for name, spec in jump_hosts.items():
+            if not spec or not spec.get("host"):
+                raise ValueError(f"Jump host {name} in {path} has no host")
+
+        routes = []
+        for i, entry in enumerate(config.get("groups") or []):
+            name = entry.get("name", f"group_{i + 1}")
+            if entry.get("jump_host") not in jump_hosts:
+                raise ValueError(
+                    f"Group {name} in {path} uses unknown jump host {entry.get('jump_host')}"
+                )
+            routes.append(
+                Route(
+                    name,
+                    *session_limits.match_criteria(entry),
+                    entry["jump_host"],
+                )
+            )
+
+        _state.update(
+            {
+                "path": path,
+                "loaded": True,
+                "jump_hosts": jump_hosts,
+                "routes": routes,
+            }
+        )
+
+
+def jump_host_for(dev_dict):
+    """
+    Return the name of the jump host a device is reached through (the first matching group), or None.
+    """
+    load_jump_hosts()
+    for route in _state["routes"]:
+        if session_limits.group_matches(route, dev_dict):
+            return route.jump_host
+    return None
+
+
+def jump_credentials(spec):
+    """
+    Return the username and password of a jump host from the environment variables its entry names.
+    """
+    username = os.environ.get(spec.get("username_env", "NET_USR"))
+    password = os.environ.get(spec.get("password_env", "NET_PWD"))
+    return username, password
+
+
+def connect_jump_host(name, timeout=10):
+    """
+    Open and authenticate a new SSH transport to a jump host and return its paramiko SSHClient.
+    """
+    spec = _state["jump_hosts"][name]
+    username, password = jump_credentials(spec)
+    client = paramiko.SSHClient()
+    if spec.get("strict_host_key"):
+        client.load_system_host_keys()
+        client.set_missing_host_key_policy(paramiko.RejectPolicy())
+    else:
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        spec["host"],
+        port=int(spec.get("port", 22)),
+        username=username,
+        password=password,
+        key_filename=(
+            os.path.expanduser(spec["key_filename"])
+            if spec.get("key_filename")
+            else None
+        ),
+        look_for_keys=False,
+        allow_agent=bool(spec.get("allow_agent", False)),
+        timeout=timeout,
+        banner_timeout=timeout,
+        auth_timeout=timeout,
+    )
+    client.get_transport().set_keepalive(int(spec.get("keepalive", 30)))
+    return client
+
+
+def get_transport(name, timeout=10):
+    """
+    Return an active transport to a jump host, connecting (or reconnecting) it on first use.
+
+    With transports set for the jump host, successive calls rotate over that many transports.
+    """
+    with _lock:
+        lock = _state["client_locks"].setdefault(name, threading.Lock())
+        counter = _state["counters"].setdefault(name, itertools.count())
+    count = max(1, int(_state["jump_hosts"][name].get("transports", 1)))
+    index = next(counter) % count
+    with lock:
+        clients = _state["clients"].setdefault(name, [None] * count)
+        client = clients[index]
+        transport = client.get_transport() if client is not None else None
+        if transport is None or not transport.is_active():
+            if client is not None:
+                client.close()
+            client = connect_jump_host(name, timeout=timeout)
+            clients[index] = client
+            transport = client.get_transport()
+    return transport
+
+
+def open_channel(dev_dict, timeout=10):
+    """
+    Open a direct-tcpip channel to a device through its jump host for use as its socket.
+
+    Returns None if the device is reached directly.  A transport that turns out to be dead
+    is reconnected once before giving up.
+    """
+    name = jump_host_for(dev_dict)
+    if name is None:
+        return None
+    destination = (dev_dict["ip"], int(dev_dict.get("port") or 22))
+    for attempt in range(2):
+        transport = get_transport(name, timeout=timeout)
+        try:
+            return transport.open_channel(
+                "direct-tcpip", destination, ("127.0.0.1", 0), timeout=timeout
+            )
+        except (EOFError, paramiko.SSHException):
+            if transport.is_active() or attempt:
+                # The jump host is up but refused the channel (e.g. the device is down)
+                raise
+
+
+def close_all():
+    """
+    Close every transport to the jump hosts.
+    """
+    with _lock:
+        clients = [c for cs in _state["clients"].values() for c in cs if c is not None]
+        _state["clients"] = {}
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_all)
+
+
+async def connect_jump_host_async(name, timeout=10):
+    """
+    Open and authenticate a new asyncssh connection to a jump host.
+    """
+    spec = _state["jump_hosts"][name]
+    username, password = jump_credentials(spec)
+    return await asyncio.wait_for(
+        asyncssh.connect(
+            spec["host"],
+            port=int(spec.get("port", 22)),
+            username=username,
+            password=password,
+            client_keys=(
+                [os.path.expanduser(spec["key_filename"])]
+                if spec.get("key_filename")
+                else None
+            ),
+            known_hosts=() if spec.get("strict_host_key") else None,
+            keepalive_interval=int(spec.get("keepalive", 30)),
+        ),
+        timeout=timeout,
+    )
+
+
+async def get_tunnel_async(dev_dict, timeout=10):
+    """
+    Return the asyncssh connection to tunnel a device through, or None if it is reached directly.
+
+    Connections are shared by every device of the event loop; concurrent callers wait for the
+    same connection attempt instead of each opening their own.
+    """
+    name = jump_host_for(dev_dict)
+    if name is None:
+        return None
+    loop = asyncio.get_running_loop()
+    count = max(1, int(_state["jump_hosts"][name].get("transports", 1)))
+    with _lock:
+        counter = _state["counters"].setdefault(name, itertools.count())
+        futures = _state["async_conns"].setdefault((name, loop), [None] * count)
+    index = next(counter) % count
+    future = futures[index]
+    if future is not None and future.done():
+        if (
+            future.cancelled()
+            or future.exception() is not None
+            or future.result().is_closed()
+        ):
+            # Reconnect after a failed attempt or a dropped connection
+            future = None
+    if future is None:
+        future = loop.create_task(connect_jump_host_async(name, timeout=timeout))
+        futures[index] = future
+    return await asyncio.shield(future)
+
+
+async def close_async():
+    """
+    Close the asyncssh jump host connections of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        keys = [key for key in _state["async_conns"] if key[1] is loop]
+        futures = [f for key in keys for f in _state["async_conns"].pop(key) if f]
+    for future in futures:
+        if not future.done():
+            future.cancel()
+            continue
+        if not future.cancelled() and future.exception() is None:
+            conn = future.result()
+            conn.close()
+            await conn.wait_closed()
@@ -0,0 +1,314 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: manifest
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# SQLite manifest of every collection run.
+#
+# get_showcmds.py and the GUI add one row per command section to
+# <output_subdir>/manifest.sqlite3 with the device, device_type, file timestamp,
+# note, command, byte offset/length of the section within the transcript,
+# duration and status.  Lookups such as "latest show run for a device" or "all
+# -pre runs since last week" are then indexed queries instead of directory scans,
+# and a single section can be read straight from its offset in the file.
+
+import argparse
+import datetime
+import glob
+import os
+import sqlite3
+import threading
+
+import utils
+import dedup_store
+
+MANIFEST_FN = "manifest.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    id INTEGER PRIMARY KEY,
+    device TEXT NOT NULL,
+    device_type TEXT,
+    timestamp TEXT NOT NULL,
+    note TEXT,
+    command TEXT,
+    path TEXT NOT NULL,
+    offset INTEGER,
+    length INTEGER,
+    duration REAL,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_device_command_ts ON sections (device, command, timestamp);
+CREATE INDEX IF NOT EXISTS idx_note_ts ON sections (note, timestamp);
+CREATE INDEX IF NOT EXISTS idx_ts ON sections (timestamp);
+CREATE INDEX IF NOT EXISTS idx_path ON sections (path);
+"""
+
+_lock = threading.Lock()
+
+
+def manifest_path(output_subdir):
+    """
+    Return the path of the manifest database for an output subdirectory.
+    """
+    return os.path.join(output_subdir, MANIFEST_FN)
+
+
+def open_manifest(path):
+    """
+    Open (creating if needed) the manifest database and return the sqlite3 connection.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_run(conn, device, device_type, timestamp, note, path, records):
+    """
+    Record the per-command records of one device transcript in the manifest.
+
+    records are the dictionaries collected by utils.iter_show_output.  A device that produced
+    no records at all is still recorded with a single row so failed runs can be found.  Rows
+    already recorded for the same transcript (an interrupted run that was resumed and
+    rewrote the file) are replaced.
+    """
+    if not records:
+        records = [
+            {
+                "command": None,
+                "offset": 0,
+                "length": 0,
+                "duration": None,
+                "status": "no output",
+            }
+        ]
+    rows = [
+        (
+            device,
+            device_type,
+            timestamp,
+            note,
+            r["command"],
+            os.path.abspath(path),
+            r["offset"],
+            r["length"],
+            r["duration"],
+            r["status"],
+        )
+        for r in records
+    ]
+    with _lock, conn:
+        conn.execute("DELETE FROM sections WHERE path = ?", (os.path.abspath(path),))
+        conn.executemany(
+            "INSERT INTO sections (device, device_type, timestamp, note, command, path, "
+            "offset, length, duration, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def latest_section(conn, device, command):
+    """
+    Return the manifest row of the most recent successful section of command for device, or None.
+    """
+    return conn.execute(
+        "SELECT * FROM sections WHERE device = ? AND command = ? AND status = 'ok' "
+        "ORDER BY timestamp DESC LIMIT 1",
+        (device, command),
+    ).fetchone()
+
+
+def find_runs(conn, device=None, note=None, since=None, command=None):
+    """
+    Return manifest rows matching any combination of device, note, command and a since date.
+
+    since may be a datetime.date, a datetime.datetime or a "YYYY-MM-DD" string.
+    """
+    clauses = []
+    params = []
+    if device:
+        clauses.append("device = ?")
+        params.append(device)
+    if note is not None:
+        clauses.append("note = ?")
+        params.append(note)
+    if command:
+        clauses.append("command = ?")
+        params.append(command)
+    if since:
+        if isinstance(since, (datetime.date, datetime.datetime)):
+            since = since.strftime("%Y-%m-%d")
+        # File timestamps are YYYY-MM-DD_HH-MM-SS so they sort and compare as text
+        clauses.append("timestamp >= ?")
+        params.append(since)
+
+    sql = "SELECT * FROM sections"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY timestamp, device, offset"
+    return conn.execute(sql, params).fetchall()
+
+
+def file_sections(conn, path):
+    """
+    Return the manifest rows of every section of one transcript, in the order they appear in the file.
+    """
+    return conn.execute(
+        "SELECT * FROM sections WHERE path = ? ORDER BY offset, id",
+        (os.path.abspath(path),),
+    ).fetchall()
+
+
+def device_types(conn):
+    """
+    Return a dictionary of transcript path -> device_type for every transcript recorded with one.
+    """
+    return {
+        r["path"]: r["device_type"]
+        for r in conn.execute(
+            "SELECT DISTINCT path, device_type FROM sections "
+            "WHERE device_type IS NOT NULL AND device_type != ''"
+        )
+    }
+
+
+def read_section(row, limit=None):
+    """
+    Read one command section from its transcript using the offset and length in a manifest row.
+
+    If limit is given, at most that many bytes from the start of the section are read.
+    """
+    length = row["length"] if limit is None else min(row["length"], limit)
+    if row["path"].endswith(".json"):
+        # Run file in the deduplicated store
+        return dedup_store.read_range(row["path"], row["offset"], length)
+    if row["path"].endswith(".gz"):
+        # Compressed transcript; offsets refer to the uncompressed text
+        return utils.read_gzip_range(row["path"], row["offset"], length)
+    with open(row["path"], "rb") as f:
+        f.seek(row["offset"])
+        return f.read(length).decode("utf-8", errors="ignore")
+
+
+def index_existing(conn, output_subdir, device_type="", debug=False):
+    """
+    Add transcripts already in output_subdir that are not in the manifest yet.  Returns the number added.
+    """
+    known = {r[0] for r in conn.execute("SELECT DISTINCT path FROM sections")}
+    added = 0
+    filenames = glob.glob(os.path.join(output_subdir, "*.txt")) + glob.glob(
+        os.path.join(output_subdir, "*.txt.gz")
+    )
+    for filename in sorted(filenames):
+        info = utils.parse_transcript_filename(filename)
+        if info is None or os.path.abspath(filename) in known:
+            continue
+        text = utils.read_transcript(filename)
+        records = []
+        for cmd, output in utils.split_transcript(text):
+            utils.record_section(records, cmd, f"\n!--- {cmd} \n{output}", 0)
+            records[-1]["duration"] = None
+        record_run(
+            conn,
+            info["device"],
+            device_type,
+            info["timestamp"],
+            info["note"],
+            filename,
+            records,
+        )
+        added += 1
+        if debug:
+            print(f"Indexed {filename}")
+    return added
+
+
+def main():
+    """
+    Query the run manifest from the command line.
+    """
+    conn = open_manifest(manifest_path(arguments.output_subdir))
+
+    if arguments.index:
+        added = index_existing(conn, arguments.output_subdir, debug=True)
+        print(f"Added {added} existing transcripts to the manifest")
+
+    if arguments.latest:
+        if not arguments.device or not arguments.show_cmd:
+            exit("The --latest option needs both -d DEVICE and -s SHOW_CMD.")
+        row = latest_section(conn, arguments.device, arguments.show_cmd)
+        if row is None:
+            exit(f"No '{arguments.show_cmd}' found for {arguments.device}.")
+        print(f"!--- {row['path']} ({row['timestamp']})")
+        print(read_section(row))
+        return
+
+    if arguments.device or arguments.note or arguments.since or arguments.show_cmd:
+        rows = find_runs(
+            conn,
+            device=arguments.device,
+            note=arguments.note,
+            since=arguments.since,
+            command=arguments.show_cmd,
+        )
+        for row in rows:
+            print(
+                f"{row['timestamp']}  {row['device']:<20} {row['note'] or '':<8} "
+                f"{row['status']:<8} {row['length'] or 0:>10}  {row['command']}"
+            )
+        print(f"\n{len(rows)} sections")
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Query the manifest of show command collection runs",
+        epilog="Usage: ' python manifest.py -d my_switch -s \"show run\" --latest' ",
+    )
+    parser.add_argument(
+        "-o",
+        "--output_subdir",
+        help="Output subdirectory holding the transcripts and manifest. Default: local",
+        action="store",
+        default="local",
+    )
+    parser.add_argument(
+        "-d", "--device", help="Only show sections for this device", action="store"
+    )
+    parser.add_argument(
+        "-s", "--show_cmd", help="Only show sections for this command", action="store"
+    )
+    parser.add_argument(
+        "-n", "--note", help="Only show runs with this note. Ex. -pre", action="store"
+    )
+    parser.add_argument(
+        "--since",
+        help="Only show runs on or after this date (YYYY-MM-DD)",
+        action="store",
+    )
+    parser.add_argument(
+        "-l",
+        "--latest",
+        action="store_true",
+        help="Print the latest output of SHOW_CMD for DEVICE",
+        default=False,
+    )
+    parser.add_argument(
+        "-i",
+        "--index",
+        action="store_true",
+        help="Add transcripts already in the output subdirectory to the manifest",
+        default=False,
+    )
+    arguments = parser.parse_args()
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: metrics
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Per-device and per-command timing and byte count metrics for a collection run.
+#
+# For every device the TCP connect, SSH authentication and prompt detection
+# times, the latency, output bytes and status of every command and the failure
+# reason (if any) are gathered into one structured dictionary per run.  It can be
+# saved as JSON and exported in the Prometheus text format for the node_exporter
+# textfile collector:
+#
+#     python get_showcmds.py -f devices.txt --metrics --prom_file /var/lib/node_exporter/eia.prom
+
+import os
+
+import utils
+
+CONNECT_PHASES = ["tcp_connect", "auth", "prompt"]
+
+# Number of slowest commands and devices listed in the run summary
+TOP_N = 10
+
+
+def header_length(cmd):
+    """
+    Return the number of bytes of the "!--- cmd" section header that precedes a command's output.
+    """
+    return len(f"\n!--- {cmd} \n".encode("utf-8"))
+
+
+def failure_reason(records, error=None):
+    """
+    Return the first failure for a device: a failed connect or command status, the collection error, or None.
+    """
+    for rec in records or []:
+        if rec["status"] != "ok":
+            if rec["command"]:
+                return f"{rec['command']}: {rec['status']}"
+            return rec["status"]
+    if error:
+        return error
+    if not records:
+        return "no output"
+    return None
+
+
+def device_metrics(device, device_type, records, timings, elapsed, error=None):
+    """
+    Return the metrics dictionary of one device from its per-command records and connection timings.
+    """
+    timings = timings or {}
+    commands = []
+    for rec in records or []:
+        if rec["command"] is None:
+            continue
+        output_bytes = 0
+        if rec["length"]:
+            output_bytes = rec["length"] - header_length(rec["command"])
+        commands.append(
+            {
+                "command": rec["command"],
+                "duration": rec["duration"],
+                "bytes": output_bytes,
+                "status": rec["status"],
+            }
+        )
+
+    data = {
+        "device": device,
+        "device_type": device_type,
+        "elapsed": round(elapsed or 0, 3),
+        "connect": {phase: timings.get(phase) for phase in CONNECT_PHASES},
+        "command_time": round(sum(c["duration"] or 0 for c in commands), 3),
+        "output_bytes": sum(c["bytes"] for c in commands),
+        "commands": commands,
+        "failure": failure_reason(records, error),
+    }
+    return data
+
+
+def run_metrics(devices, timestamp, note=None, engine=None, elapsed=None):
+    """
+    Return the metrics dictionary of a run: a summary, the slowest commands and devices, and every device.
+    """
+    slowest_commands = sorted(
+        (
+            {"device": d["device"], **c}
+            for d in devices
+            for c in d["commands"]
+            if c["duration"] is not None
+        ),
+        key=lambda c: c["duration"],
+        reverse=True,
+    )[:TOP_N]
+    slowest_devices = [
+        {"device": d["device"], "elapsed": d["elapsed"], "failure": d["failure"]}
+        for d in sorted(devices, key=lambda d: d["elapsed"], reverse=True)[:TOP_N]
+    ]
+
+    # Time spent per command across all devices, to find the commands that dominate a run
+    by_command = {}
+    for d in devices:
+        for c in d["commands"]:
+            entry = by_command.setdefault(
+                c["command"], {"count": 0, "duration": 0.0, "bytes": 0, "failed": 0}
+            )
+            entry["count"] += 1
+            entry["duration"] += c["duration"] or 0
+            entry["bytes"] += c["bytes"]
+            entry["failed"] += c["status"] != "ok"
+    for entry in by_command.values():
+        entry["duration"] = round(entry["duration"], 3)
+
+    return {
+        "timestamp": timestamp,
+        "note": note,
+        "engine": engine,
+        "elapsed": round(elapsed, 3) if elapsed is not None else None,
+        "devices_total": len(devices),
+        "devices_failed": sum(1 for d in devices if d["failure"]),
+        "output_bytes": sum(d["output_bytes"] for d in devices),
+        "slowest_commands": slowest_commands,
+        "slowest_devices": slowest_devices,
+        "commands": dict(
+            sorted(by_command.items(), key=lambda kv: kv[1]["duration"], reverse=True)
+        ),
+        "devices": devices,
+    }
+
+
+def metrics_path(output_subdir, timestamp, note=None):
+    """
+    Return the path of the JSON metrics file for a run: <output_subdir>/metrics/<timestamp>[_note].json.
+    """
+    basefn = f"{timestamp}_{note}" if note else timestamp
+    return os.path.join(output_subdir, "metrics", f"{basefn}.json")
+
+
+def save_metrics(path, run):
+    """
+    Save the run metrics as JSON, creating the metrics directory if needed.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    utils.save_json(path, run)
+
+
+def escape_label(value):
+    """
+    Escape a Prometheus label value.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def labels(**kwargs):
+    return ",".join(f'{k}="{escape_label(v)}"' for k, v in kwargs.items())
+
+
+def prometheus_text(run):
+    """
+    Return the run metrics in the Prometheus text exposition format.
+    """
+    lines = []
+
+    def metric(name, help_text, mtype, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {mtype}")
+        for sample_labels, value in samples:
+            if value is None:
+                continue
+            label_text = f"{{{sample_labels}}}" if sample_labels else ""
+            lines.append(f"{name}{label_text} {value}")
+
+    devices = run["devices"]
+    metric(
+        "eia_collection_run_duration_seconds",
+        "Wall-clock time of the last collection run.",
+        "gauge",
+        [("", run["elapsed"])],
+    )
+    metric(
+        "eia_collection_devices",
+        "Devices in the last collection run by result.",
+        "gauge",
+        [
+            (labels(result="ok"), run["devices_total"] - run["devices_failed"]),
+            (labels(result="failed"), run["devices_failed"]),
+        ],
+    )
+    metric(
+        "eia_collection_device_up",
+        "1 if every command was collected from the device in the last run.",
+        "gauge",
+        [(labels(device=d["device"]), 0 if d["failure"] else 1) for d in devices],
+    )
+    metric(
+        "eia_collection_device_duration_seconds",
+        "Total collection time per device.",
+        "gauge",
+        [(labels(device=d["device"]), d["elapsed"]) for d in devices],
+    )
+    metric(
+        "eia_collection_device_connect_seconds",
+        "Connection time per device by phase (tcp_connect, auth, prompt).",
+        "gauge",
+        [
+            (labels(device=d["device"], phase=phase), d["connect"][phase])
+            for d in devices
+            for phase in CONNECT_PHASES
+        ],
+    )
+    metric(
+        "eia_collection_device_output_bytes",
+        "Bytes of command output collected per device.",
+        "gauge",
+        [(labels(device=d["device"]), d["output_bytes"]) for d in devices],
+    )
+    metric(
+        "eia_collection_command_duration_seconds",
+        "Latency of each command per device.",
+        "gauge",
+        [
+            (labels(device=d["device"], command=c["command"]), c["duration"])
+            for d in devices
+            for c in d["commands"]
+        ],
+    )
+    metric(
+        "eia_collection_command_output_bytes",
+        "Bytes of output of each command per device.",
+        "gauge",
+        [
+            (labels(device=d["device"], command=c["command"]), c["bytes"])
+            for d in devices
+            for c in d["commands"]
+        ],
+    )
+    metric(
+        "eia_collection_command_failed",
+        "1 if the command failed on the device in the last run.",
+        "gauge",
+        [
+            (
+                labels(device=d["device"], command=c["command"]),
+                int(c["status"] != "ok"),
+            )
+            for d in devices
+            for c in d["commands"]
+        ],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def save_prometheus(path, run):
+    """
+    Write the run metrics to a Prometheus textfile collector file.
+
+    The file is written under a temporary name and renamed so the collector never reads a partial file.
+    """
+    if not path.endswith(".prom"):
+        print(
+            f"Note: the node_exporter textfile collector only reads *.prom files ({path})"
+        )
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(run))
+    os.replace(tmp_path, path)
+
+
+def print_top(run):
+    """
+    Print the commands and devices that took the most time in a run.
+    """
+    print(f"\n===============  Slowest commands ===============")
+    for c in run["slowest_commands"]:
+        print(
+            f"  {c['duration']:>8.2f}s  {c['bytes']:>10,} bytes  {c['device']:<20} {c['command']}"
+        )
+    print(f"\n===============  Time per command (all devices) ===============")
+    for cmd, entry in list(run["commands"].items())[:TOP_N]:
+        print(
+            f"  {entry['duration']:>8.2f}s  {entry['count']:>5} runs  {entry['failed']:>3} failed  {cmd}"
+        )
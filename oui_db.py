@@ -0,0 +1,395 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: oui_db
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Offline MAC vendor (OUI) lookups.
+#
+# The IEEE registry CSV files are compiled once into a small binary file of
+# sorted prefix arrays, one per block size:
+#
+#   - MA-S (and IAB)  36 bit prefixes, e.g. 70-B3-D5-000
+#   - MA-M            28 bit prefixes, e.g. 00-55-DA-1
+#   - MA-L            24 bit prefixes, e.g. 00-50-56
+#
+# with the index of the vendor name of every prefix.  The file is memory-mapped
+# and searched in place with bisect, so loading it is instant and processes share
+# its pages.  A MAC gets the vendor of its longest registered prefix.
+#
+# enrich_rows() adds a vendor column to parsed rows (show mac address-table,
+# show ip arp, client_locator.py results).  Campus MACs come from a few hundred
+# vendors, so the vendor is looked up once per 24 bit prefix and reused.
+#
+#     python oui_db.py -c oui.csv mam.csv oui36.csv iab.csv
+#     python oui_db.py -q 0050.56aa.bbcc 70:b3:d5:00:01:02
+
+import argparse
+import array
+import bisect
+import csv
+import mmap
+import os
+import struct
+import sys
+import threading
+
+OUI_DB_FN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "oui.bin")
+
+# Where the IEEE publishes the registries compiled by this module
+IEEE_URLS = [
+    "https://standards-oui.ieee.org/oui/oui.csv",
+    "https://standards-oui.ieee.org/oui28/mam.csv",
+    "https://standards-oui.ieee.org/oui36/oui36.csv",
+    "https://standards-oui.ieee.org/iab/iab.csv",
+]
+
+MAGIC = b"EIAOUI01"
+# magic, MA-S, MA-M and MA-L prefix counts, vendor count, vendor name bytes
+HEADER = struct.Struct("<8sIIIIIxxxx")
+
+# Prefix bits by the number of hex digits of an IEEE assignment
+PREFIX_BITS = {9: 36, 7: 28, 6: 24}
+
+# Vendor of MACs with the locally administered bit set (e.g. randomized phone MACs)
+LOCAL_VENDOR = "Locally administered"
+
+# Most prefixes remembered by OuiIndex.vendors
+CACHE_SIZE = 1 << 20
+
+# Marks a cached MA-L block that is divided into MA-M or MA-S blocks
+DIVIDED = object()
+
+# The names of the MAC column in parsed rows, tried in order when none is given
+MAC_FIELDS = ["mac", "mac_address", "destination_address"]
+
+_lock = threading.Lock()
+_state = {
+    "indexes": {},
+}
+
+
+def oui_db_path():
+    """
+    Return the path of the compiled database: OUI_DB or oui.bin next to this module.
+    """
+    return os.environ.get("OUI_DB") or OUI_DB_FN
+
+
+def mac_to_int(mac):
+    """
+    Return a MAC address in any common notation as a 48-bit int, or None.
+    """
+    digits = mac.replace(".", "").replace(":", "").replace("-", "").strip()
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+def read_registry(filename):
+    """
+    Yield (bits, prefix, vendor) from an IEEE registry CSV file (oui.csv, mam.csv, oui36.csv or iab.csv).
+    """
+    with open(filename, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            assignment = (row.get("Assignment") or "").strip()
+            bits = PREFIX_BITS.get(len(assignment))
+            if bits is None:
+                continue
+            try:
+                prefix = int(assignment, 16)
+            except ValueError:
+                continue
+            vendor = " ".join((row.get("Organization Name") or "").split())
+            yield bits, prefix, vendor
+
+
+def compile_oui(sources, path=None):
+    """
+    Compile IEEE registry CSV files into the binary database and return the number of prefixes of each size.
+    """
+    path = path or oui_db_path()
+    tiers = {36: {}, 28: {}, 24: {}}
+    for filename in sources:
+        for bits, prefix, vendor in read_registry(filename):
+            tiers[bits][prefix] = vendor
+
+    vendor_ids = {}
+    for tier in tiers.values():
+        for vendor in tier.values():
+            vendor_ids.setdefault(vendor, len(vendor_ids))
+    names = [name.encode("utf-8") for name in vendor_ids]
+    offsets = array.array("I", [0])
+    for name in names:
+        offsets.append(offsets[-1] + len(name))
+
+    arrays = []
+    for bits, typecode in ((36, "Q"), (28, "I"), (24, "I")):
+        prefixes = sorted(tiers[bits])
+        keys = array.array(typecode, prefixes)
+        ids = array.array("I", [vendor_ids[tiers[bits][p]] for p in prefixes])
+        arrays.extend([keys, ids])
+    arrays.append(offsets)
+    name_bytes = offsets[-1]
+    if sys.byteorder != "little":
+        for values in arrays:
+            values.byteswap()
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                len(tiers[36]),
+                len(tiers[28]),
+                len(tiers[24]),
+                len(names),
+                name_bytes,
+            )
+        )
+        # Every array starts on an 8 byte boundary so it can be cast in place
+        for values in arrays:
+            data = values.tobytes()
+            f.write(data + b"\0" * (-len(data) % 8))
+        f.write(b"".join(names))
+    os.replace(tmp_path, path)
+    return {"MA-S": len(tiers[36]), "MA-M": len(tiers[28]), "MA-L": len(tiers[24])}
+
+
+class OuiIndex:
+    """
+    A compiled OUI database, memory-mapped read only.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or oui_db_path()
+        with open(self.path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_s, n_m, n_l, n_vendors, _ = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a compiled OUI database")
+
+        view = memoryview(self.mmap)
+        offset = HEADER.size
+        arrays = []
+        for count, typecode in (
+            (n_s, "Q"),
+            (n_s, "I"),
+            (n_m, "I"),
+            (n_m, "I"),
+            (n_l, "I"),
+            (n_l, "I"),
+            (n_vendors + 1, "I"),
+        ):
+            size = count * struct.calcsize(typecode)
+            arrays.append(self.cast(view[offset : offset + size], typecode))
+            offset += size + (-size % 8)
+        self.names = view[offset:]
+        # (shift, prefixes, vendor ids) from the longest prefix to the shortest
+        self.tiers = [
+            (48 - 36, arrays[0], arrays[1]),
+            (48 - 28, arrays[2], arrays[3]),
+            (48 - 24, arrays[4], arrays[5]),
+        ]
+        self.offsets = arrays[6]
+        # MA-L blocks the IEEE has divided further into MA-M or MA-S blocks
+        self.divided = {p >> 12 for p in arrays[0]} | {p >> 4 for p in arrays[2]}
+        # Vendors by the first characters of a MAC, and by the 36 bit prefix in divided blocks
+        self.cache = {}
+        self.block_cache = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return sum(len(prefixes) for _, prefixes, _ in self.tiers)
+
+    @staticmethod
+    def cast(view, typecode):
+        if sys.byteorder == "little":
+            return view.cast(typecode)
+        # The file is little endian; big endian hosts get a swapped copy
+        values = array.array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+
+    def vendor_name(self, vendor_id):
+        return str(
+            self.names[self.offsets[vendor_id] : self.offsets[vendor_id + 1]],
+            "utf-8",
+        )
+
+    def lookup_int(self, mac):
+        """
+        Return the vendor of a 48-bit MAC int from its longest registered prefix, or None.
+        """
+        for shift, prefixes, vendor_ids in self.tiers:
+            prefix = mac >> shift
+            i = bisect.bisect_left(prefixes, prefix)
+            if i < len(prefixes) and prefixes[i] == prefix:
+                return self.vendor_name(vendor_ids[i])
+        if mac >> 40 & 0x02:
+            return LOCAL_VENDOR
+        return None
+
+    def lookup(self, mac):
+        """
+        Return the vendor of a MAC address in any common notation, or None.
+        """
+        value = mac_to_int(mac)
+        return None if value is None else self.lookup_int(value)
+
+    def vendors(self, macs):
+        """
+        Return the vendor of every MAC address of an iterable, in order.
+
+        The vendor of a MA-L block is looked up once and then reused for every MAC starting
+        with the same characters; MACs of divided blocks reuse the vendor of their 36 bit prefix.
+        """
+        cache = self.cache
+        block_cache = self.block_cache
+        result = []
+        append = result.append
+        for mac in macs:
+            if not mac:
+                append(None)
+                continue
+            # Eight characters cover the first three octets in every notation
+            key = mac[:8]
+            vendor = cache.get(key, cache)
+            if vendor is DIVIDED or vendor is cache:
+                value = mac_to_int(mac)
+                if value is None:
+                    append(None)
+                    continue
+                if vendor is DIVIDED or value >> 24 in self.divided:
+                    vendor = block_cache.get(value >> 12, block_cache)
+                    if vendor is block_cache:
+                        vendor = self.lookup_int(value)
+                        if len(block_cache) < CACHE_SIZE:
+                            block_cache[value >> 12] = vendor
+                    if len(cache) < CACHE_SIZE:
+                        cache[key] = DIVIDED
+                else:
+                    vendor = self.lookup_int(value)
+                    if len(cache) < CACHE_SIZE:
+                        cache[key] = vendor
+            append(vendor)
+        return result
+
+    def enrich_rows(self, rows, mac_field=None, vendor_field="vendor"):
+        """
+        Add the vendor of the MAC column of parsed rows (dictionaries) in place and return the rows.
+
+        Without mac_field the first of MAC_FIELDS found in the first row is used, in any case.
+        """
+        rows = [row for row in rows if isinstance(row, dict)]
+        if not rows:
+            return rows
+        if mac_field is None:
+            keys = {key.lower(): key for key in rows[0]}
+            mac_field = next((keys[f] for f in MAC_FIELDS if f in keys), None)
+            if mac_field is None:
+                return rows
+        for row, vendor in zip(
+            rows, self.vendors([row.get(mac_field) or "" for row in rows])
+        ):
+            row[vendor_field] = vendor
+        return rows
+
+    def close(self):
+        self.tiers = []
+        self.offsets = self.names = None
+        try:
+            self.mmap.close()
+        except BufferError:
+            # Views still held elsewhere; the map is released with them
+            pass
+
+
+def load_index(path=None):
+    """
+    Return the shared OuiIndex of a database, opening it on first use, or None if it has not been compiled.
+    """
+    path = path or oui_db_path()
+    with _lock:
+        index = _state["indexes"].get(path)
+        if index is None and os.path.isfile(path):
+            index = OuiIndex(path)
+            _state["indexes"][path] = index
+        return index
+
+
+def require_index(path=None):
+    """
+    Return the shared OuiIndex, or exit with instructions to compile the database if there is none.
+    """
+    path = path or oui_db_path()
+    index = load_index(path)
+    if index is None:
+        print(
+            f"No OUI database at {path}. Download the IEEE registries and compile them with:"
+            f"\n  python oui_db.py -c oui.csv mam.csv oui36.csv iab.csv"
+        )
+        for url in IEEE_URLS:
+            print(f"  {url}")
+        exit("OUI database not compiled. Aborting Execution.")
+    return index
+
+
+def main():
+    """
+    Compile the OUI database from IEEE registry files and look up MAC addresses.
+    """
+    path = arguments.database or oui_db_path()
+    if arguments.compile:
+        counts = compile_oui(arguments.compile, path)
+        print(
+            f"Compiled {sum(counts.values())} prefixes into {path} "
+            f"({', '.join(f'{k} {v}' for k, v in counts.items())})"
+        )
+
+    index = require_index(path)
+    for mac, vendor in zip(arguments.query or [], index.vendors(arguments.query or [])):
+        print(f"  {mac}: {vendor or 'unknown'}")
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compile the IEEE OUI registries into a compact database and look up MAC vendors",
+        epilog="Usage: ' python oui_db.py -c oui.csv mam.csv oui36.csv iab.csv -q 0050.56aa.bbcc' ",
+    )
+    parser.add_argument(
+        "-c",
+        "--compile",
+        nargs="+",
+        help="IEEE registry CSV files (oui.csv, mam.csv, oui36.csv, iab.csv) to compile",
+    )
+    parser.add_argument(
+        "-q",
+        "--query",
+        nargs="+",
+        help="MAC addresses to look up",
+    )
+    parser.add_argument(
+        "-d",
+        "--database",
+        help="Path of the compiled database. Default: OUI_DB or oui.bin next to this script",
+    )
+    arguments = parser.parse_args()
+    main()
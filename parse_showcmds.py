@@ -0,0 +1,306 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: parse_showcmds.py
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+import argparse
+import concurrent.futures
+import datetime
+import glob
+import os
+import time
+
+import utils
+import dedup_store
+import export_rows
+import facts_cache
+import manifest
+import oui_db
+import textfsm_cache
+
+
+def find_transcripts(paths):
+    """
+    Expand a list of files, directories and glob patterns into a sorted list of transcript files.
+
+    Directories and patterns only yield files named like get_showcmds.py transcripts (.txt, .txt.gz
+    and the run files of a --store dedup directory), so device lists next to them are skipped.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = (
+                glob.glob(os.path.join(path, "*.txt"))
+                + glob.glob(os.path.join(path, "*.txt.gz"))
+                + glob.glob(
+                    os.path.join(
+                        dedup_store.store_path(path), dedup_store.RUNS_DIR, "*.json"
+                    )
+                )
+            )
+        elif os.path.isfile(path):
+            files.add(path)
+            continue
+        else:
+            candidates = glob.glob(path)
+        files.update(f for f in candidates if transcript_info(f) is not None)
+    return sorted(files)
+
+
+def transcript_info(filename):
+    """
+    Return the device, timestamp and note of a transcript or dedup run file name, or None if it is neither.
+    """
+    if filename.endswith(".json"):
+        # Run files are named like the transcript without the .txt extension
+        return utils.parse_transcript_filename(f"{filename[: -len('.json')]}.txt")
+    return utils.parse_transcript_filename(filename)
+
+
+def read_transcript(filename):
+    """
+    Return the full text of a transcript: plain, compressed, or rebuilt from a dedup run file.
+    """
+    if filename.endswith(".json"):
+        return dedup_store.rebuild_transcript(filename)
+    return utils.read_transcript(filename)
+
+
+def transcript_output_dir(filename):
+    """
+    Return the get_showcmds.py output subdirectory a transcript or dedup run file was saved in.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    if filename.endswith(".json"):
+        # <output_subdir>/store/runs/<run>.json
+        directory = os.path.dirname(os.path.dirname(directory))
+    return directory
+
+
+def manifest_device_types(files):
+    """
+    Return transcript path -> device_type from the manifests of the output subdirectories of files.
+    """
+    types = {}
+    for directory in sorted({transcript_output_dir(f) for f in files}):
+        path = manifest.manifest_path(directory)
+        if os.path.isfile(path):
+            conn = manifest.open_manifest(path)
+            try:
+                types.update(manifest.device_types(conn))
+            finally:
+                conn.close()
+    return types
+
+
+def device_type_for(filename, manifest_types, default):
+    """
+    Return the device_type of a transcript: from the run manifest, then the facts cache, then default.
+    """
+    device_type = manifest_types.get(os.path.abspath(filename))
+    if device_type:
+        return device_type
+    info = transcript_info(filename) or {}
+    facts = facts_cache.lookup(info["device"], ttl=None) if info else None
+    return facts_cache.verified_device_type(facts) or default
+
+
+def json_filename(filename, output_dir):
+    """
+    Return the path of the JSON file for a transcript, e.g. parsed/sw1_2026-10-18_01-00-00.json for sw1_2026-10-18_01-00-00.txt.gz.
+    """
+    basefn = os.path.basename(filename)
+    for ext in (".json", ".gz", ".txt"):
+        if basefn.endswith(ext):
+            basefn = basefn[: -len(ext)]
+    return os.path.join(output_dir, f"{basefn}.json")
+
+
+def parse_transcript(filename, device_type, output_dir, return_data=False):
+    """
+    Parse every command section of one saved transcript with TextFSM and save the result as JSON.
+
+    Runs in a worker process.  Returns a tuple of (filename, json_path, parsed count, unparsed count),
+    plus the parsed data when return_data is True so the parent process can export its rows.
+    """
+    text = read_transcript(filename)
+
+    info = transcript_info(filename) or {}
+    commands = {}
+    unparsed = []
+    for cmd, output in utils.split_transcript(text):
+        parsed = textfsm_cache.parse_output(device_type, cmd, output)
+        if isinstance(parsed, str):
+            unparsed.append(cmd)
+        else:
+            commands.update({cmd: parsed})
+
+    data = {
+        "device": info.get("device", os.path.basename(filename)),
+        "timestamp": info.get("timestamp"),
+        "note": info.get("note"),
+        "device_type": device_type,
+        "source": os.path.abspath(filename),
+        "commands": commands,
+        "unparsed": unparsed,
+    }
+
+    json_path = json_filename(filename, output_dir)
+    utils.save_json(json_path, data)
+
+    if return_data:
+        return filename, json_path, len(commands), len(unparsed), data
+    return filename, json_path, len(commands), len(unparsed)
+
+
+def main():
+    """
+    Re-parse saved get_showcmds.py transcripts offline into per-device JSON using a pool of processes.
+
+    """
+
+    datestamp = datetime.date.today()
+    print(f"===== Date is {datestamp} ====")
+
+    files = find_transcripts(arguments.input)
+    if not files:
+        exit(f"No transcript files found in {arguments.input}. Aborting Execution.")
+
+    output_dir = arguments.output_subdir
+    utils.sub_dir(output_dir)
+
+    if arguments.skip_existing:
+        files = [f for f in files if not os.path.isfile(json_filename(f, output_dir))]
+
+    manifest_types = manifest_device_types(files)
+    device_types = {
+        f: device_type_for(f, manifest_types, arguments.device_type) for f in files
+    }
+
+    workers = arguments.workers or os.cpu_count()
+    print(f"Parsing {len(files)} transcripts with {workers} processes")
+
+    exporter = None
+    if arguments.export:
+        export_dir = arguments.export_dir or os.path.join(output_dir, "export")
+        exporter = export_rows.RowExporter(
+            export_dir,
+            arguments.export,
+            oui=oui_db.require_index() if arguments.vendor else None,
+        )
+        print(f"Exporting parsed rows to {export_dir} ({arguments.export})")
+
+    start = time.perf_counter()
+    failures = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                parse_transcript,
+                f,
+                device_types[f],
+                output_dir,
+                exporter is not None,
+            ): f
+            for f in files
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                filename, json_path, parsed, unparsed, *data = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"\txxx Cannot parse {futures[future]}: {e}")
+                continue
+            if exporter is not None:
+                # Rows are written as each transcript finishes
+                exporter.add_parsed(data[0])
+            print(
+                f"{os.path.basename(filename)}: {parsed} commands parsed, "
+                f"{unparsed} without a template -> {json_path}"
+            )
+
+    if exporter is not None:
+        exporter.close()
+        for path, count in sorted(exporter.summary().items()):
+            print(f"{count:>10} rows  {path}")
+
+    print(
+        f"\nParsed {len(files) - failures}/{len(files)} transcripts in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Parse saved show command transcripts into JSON without connecting to any device",
+        epilog="Usage: ' python parse_showcmds.py -i local -o local/parsed' ",
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        nargs="+",
+        help="Transcript files, directories or glob patterns to parse. Default: local",
+        default=["local"],
+    )
+    parser.add_argument(
+        "-t",
+        "--device_type",
+        help="Device type of transcripts without one in the run manifest or device facts cache. "
+        "Device Types include cisco_nxos, cisco_asa, cisco_wlc Default: cisco_ios",
+        action="store",
+        default="cisco_ios",
+    )
+    parser.add_argument(
+        "-o",
+        "--output_subdir",
+        help="Name of output subdirectory for the JSON files. Default: parsed",
+        action="store",
+        default="parsed",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        action="store",
+        type=int,
+        help="Number of parser processes. Default: one per CPU core",
+        default=None,
+    )
+    parser.add_argument(
+        "-s",
+        "--skip_existing",
+        action="store_true",
+        help="Skip transcripts that already have a JSON file in the output subdirectory",
+        default=False,
+    )
+    parser.add_argument(
+        "--export",
+        choices=export_rows.EXPORT_FORMATS,
+        help="Also append the parsed rows of every device to one file per command (see export_rows.py). "
+        "'arrow' and 'parquet' write one file per command and device type and require the optional pyarrow module",
+        default=None,
+    )
+    parser.add_argument(
+        "--export_dir",
+        help="Directory for the --export files. Default: <output_subdir>/export",
+        default=None,
+    )
+    parser.add_argument(
+        "--vendor",
+        action="store_true",
+        help="Add the vendor of the MAC address to --export rows with one (see oui_db.py)",
+        default=False,
+    )
+    arguments = parser.parse_args()
+    if arguments.export:
+        export_rows.check_pyarrow(arguments.export)
+    main()
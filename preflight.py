@@ -0,0 +1,179 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: preflight
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# TCP reachability pre-flight sweep.
+#
+# Decommissioned or unreachable devices each cost a full Netmiko connect timeout.
+# Before any SSH session starts, get_showcmds.py and the GUI open a plain TCP
+# connection to the SSH port of every device at once (non-blocking connects in
+# a single asyncio event loop, bounded by a concurrency limit) with a short
+# timeout.  Devices that do not answer are reported and left out of the run.
+#
+#     python preflight.py -f devices.txt -p 22 --timeout 2
+
+import argparse
+import asyncio
+import time
+
+import jump_hosts
+import utils
+
+DEFAULT_TIMEOUT = 2.0
+
+# Connections in flight at once; keep below the open file limit (ulimit -n)
+DEFAULT_CONCURRENCY = 500
+
+
+async def check_port(host, port, timeout, semaphore):
+    """
+    Open and close a TCP connection to host:port and return a (host, port, reachable, error, elapsed) tuple.
+    """
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), timeout=timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            return host, port, False, error, time.perf_counter() - start
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return host, port, True, None, time.perf_counter() - start
+
+
+async def sweep_async(
+    targets, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY
+):
+    """
+    Check every (host, port) target concurrently and return the results in target order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(
+        *(check_port(host, port, timeout, semaphore) for host, port in targets)
+    )
+
+
+def sweep(targets, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Blocking wrapper around sweep_async for use from the CLI scripts and the GUI job threads.
+    """
+    return asyncio.run(sweep_async(targets, timeout=timeout, concurrency=concurrency))
+
+
+def check_devices(
+    devdicts, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY, debug=True
+):
+    """
+    Split Netmiko device dictionaries into those whose SSH port answers and those that do not.
+
+    Returns (reachable, unreachable) where unreachable is a list of (devdict, error) tuples.
+    Devices behind a jump host (see jump_hosts) cannot be checked from here and count as reachable.
+    """
+    if not devdicts:
+        return [], []
+    start = time.perf_counter()
+    direct = [d for d in devdicts if jump_hosts.jump_host_for(d) is None]
+    results = sweep(
+        [(d["ip"], int(d.get("port") or 22)) for d in direct],
+        timeout=timeout,
+        concurrency=concurrency,
+    )
+    checked = {id(d): result for d, result in zip(direct, results)}
+    reachable = []
+    unreachable = []
+    for devdict in devdicts:
+        host, port, ok, error, _ = checked.get(id(devdict), (None, None, True, None, 0))
+        if ok:
+            reachable.append(devdict)
+        else:
+            unreachable.append((devdict, error))
+
+    if debug:
+        print(
+            f"\n===============  Pre-flight: {len(reachable)} of {len(devdicts)} devices reachable "
+            f"({time.perf_counter() - start:.1f}s) ==============="
+        )
+        if len(direct) < len(devdicts):
+            print(
+                f"  {len(devdicts) - len(direct)} devices behind jump hosts not checked"
+            )
+        for devdict, error in unreachable:
+            print(
+                f"  UNREACHABLE  {devdict['ip']}:{devdict.get('port') or 22}  {error}"
+            )
+    return reachable, unreachable
+
+
+def main():
+    """
+    Report which devices in a file answer on their SSH port.
+    """
+    fh = utils.open_file(arguments.file_of_devs)
+    devices = [line.strip() for line in fh if line.strip()]
+    fh.close()
+
+    devdicts = [{"ip": dev, "port": arguments.port} for dev in devices]
+    reachable, unreachable = check_devices(
+        devdicts, timeout=arguments.timeout, concurrency=arguments.concurrency
+    )
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as f:
+            f.writelines(f"{d['ip']}\n" for d in reachable)
+        print(f"\nSaved {len(reachable)} reachable devices to {arguments.output}")
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check TCP reachability of the SSH port of every device in a file in parallel",
+        epilog="Usage: ' python preflight.py -f devices.txt -o reachable.txt' ",
+    )
+    parser.add_argument(
+        "-f",
+        "--file_of_devs",
+        help="Text file with one device (IP or FQDN) per line",
+        action="store",
+        required=True,
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        help="Port to check. Default: 22",
+        action="store",
+        type=int,
+        default=22,
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        help=f"Seconds to wait for each connection. Default: {DEFAULT_TIMEOUT}",
+        default=DEFAULT_TIMEOUT,
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        help=f"Connections in flight at once. Default: {DEFAULT_CONCURRENCY}",
+        default=DEFAULT_CONCURRENCY,
+    )
+    parser.add_argument(
+        "-o", "--output", help="Save the reachable devices to this file, one per line"
+    )
+    arguments = parser.parse_args()
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: retry_policy
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Retry policy for transient device failures.
+#
+# Connect timeouts, authentication server blips and channel resets usually go
+# away on their own, so get_showcmds.py collects a device that failed with one of
+# them again instead of giving up.  Failed devices are not retried inline (that
+# would hold a worker for the whole backoff); they are requeued at the end of the
+# run, after an exponential backoff with full jitter, and only their missing
+# commands are run.  Within a session, utils.iter_show_output stops a device after
+# max_failures consecutive command failures so a dead session fails fast instead
+# of waiting out the timeout of every command.  Across attempts, a device whose
+# failed connects and commands add up to max_failures is not requeued again (it
+# fails fast), so a device that keeps breaking does not use up every attempt.
+#
+# The policy is set per command set in the retry_policies section of
+# show_cmds.yml; command sets that are not listed use the "default" entry.
+
+import collections
+import random
+
+RetryPolicy = collections.namedtuple(
+    "RetryPolicy",
+    ["attempts", "backoff", "max_backoff", "max_failures", "retry_auth"],
+)
+
+# attempts counts the first try, so 3 means up to two requeues
+DEFAULT_POLICY = RetryPolicy(
+    attempts=3, backoff=5.0, max_backoff=120.0, max_failures=3, retry_auth=False
+)
+
+# Exception names (as recorded in the manifest status) that are worth another attempt
+TRANSIENT_ERRORS = {
+    "NetmikoTimeoutException",
+    "ReadTimeout",
+    "SSHException",
+    "ChannelException",
+    "EOFError",
+    "OSError",
+    "TimeoutError",
+    "ConnectionResetError",
+    "ConnectionRefusedError",
+    "ConnectionAbortedError",
+    "BrokenPipeError",
+    "ConnectionLost",
+    "DisconnectError",
+    "ChannelOpenError",
+}
+
+# Authentication failures are only retried when the policy allows it, so a wrong
+# password does not lock the account
+AUTH_ERRORS = {
+    "NetmikoAuthenticationException",
+    "AuthenticationException",
+    "PermissionDenied",
+}
+
+
+def load_policies(cmd_dict):
+    """
+    Return a dictionary of command set name -> RetryPolicy from the retry_policies section of show_cmds.yml.
+
+    Values not given for a command set come from its "default" entry, then from DEFAULT_POLICY.
+    """
+    config = cmd_dict.get("retry_policies") or {}
+    default = DEFAULT_POLICY._replace(**(config.get("default") or {}))
+    policies = {"default": default}
+    for name, values in config.items():
+        if name != "default":
+            policies[name] = default._replace(**(values or {}))
+    return policies
+
+
+def get_policy(cmd_dict, cmd_set):
+    """
+    Return the RetryPolicy for a command set (e.g. ios_show_commands) from show_cmds.yml.
+    """
+    policies = load_policies(cmd_dict)
+    return policies.get(cmd_set, policies["default"])
+
+
+def backoff_delay(policy, retry):
+    """
+    Return the seconds to wait before the given retry (1 for the first) using exponential backoff with full jitter.
+    """
+    ceiling = min(policy.max_backoff, policy.backoff * 2 ** (retry - 1))
+    return random.uniform(0, ceiling)
+
+
+def error_name(status):
+    """
+    Return the exception name from a record status such as "connect failed: NetmikoTimeoutException".
+    """
+    return status.rsplit(": ", 1)[-1]
+
+
+def failure_count(records):
+    """
+    Return the number of failed connects and commands in the records of one attempt.
+    """
+    return sum(1 for rec in records or [] if rec["status"] != "ok")
+
+
+def is_transient(records, policy=DEFAULT_POLICY):
+    """
+    Return True if the failed records of a device show a failure that another attempt may get past.
+    """
+    for rec in records or []:
+        if rec["status"] == "ok":
+            continue
+        name = error_name(rec["status"])
+        if name in TRANSIENT_ERRORS:
+            return True
+        if name in AUTH_ERRORS and policy.retry_auth:
+            return True
+    return False
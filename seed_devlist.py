@@ -13,7 +13,9 @@ __copyright__ = "Copyright (c) 2018 Claudia"
 __license__ = "Python"
 
 import argparse
+import concurrent.futures
 import utils
+import facts_cache
 
 # import add_2env
 import os
@@ -32,8 +34,9 @@ def get_list_of_nei(cdp_list, root_dev, level=0, debug=False):
 
     # For every neighbor found weed out connections to self and connections to upstream root device
     for line in cdp_list:
-        print(line)
-        print(line.keys())
+        if debug:
+            print(line)
+            print(line.keys())
 
         tmpd = dict()
 
@@ -53,6 +56,168 @@ def get_list_of_nei(cdp_list, root_dev, level=0, debug=False):
     return devices_dict
 
 
+def normalize_hostname(name):
+    """
+    Reduce a hostname or CDP Device ID to a comparable key (short name, lower case, no serial suffix).
+    """
+    name = re.sub(r"\(.*\)$", "", name.strip())
+    return name.split(".")[0].lower()
+
+
+def make_dev_obj(ip, usr, pwd, sec):
+    """
+    Build the Netmiko login dictionary for a device being crawled.
+    """
+    dev_obj = {}
+    dev_obj.update({"ip": ip.strip()})
+    dev_obj.update({"username": usr})
+    dev_obj.update({"password": pwd})
+    dev_obj.update({"secret": sec})
+    dev_obj.update({"port": arguments.port})
+    dev_obj.update({"device_type": arguments.device_type})
+    return dev_obj
+
+
+def get_hostname(dev_obj):
+    """
+    Return the configured hostname of a device, falling back to its IP if it cannot be determined.
+    """
+    resp_hostname = utils.conn_and_get_output_parsed(
+        dev_obj, "show run | inc hostname "
+    )
+
+    if resp_hostname and isinstance(resp_hostname, str):
+        _ = resp_hostname.split(" ")
+        hostname = _[1].strip()
+        if "\n" in hostname:
+            _ = hostname.split("\n")
+            hostname = _[0].strip()
+    else:
+        hostname = dev_obj["ip"]
+    return hostname
+
+
+def discover_device(dev_obj):
+    """
+    Log into a device once and return its hostname, platform and CDP switch neighbors.
+
+    Returns None if the device does not respond.  The three parsed commands share one
+    pooled SSH session.
+    """
+    ip = dev_obj["ip"]
+    print(f"\n========== GET NEIGHBORS FROM DEVICE {ip} ==========")
+
+    # Hostname and platform rarely change, so reuse them from the facts cache while fresh
+    facts = (
+        facts_cache.lookup(ip, ttl=arguments.facts_ttl) if arguments.facts_ttl else None
+    )
+    if facts and facts.get("hostname") and facts.get("platform"):
+        hostname = facts["hostname"]
+        platform = facts["platform"]
+        print(f"Device hostname is {hostname} (cached)")
+    else:
+        hostname = get_hostname(dev_obj)
+        print(f"Device hostname is {hostname}")
+
+        resp = utils.conn_and_get_output_parsed(dev_obj, "show inventory")
+        if not resp or isinstance(resp, str):
+            print(f"ERROR!  No response from device {ip}!")
+            return None
+
+        if resp[0]["pid"]:
+            platform = resp[0]["pid"]
+        else:
+            platform = resp[0]["descr"]
+
+    resp = utils.conn_and_get_output_parsed(dev_obj, "show cdp neighbors detail")
+    if not resp and facts:
+        # Cached facts but the device did not answer this time
+        print(f"ERROR!  No response from device {ip}!")
+        return None
+    if isinstance(resp, str):
+        if "not enabled" in resp:
+            print(f"CDP is not enabled on device {ip}.")
+        neighbors = {}
+    else:
+        neighbors = get_list_of_nei(resp, ip, level=0, debug=False)
+
+    # This device will not be queried again, so release its session now
+    utils.close_session(dev_obj)
+
+    # The device_type is only the -t default here, not verified on the device, so it is not
+    # cached where it would override the device_rules classification of later runs
+    facts_cache.remember(ip, hostname=hostname, platform=platform)
+
+    return {"hostname": hostname, "platform": platform, "neighbors": neighbors}
+
+
+def crawl_cdp(seed_device, usr, pwd, sec, max_depth=0, workers=10):
+    """
+    Breadth-first CDP crawl of the topology starting at seed_device.
+
+    Every device in a layer is queried in parallel (at most workers at a time).  Devices are
+    tracked in a visited set keyed on both hostname and management IP so loops and redundant
+    links are only followed once.  The seed is depth 0; devices at depth max_depth are listed
+    but not queried.  A max_depth of 0 crawls the whole topology.
+
+    Returns the seed hostname (or None if the seed did not respond) and a dictionary of
+    devices keyed like get_list_of_nei, with the seed keyed by seed_device.
+    """
+    visited_names = set()
+    visited_ips = {seed_device.strip()}
+    cdp_dict = {}
+    seed_hostname = None
+
+    # Each layer entry is (device key, mgmt ip)
+    layer = [(seed_device, seed_device.strip())]
+    depth = 0
+
+    while layer:
+        print(
+            f"\n========== CDP DEPTH {depth}: QUERYING {len(layer)} DEVICES =========="
+        )
+        dev_objs = [make_dev_obj(ip, usr, pwd, sec) for _, ip in layer]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            facts_list = list(executor.map(discover_device, dev_objs))
+
+        next_layer = []
+        for (key, ip), facts in zip(layer, facts_list):
+            if facts is None:
+                continue
+
+            visited_names.add(normalize_hostname(facts["hostname"]))
+            if key == seed_device:
+                seed_hostname = facts["hostname"]
+                cdp_dict.update(
+                    {
+                        seed_device: {
+                            "fqdn": seed_device,
+                            "mgmt_ip": seed_device,
+                            "platform": facts["platform"],
+                        }
+                    }
+                )
+
+            for nei_key, nei in facts["neighbors"].items():
+                name = normalize_hostname(nei["fqdn"])
+                mgmt_ip = nei["mgmt_ip"]
+                if name in visited_names or (mgmt_ip and mgmt_ip in visited_ips):
+                    continue
+                visited_names.add(name)
+                if mgmt_ip:
+                    visited_ips.add(mgmt_ip)
+                nei.update({"depth": depth + 1})
+                cdp_dict.update({nei_key: nei})
+
+                if mgmt_ip and (max_depth == 0 or depth + 1 < max_depth):
+                    next_layer.append((nei_key, mgmt_ip))
+
+        layer = next_layer
+        depth += 1
+
+    return seed_hostname, cdp_dict
+
+
 def main():
 
     datestamp = datetime.date.today()
@@ -66,7 +231,7 @@ def main():
     # print(add_2env.check_env("INET_USR"))
 
     # SAVING OUTPUT
-    # utils.sub_dir(arguments.output_subdir)
+    utils.sub_dir(arguments.output_subdir)
 
     if arguments.mfa:
         # User is using MFA
@@ -77,7 +242,7 @@ def main():
         mfa = f"{pwd}{mfa_code.strip()}"
         sec = sec
     elif arguments.credentials:
-        # uname, passwd, enable = utils.get_creds()
+        uname, passwd, enable = utils.get_creds()
         usr = uname
         mfa = passwd
         sec = enable
@@ -95,101 +260,69 @@ def main():
     #     # sensitive option to true so that the password can be typed in securely without echo to the screen
     #     add_2env.set_env(desc="Password", sensitive=True)
 
-    # Create login object for netmiko
-    seed_device = "10.1.10.66"
-    dev_obj = {}
-    dev_obj.update({"ip": seed_device.strip()})
-    dev_obj.update({"username": "cisco"})
-    dev_obj.update({"password": "cisco"})
-    dev_obj.update({"secret": "cisco"})
-    dev_obj.update({"port": arguments.port})
-    dev_obj.update({"device_type": "cisco_ios"})
-
-    root_dict = {}
-    print(f"\n========== GET NEIGHBORS FROM SEED DEVICE {seed_device} ==========")
+    seed_device = arguments.seed_device.strip()
+    print(f"\n========== CRAWL CDP NEIGHBORS FROM SEED DEVICE {seed_device} ==========")
 
-    resp_hostname = utils.conn_and_get_output_parsed(
-        dev_obj, "show run | inc hostname "
+    hostname, cdp_dict = crawl_cdp(
+        seed_device,
+        usr,
+        mfa,
+        sec,
+        max_depth=arguments.max_depth,
+        workers=arguments.workers,
     )
 
-    if resp_hostname:
-        _ = resp_hostname.split(" ")
-        hostname = _[1].strip()
-        if "\n" in hostname:
-            _ = hostname.split("\n")
-            hostname = _[0].strip()
-    else:
-        hostname = seed_device.strip()
-    print(f"Device hostname is {hostname}")
-
-    resp = utils.conn_and_get_output_parsed(dev_obj, "show inventory")
-
-    if resp:
-        if resp[0]["pid"]:
-            platform = resp[0]["pid"]
-        else:
-            platform = resp[0]["descr"]
+    # Log out of any devices still holding a pooled session
+    utils.close_sessions()
+    facts_cache.save_facts()
 
-        root_dict.update(
-            {"fqdn": seed_device, "mgmt_ip": seed_device, "platform": platform}
-        )
-
-        resp = utils.conn_and_get_output_parsed(dev_obj, "show cdp neighbors detail")
-        if type(resp) == str and "not enabled" in resp:
-            print(f"CDP is not enabled on device. Aborting process.")
-            exit()
-
-        cdp_dict = get_list_of_nei(resp, seed_device, level=0, debug=False)
-
-        # print(json.dumps(cdp_dict, indent=4))
-
-        cdp_dict.update({seed_device: root_dict})
-
-        # The keys build the json dev list used by the other scripts in this repo
-        list_of_devices = list(cdp_dict.keys())
+    if hostname is None:
+        print(f"ERROR!  No response from device! Aborting Execution.")
+        exit()
 
-        json_dir = arguments.output_subdir
-        json_fn = f"{hostname.strip()}_auto_devlist.json"
-        json_fp = os.path.join(os.getcwd(), json_dir, json_fn)
+    # The keys build the json dev list used by the other scripts in this repo
+    list_of_devices = list(cdp_dict.keys())
 
-        # print(f"Saving {hostname} output to: {json_fp}")
+    json_dir = arguments.output_subdir
+    json_fn = f"{hostname.strip()}_auto_devlist.json"
+    json_fp = os.path.join(os.getcwd(), json_dir, json_fn)
 
-        # Save a list of devices
-        # utils.save_json(json_fp, list_of_devices, debug=False)
+    print(f"Saving {hostname} output to: {json_fp}")
 
-        # Save the JSON data
-        # json_dict = os.path.join(os.getcwd(), json_dir, f"{hostname}_auto_devdict.json")
-        # utils.save_json(json_dict, cdp_dict, debug=False)
+    # Save a list of devices
+    utils.save_json(json_fp, list_of_devices, debug=False)
 
-        text_fn = f"{hostname}_devlist.txt"
-        text_fp = os.path.join(os.getcwd(), json_dir, text_fn)
-        # with open(text_fp, 'w') as txt_file:
-        #     for line in list_of_devices:
-        #         print(f"- {line}")
-        #         txt_file.write(f"{line.strip()}\n")
+    # Save the JSON data
+    json_dict = os.path.join(os.getcwd(), json_dir, f"{hostname}_auto_devdict.json")
+    utils.save_json(json_dict, cdp_dict, debug=False)
 
-        # table = Table(title=f"\n\nL3 Device {arguments.seed_device} CDP Switch Neighbor Summary Table")
+    text_fn = f"{hostname}_devlist.txt"
+    text_fp = os.path.join(os.getcwd(), json_dir, text_fn)
+    with open(text_fp, "w") as txt_file:
+        for line in list_of_devices:
+            print(f"- {line}")
+            txt_file.write(f"{line.strip()}\n")
 
-        # table.add_column("Device", justify="right", style="cyan", no_wrap=True)
-        # table.add_column("FQDN", style="green")
-        # table.add_column("MGMT IP", justify="right", style="blue")
-        # table.add_column("Platform", justify="right", style="yellow")
+    # table = Table(title=f"\n\nL3 Device {arguments.seed_device} CDP Switch Neighbor Summary Table")
 
-        # cdp_count = 0
-        # for k,v in cdp_dict.items():
-        #     table.add_row(k, v['fqdn'], v['mgmt_ip'], v['platform'])
-        #     cdp_count += 1
+    # table.add_column("Device", justify="right", style="cyan", no_wrap=True)
+    # table.add_column("FQDN", style="green")
+    # table.add_column("MGMT IP", justify="right", style="blue")
+    # table.add_column("Platform", justify="right", style="yellow")
 
-        # console = Console()
-        # console.print(table)
-        # console.print(f"Total: {cdp_count}")
+    # cdp_count = 0
+    # for k,v in cdp_dict.items():
+    #     table.add_row(k, v['fqdn'], v['mgmt_ip'], v['platform'])
+    #     cdp_count += 1
 
-        # print(f"\nDevice Text file saved at {text_fp}\n")
-        # print(f"\nDevice JSON List saved at {json_fp}\n")
-        # print(f"\nDevice JSON Dictionary file saved at {json_dict}\n\n")
+    # console = Console()
+    # console.print(table)
+    # console.print(f"Total: {cdp_count}")
 
-    else:
-        print(f"ERROR!  No response from device! Aborting Execution.")
+    print(f"\nTotal devices discovered: {len(list_of_devices)}")
+    print(f"\nDevice Text file saved at {text_fp}\n")
+    print(f"\nDevice JSON List saved at {json_fp}\n")
+    print(f"\nDevice JSON Dictionary file saved at {json_dict}\n\n")
 
 
 # Standard call to the main() function.
@@ -199,10 +332,12 @@ if __name__ == "__main__":
         epilog="Usage: ' python seed_devlist.py layer3_device.example.com' ",
     )
 
-    # parser.add_argument(
-    #     "seed_device",
-    #     help="Enter FQDN or IP of Seed or Root device to start CDP based device discovery",
-    # )
+    parser.add_argument(
+        "seed_device",
+        nargs="?",
+        help="Enter FQDN or IP of Seed or Root device to start CDP based device discovery",
+        default="10.1.10.66",
+    )
 
     parser.add_argument(
         "-t",
@@ -246,5 +381,30 @@ if __name__ == "__main__":
         help="Set Credentials via Command Line interactively",
         default="",
     )
+    parser.add_argument(
+        "-d",
+        "--max_depth",
+        "--max-depth",
+        action="store",
+        type=int,
+        help="Number of CDP hops to crawl from the seed device. Default: 0 (crawl the whole topology)",
+        default=0,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        action="store",
+        type=int,
+        help="Number of devices in each CDP layer to query in parallel. Default: 10",
+        default=10,
+    )
+    parser.add_argument(
+        "--facts_ttl",
+        action="store",
+        type=int,
+        help="Seconds to reuse cached hostnames and platforms instead of asking each device again "
+        f"(see facts_cache.py); 0 always asks. Default: {facts_cache.DEFAULT_TTL}",
+        default=facts_cache.DEFAULT_TTL,
+    )
     arguments = parser.parse_args()
     main()
@@ -0,0 +1,327 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: session_limits
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Login rate and concurrent session limits.
+#
+# Hundreds of simultaneous logins overload TACACS+/RADIUS servers and lock
+# accounts, and WLCs only allow a few concurrent admin sessions.  Every SSH login
+# (utils.connect_timed, the asyncio engine and SSHDetect) first takes a slot:
+#
+#   - a token from a token bucket refilled at logins_per_second (up to login_burst)
+#   - one of max_sessions concurrent sessions across the whole process
+#   - one session from every matching group, each with its own max_sessions.  A
+#     group matches a device by a regex on its name or IP (a site), a subnet, or
+#     a regex on its device_type.
+#
+# The slot is held until the session is disconnected.  A login that finds no free
+# slot first closes the longest idle session in the utils session pool holding one
+# of the semaphores it needs, and otherwise waits until a slot is released.  The
+# limits are read from
+# session_limits.yml next to this module (SESSION_LIMITS overrides the path;
+# set it to "none" to turn the limits off).
+
+import asyncio
+import collections
+import ipaddress
+import os
+import re
+import threading
+import time
+
+import utils
+
+LIMITS_FN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "session_limits.yml"
+)
+
+# Seconds between attempts to take a slot while waiting in the asyncio engine
+POLL_INTERVAL = 0.05
+
+Group = collections.namedtuple(
+    "Group", ["name", "pattern", "subnet", "device_type", "semaphore"]
+)
+
+_lock = threading.Lock()
+# Notified whenever a SessionSlot is released so waiting logins can try again
+_slot_freed = threading.Condition()
+_state = {
+    "path": None,
+    "loaded": False,
+    "bucket": None,
+    "sessions": None,
+    "groups": [],
+    "slot_timeout": None,
+}
+
+
+class TokenBucket:
+    """
+    Token bucket allowing rate logins per second on average with bursts of up to capacity.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_take(self):
+        """
+        Take a token if one is available and return 0, otherwise return the seconds until the next token.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.last) * self.rate
+            )
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class SessionSlot:
+    """
+    The concurrent session semaphores held for one session.  release() may be called more than once.
+    """
+
+    def __init__(self, semaphores):
+        self.semaphores = semaphores
+        self.lock = threading.Lock()
+
+    def release(self):
+        with self.lock:
+            semaphores, self.semaphores = self.semaphores, []
+        for semaphore in reversed(semaphores):
+            semaphore.release()
+        if semaphores:
+            with _slot_freed:
+                _slot_freed.notify_all()
+
+
+def limits_path():
+    """
+    Return the path of the limits file: SESSION_LIMITS or session_limits.yml next to this module.
+    """
+    return os.environ.get("SESSION_LIMITS") or LIMITS_FN
+
+
+def load_limits(path=None, reload=False):
+    """
+    Read the limits file on first use and build the token bucket and session semaphores.
+
+    Without a limits file (or with SESSION_LIMITS=none) no limits apply.
+    """
+    path = path or limits_path()
+    with _lock:
+        if _state["loaded"] and _state["path"] == path and not reload:
+            return
+        config = {}
+        if path.lower() != "none" and os.path.isfile(path):
+            config = utils.read_yaml(path) or {}
+
+        groups = []
+        for i, entry in enumerate(config.get("groups") or []):
+            name = entry.get("name", f"group_{i + 1}")
+            if not entry.get("max_sessions"):
+                raise ValueError(f"Group {name} in {path} has no max_sessions")
+            groups.append(
+                Group(
+                    name,
+                    *match_criteria(entry),
+                    threading.BoundedSemaphore(int(entry["max_sessions"])),
+                )
+            )
+
+        rate = config.get("logins_per_second")
+        max_sessions = config.get("max_sessions")
+        _state.update(
+            {
+                "path": path,
+                "loaded": True,
+                "bucket": (
+                    TokenBucket(rate, config.get("login_burst")) if rate else None
+                ),
+                "sessions": (
+                    threading.BoundedSemaphore(int(max_sessions))
+                    if max_sessions
+                    else None
+                ),
+                "groups": groups,
+                "slot_timeout": config.get("slot_timeout"),
+            }
+        )
+
+
+def match_criteria(entry):
+    """
+    Return the compiled (pattern, subnet, device_type) criteria of a group entry, None for those not set.
+    """
+    return (
+        re.compile(entry["pattern"], re.IGNORECASE) if entry.get("pattern") else None,
+        (
+            ipaddress.ip_network(entry["subnet"], strict=False)
+            if entry.get("subnet")
+            else None
+        ),
+        (
+            re.compile(entry["device_type"], re.IGNORECASE)
+            if entry.get("device_type")
+            else None
+        ),
+    )
+
+
+def group_matches(group, dev_dict):
+    """
+    Return True if a device matches every criterion (name/IP pattern, subnet, device_type) a group sets.
+    """
+    device = str(dev_dict.get("ip", ""))
+    if group.pattern is not None and not group.pattern.search(device):
+        return False
+    if group.device_type is not None and not group.device_type.search(
+        dev_dict.get("device_type") or ""
+    ):
+        return False
+    if group.subnet is not None:
+        try:
+            if ipaddress.ip_address(device) not in group.subnet:
+                return False
+        except ValueError:
+            # A name rather than an IP address cannot be placed in a subnet
+            return False
+    return True
+
+
+def matching_groups(dev_dict):
+    """
+    Return the names of the groups whose session limits apply to a device.
+    """
+    load_limits()
+    return [g.name for g in _state["groups"] if group_matches(g, dev_dict)]
+
+
+def needed_semaphores(dev_dict):
+    """
+    Return the session semaphores a device needs: those of its groups, then the global cap.
+    """
+    semaphores = [g.semaphore for g in _state["groups"] if group_matches(g, dev_dict)]
+    if _state["sessions"] is not None:
+        semaphores.append(_state["sessions"])
+    return semaphores
+
+
+def try_acquire(dev_dict):
+    """
+    Take every session semaphore a device needs without waiting, returning a SessionSlot or None.
+
+    Semaphores are taken in a fixed order (groups, then the global cap) and all are given back
+    if one is not available, so waiting sessions never deadlock.
+    """
+    taken = []
+    for semaphore in needed_semaphores(dev_dict):
+        if not semaphore.acquire(blocking=False):
+            for held in reversed(taken):
+                held.release()
+            return None
+        taken.append(semaphore)
+    return SessionSlot(taken)
+
+
+def slot_timeout_error(dev_dict, timeout):
+    return TimeoutError(
+        f"No session slot for {dev_dict.get('ip')} within {timeout}s "
+        f"(groups: {', '.join(matching_groups(dev_dict)) or 'none'})"
+    )
+
+
+def acquire_or_evict(dev_dict):
+    """
+    Take a slot for a device, closing idle pooled sessions that hold the semaphores it needs.
+
+    Returns the SessionSlot, or None once no idle session is left to close.
+    """
+    while True:
+        slot = try_acquire(dev_dict)
+        if slot is not None:
+            return slot
+        net_connect = utils.pop_idle_session(needed_semaphores(dev_dict))
+        if net_connect is None:
+            return None
+        utils.disconnect_quietly(net_connect)
+
+
+def acquire(dev_dict, timeout=None):
+    """
+    Wait for a session slot and a login token for a device and return the SessionSlot.
+
+    Release the slot when the session is disconnected.  Raises TimeoutError if no slot is free
+    within timeout seconds (default: slot_timeout from the limits file, or wait forever).
+    """
+    load_limits()
+    timeout = timeout if timeout is not None else _state["slot_timeout"]
+    deadline = time.monotonic() + timeout if timeout else None
+    slot = acquire_or_evict(dev_dict)
+    while slot is None:
+        with _slot_freed:
+            # Try again under the condition so a release cannot slip in before the wait
+            slot = try_acquire(dev_dict)
+            if slot is not None:
+                break
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise slot_timeout_error(dev_dict, timeout)
+            _slot_freed.wait(remaining)
+        slot = acquire_or_evict(dev_dict)
+
+    if _state["bucket"] is not None:
+        while True:
+            wait = _state["bucket"].try_take()
+            if not wait:
+                break
+            time.sleep(wait)
+    return slot
+
+
+async def acquire_async(dev_dict, timeout=None):
+    """
+    Wait for a session slot and a login token without blocking the event loop.  See acquire.
+    """
+    load_limits()
+    timeout = timeout if timeout is not None else _state["slot_timeout"]
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        slot = try_acquire(dev_dict)
+        if slot is not None:
+            break
+        net_connect = utils.pop_idle_session(needed_semaphores(dev_dict))
+        if net_connect is not None:
+            # Disconnecting blocks, so close the idle pooled session off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, utils.disconnect_quietly, net_connect
+            )
+            continue
+        if deadline is not None and time.monotonic() > deadline:
+            raise slot_timeout_error(dev_dict, timeout)
+        await asyncio.sleep(POLL_INTERVAL)
+
+    if _state["bucket"] is not None:
+        while True:
+            wait = _state["bucket"].try_take()
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+    return slot
@@ -0,0 +1,276 @@
+#!/usr/bin/python -tt
+# Project: eia_cisco_client_discovery
+# Filename: textfsm_cache
+# claudia
+# PyCharm
+
+from __future__ import absolute_import, division, print_function
+
+__author__ = "Claudia de Luna (claudia@eianow.com)"
+__version__ = ": 1.0 $"
+__date__ = "10/18/26"
+__copyright__ = "Copyright (c) 2018 Claudia"
+__license__ = "Python"
+
+# Process-wide cache of compiled TextFSM templates.
+#
+# Netmiko's use_textfsm=True builds a new CliTable and re-reads and compiles the
+# template file on every send_command call.  Here the ntc-templates index is
+# resolved once per (platform, command) and each template is compiled once per
+# process, then reused for every device.
+#
+# The compiled index and templates can optionally be saved to a pickle file so a
+# new process starts warm.  Set NET_TEXTFSM_CACHE to the path of that file (it is
+# loaded on first use and rewritten at exit when new templates were compiled) or
+# build it ahead of time:
+#
+#     python textfsm_cache.py -b textfsm_cache.pickle
+
+import argparse
+import atexit
+import os
+import pickle
+import threading
+
+import textfsm
+from textfsm import clitable
+from netmiko.utilities import get_structured_data_textfsm, get_template_dir
+
+CACHE_VERSION = 1
+
+# Template directory used when NET_TEXTFSM is not set and ntc-templates has been
+# cloned into the repository (see README)
+LOCAL_TEMPLATE_DIR = "./ntc-templates/ntc_templates/templates"
+
+_lock = threading.Lock()
+_state = {
+    "template_dir": None,
+    "index": None,
+    # (platform, command) -> template string from the index (or None if no match)
+    "lookups": {},
+    # template file name -> (threading.Lock, compiled TextFSM)
+    "fsms": {},
+    "dirty": False,
+}
+
+
+def resolve_template_dir():
+    """
+    Return the TextFSM template directory: NET_TEXTFSM, then a local ntc-templates clone, then the installed package.
+    """
+    if not os.environ.get("NET_TEXTFSM") and os.path.isfile(
+        os.path.join(LOCAL_TEMPLATE_DIR, "index")
+    ):
+        return os.path.abspath(LOCAL_TEMPLATE_DIR)
+    return get_template_dir()
+
+
+def index_mtime(template_dir):
+    """
+    Return the modification time of the index file, used to invalidate the on-disk cache.
+    """
+    return os.path.getmtime(os.path.join(template_dir, "index"))
+
+
+def load_state():
+    """
+    Resolve the template directory and load the on-disk cache on first use.  Call with _lock held.
+    """
+    if _state["template_dir"] is None:
+        _state["template_dir"] = resolve_template_dir()
+        _load_disk_cache(_state["template_dir"])
+
+
+def get_index():
+    """
+    Return the parsed ntc-templates index, reading it on first use.  Call with _lock held.
+
+    The index is only needed for (platform, command) pairs not already in the cache.
+    """
+    load_state()
+    if _state["index"] is None:
+        _state["index"] = clitable.CliTable("index", _state["template_dir"]).index
+    return _state["index"]
+
+
+def lookup_template(platform, command):
+    """
+    Return the template string for a platform and command from the index, or None if there is no template.
+    """
+    key = (platform, command.strip())
+    with _lock:
+        load_state()
+        if key not in _state["lookups"]:
+            index = get_index()
+            row_idx = index.GetRowMatch({"Platform": platform, "Command": key[1]})
+            _state["lookups"][key] = (
+                index.index[row_idx]["Template"] if row_idx else None
+            )
+            _state["dirty"] = True
+        return _state["lookups"][key]
+
+
+def get_fsm(template):
+    """
+    Return the (lock, compiled TextFSM) pair for a template file name, compiling it on first use.
+    """
+    with _lock:
+        load_state()
+        entry = _state["fsms"].get(template)
+        if entry is None:
+            with open(os.path.join(_state["template_dir"], template)) as f:
+                entry = (threading.Lock(), textfsm.TextFSM(f))
+            _state["fsms"][template] = entry
+            _state["dirty"] = True
+        return entry
+
+
+def parse_output(platform, command, raw_output):
+    """
+    Parse raw show command output with the cached TextFSM template for the platform and command.
+
+    Returns a list of dictionaries with lower case keys, like Netmiko's use_textfsm=True, or the
+    raw output unchanged when there is no template or nothing was parsed.
+    """
+    template = lookup_template(platform, command)
+    if template is None:
+        # Netmiko retries IOS-XE output with the IOS templates
+        if "cisco_xe" in platform:
+            return parse_output("cisco_ios", command, raw_output)
+        return raw_output
+
+    if ":" in template:
+        # Multi-template entries are merged by CliTable; these are rare so let Netmiko handle them
+        return get_structured_data_textfsm(
+            raw_output, platform=platform, command=command.strip()
+        )
+
+    fsm_lock, fsm = get_fsm(template)
+    with fsm_lock:
+        fsm.Reset()
+        records = fsm.ParseText(raw_output)
+        header = [h.lower() for h in fsm.header]
+
+    if not records:
+        return raw_output
+    return [dict(zip(header, record)) for record in records]
+
+
+def _load_disk_cache(template_dir, debug=False):
+    """
+    Load the pickled lookups and templates from NET_TEXTFSM_CACHE if it matches template_dir.  Call with _lock held.
+    """
+    path = os.environ.get("NET_TEXTFSM_CACHE")
+    if not path or not os.path.isfile(path):
+        return
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        print(f"Ignoring unreadable TextFSM cache {path}: {e}")
+        return
+
+    if (
+        data.get("version") != CACHE_VERSION
+        or data.get("template_dir") != template_dir
+        or data.get("index_mtime") != index_mtime(template_dir)
+    ):
+        if debug:
+            print(f"TextFSM cache {path} is stale; rebuilding")
+        return
+
+    _state["lookups"].update(data["lookups"])
+    for template, fsm in data["fsms"].items():
+        _state["fsms"].setdefault(template, (threading.Lock(), fsm))
+
+
+def save_cache(path, debug=False):
+    """
+    Write the index lookups and compiled templates to a pickle file for fast cold starts.
+    """
+    with _lock:
+        load_state()
+        data = {
+            "version": CACHE_VERSION,
+            "template_dir": _state["template_dir"],
+            "index_mtime": index_mtime(_state["template_dir"]),
+            "lookups": dict(_state["lookups"]),
+            "fsms": {t: fsm for t, (_, fsm) in _state["fsms"].items()},
+        }
+        _state["dirty"] = False
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    if debug:
+        print(f"Saved {len(data['fsms'])} compiled TextFSM templates to {path}")
+
+
+def precompile_all(platforms=None, debug=False):
+    """
+    Compile every single-template entry in the index, optionally limited to a list of platforms.
+    """
+    with _lock:
+        index = get_index()
+        rows = [(r["Template"], r["Platform"]) for r in index.index]
+
+    for template, platform in rows:
+        if ":" in template:
+            continue
+        if platforms and not any(p in platform for p in platforms):
+            continue
+        try:
+            get_fsm(template)
+        except (OSError, textfsm.TextFSMTemplateError) as e:
+            print(f"Cannot compile template {template}: {e}")
+    if debug:
+        print(f"Compiled {len(_state['fsms'])} TextFSM templates")
+
+
+def _save_on_exit():
+    """
+    Rewrite the NET_TEXTFSM_CACHE file at exit if new templates were compiled during this run.
+    """
+    path = os.environ.get("NET_TEXTFSM_CACHE")
+    if path and _state["dirty"]:
+        try:
+            save_cache(path)
+        except OSError as e:
+            print(f"Cannot save TextFSM cache {path}: {e}")
+
+
+atexit.register(_save_on_exit)
+
+
+def main():
+    """
+    Precompile the TextFSM templates and save them to the on-disk cache file.
+    """
+    platforms = arguments.platforms.split(",") if arguments.platforms else None
+    precompile_all(platforms, debug=True)
+    save_cache(arguments.build, debug=True)
+
+
+# Standard call to the main() function.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Precompile ntc-templates TextFSM templates into a cache file",
+        epilog="Usage: ' python textfsm_cache.py -b textfsm_cache.pickle -p cisco_ios,cisco_nxos' ",
+    )
+    parser.add_argument(
+        "-b",
+        "--build",
+        help="Path of the cache file to write. Default: textfsm_cache.pickle",
+        action="store",
+        default="textfsm_cache.pickle",
+    )
+    parser.add_argument(
+        "-p",
+        "--platforms",
+        help="Comma separated list of platforms to precompile. Default: all platforms in the index",
+        action="store",
+        default="",
+    )
+    arguments = parser.parse_args()
+    main()
@@ -13,15 +13,49 @@ __copyright__ = "Copyright (c) 2018 Claudia"
 __license__ = "Python"
 
 import argparse
+import datetime
+import atexit
+import threading
+import time
 import yaml
 import netmiko
-from netmiko.exceptions import NetmikoTimeoutException, NetmikoAuthenticationException
+from netmiko.exceptions import (
+    NetmikoTimeoutException,
+    NetmikoAuthenticationException,
+    ReadTimeout,
+)
 import json
 import os
 import re
 import dotenv
 import getpass
+import gzip
+import socket
+import paramiko
 import add_2env
+import textfsm_cache
+import facts_cache
+import device_rules
+import jump_hosts
+import session_limits
+
+# Authenticated Netmiko sessions kept open for reuse, keyed by (ip, port, username).
+# Each entry is a list of (net_connect, last_used) tuples for idle sessions.
+SESSION_IDLE_TIMEOUT = 300
+_session_pool = {}
+_session_pool_lock = threading.Lock()
+
+# Session limit slots held by open Netmiko sessions, keyed by id(net_connect) and given
+# back by disconnect_quietly.  Idle pooled sessions keep their slot, so a login that
+# finds no free slot closes one of them first (see session_limits)
+_session_slots = {}
+
+# Consecutive command failures after which a session is given up on
+MAX_CONSECUTIVE_FAILURES = 3
+
+# Seconds to wait for each command's prompt in pipelined mode, and between channel reads
+PIPELINE_READ_TIMEOUT = 60
+PIPELINE_POLL_INTERVAL = 0.01
 
 
 def replace_space(text, debug=False):
@@ -116,12 +150,170 @@ def save_json(filename, data, debug=False):
 def write_txt(filename, data):
     """
     Write raw text data to the specified file and return the file handle.
+
+    Files are written as UTF-8 so the byte offsets recorded in the run manifest are exact.
     """
-    with open(filename, "w") as f:
+    with open(filename, "w", encoding="utf-8") as f:
         f.write(data)
     return f
 
 
+class GzipSectionWriter:
+    """
+    File-like writer for compressed transcripts with per-command random access.
+
+    Each "!--- cmd" section is written as its own gzip member, so the .gz file is still a
+    normal gzip file (zcat or gzip.open return the whole transcript) but any one section can
+    be decompressed on its own.  On close() a <file>.gz.idx JSON index is written with the
+    command, compressed offset/length and uncompressed offset/length of every section.
+    """
+
+    def __init__(self, filename, compresslevel=6):
+        self.path = filename if filename.endswith(".gz") else f"{filename}.gz"
+        self.compresslevel = compresslevel
+        self.sections = []
+        self.raw_offset = 0
+        # Opened on first use so the writer can also be created just to look up its path
+        self.f = None
+
+    def open(self):
+        if self.f is None:
+            self.f = open(self.path, "wb")
+        return self.f
+
+    def write(self, section):
+        data = section.encode("utf-8")
+        member = gzip.compress(data, compresslevel=self.compresslevel, mtime=0)
+        match = SECTION_REGEX.search(section)
+        self.sections.append(
+            {
+                "command": match.group(1) if match else None,
+                "offset": self.open().tell(),
+                "length": len(member),
+                "raw_offset": self.raw_offset,
+                "raw_length": len(data),
+            }
+        )
+        self.f.write(member)
+        self.raw_offset += len(data)
+
+    def flush(self):
+        self.open().flush()
+
+    def close(self):
+        # A writer that was never written to leaves no files behind
+        if self.f is not None and not self.f.closed:
+            self.f.close()
+            # Compact JSON keeps the index small next to the compressed transcript
+            with open(f"{self.path}.idx", "w", encoding="utf-8") as f:
+                json.dump({"sections": self.sections}, f, separators=(",", ":"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_gzip_writer(filename):
+    """
+    Return a GzipSectionWriter for the transcript that would have been written to filename.
+    """
+    return GzipSectionWriter(filename)
+
+
+def read_gzip_index(path):
+    """
+    Return the list of section entries from the index of a compressed transcript.
+    """
+    return read_json(f"{path}.idx")["sections"]
+
+
+def read_compressed_section(path, command):
+    """
+    Return the text of the first section for command (e.g. "show ip arp") in a compressed transcript, or None.
+
+    The section is found in the .idx file, so no manifest is needed, and only its gzip member is decompressed.
+    """
+    command = " ".join(command.split())
+    for entry in read_gzip_index(path):
+        if entry["command"] and " ".join(entry["command"].split()) == command:
+            with open(path, "rb") as f:
+                f.seek(entry["offset"])
+                return gzip.decompress(f.read(entry["length"])).decode(
+                    "utf-8", errors="ignore"
+                )
+    return None
+
+
+def read_gzip_range(path, raw_offset, raw_length):
+    """
+    Return the uncompressed bytes raw_offset to raw_offset + raw_length of a compressed transcript, as text.
+
+    Used by the manifest, whose offsets always refer to the uncompressed transcript.
+    """
+    chunks = []
+    end = raw_offset + raw_length
+    with open(path, "rb") as f:
+        for entry in read_gzip_index(path):
+            start = entry["raw_offset"]
+            stop = start + entry["raw_length"]
+            if stop > raw_offset and start < end:
+                f.seek(entry["offset"])
+                data = gzip.decompress(f.read(entry["length"]))
+                chunks.append(data[max(0, raw_offset - start) : end - start])
+            if stop >= end:
+                break
+    return b"".join(chunks).decode("utf-8", errors="ignore")
+
+
+def read_transcript(filename):
+    """
+    Return the full text of a saved transcript, plain (.txt) or compressed (.txt.gz).
+    """
+    if filename.endswith(".gz"):
+        with gzip.open(filename, "rt", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    with open(filename, encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+# Section header written before each command in a saved transcript: "!--- show version "
+SECTION_REGEX = re.compile(r"^!--- (.*) $", re.MULTILINE)
+
+# Saved transcript file names: <device>_<YYYY-MM-DD_HH-MM-SS>[_note].txt[.gz]
+TRANSCRIPT_FN_REGEX = re.compile(
+    r"^(?P<device>.+?)_(?P<timestamp>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})(_(?P<note>.*))?\.txt(\.gz)?$"
+)
+
+
+def split_transcript(text):
+    """
+    Split a saved show command transcript into a list of (cmd, output) tuples using the "!--- cmd" headers.
+    """
+    sections = []
+    matches = list(SECTION_REGEX.finditer(text))
+    for i, match in enumerate(matches):
+        start = match.end() + 1
+        if i + 1 < len(matches):
+            # Each header is preceded by the newline that ends the previous section
+            end = matches[i + 1].start() - 1
+        else:
+            end = len(text)
+        sections.append((match.group(1), text[start:end]))
+    return sections
+
+
+def parse_transcript_filename(filename):
+    """
+    Return a dictionary with the device, timestamp and note encoded in a transcript file name, or None.
+    """
+    match = TRANSCRIPT_FN_REGEX.match(os.path.basename(filename))
+    if not match:
+        return None
+    return match.groupdict()
+
+
 def sub_dir(output_subdir, debug=False):
     """
     Create the output_subdir directory if it does not exist, optionally logging when it already exists.
@@ -135,29 +327,305 @@ def sub_dir(output_subdir, debug=False):
             print("Directory ", output_subdir, " Already Exists")
 
 
-def conn_and_get_output(dev_dict, cmd_list, debug=False):
+def record_section(records, cmd, section, elapsed, status="ok"):
     """
-    Connect to a network device with Netmiko and run a list of show commands, returning the concatenated output.
+    Append a manifest record for one command section to records (if records is a list).
+
+    Sections are written back to back, so each offset follows on from the previous record.
+    Offsets and lengths are in bytes of the UTF-8 encoded transcript.
     """
+    if records is None:
+        return
+    if records:
+        offset = records[-1]["offset"] + records[-1]["length"]
+    else:
+        offset = 0
+    records.append(
+        {
+            "command": cmd,
+            "offset": offset,
+            "length": len(section.encode("utf-8")),
+            "duration": round(elapsed, 3),
+            "status": status,
+        }
+    )
+
+
+def connect_timed(dev_dict, timings=None):
+    """
+    Open a Netmiko connection to a device, timing the TCP connect, SSH authentication and prompt detection.
+
+    The duration of each phase in seconds is stored in timings (if it is a dict) under tcp_connect,
+    auth and prompt as soon as that phase completes, so a failure shows which phase it happened in.
+    For a device behind a jump host (see jump_hosts), tcp_connect is the time to open its channel.
+
+    A login rate and concurrent session slot is taken first (see session_limits) and held until
+    the session is closed with disconnect_quietly.
+    """
+    if timings is None:
+        timings = {}
+    dev_dict = dict(dev_dict)
+    slot = session_limits.acquire(dev_dict)
+
+    start = time.perf_counter()
+    own_sock = "sock" not in dev_dict
+    try:
+        if own_sock:
+            # Devices behind a jump host get a channel multiplexed over its shared transport
+            dev_dict["sock"] = jump_hosts.open_channel(
+                dev_dict, timeout=dev_dict.get("conn_timeout", 10)
+            )
+        if own_sock and dev_dict["sock"] is None:
+            # Open the TCP socket ourselves so the connect time is separate from the SSH handshake
+            dev_dict["sock"] = socket.create_connection(
+                (dev_dict["ip"], int(dev_dict.get("port", 22))),
+                timeout=dev_dict.get("conn_timeout", 10),
+            )
+    except Exception:
+        slot.release()
+        raise
+    timings["tcp_connect"] = round(time.perf_counter() - start, 3)
 
-    response = ""
     try:
-        net_connect = netmiko.ConnectHandler(**dev_dict)
-    except (NetmikoTimeoutException, NetmikoAuthenticationException) as e:
+        start = time.perf_counter()
+        net_connect = netmiko.ConnectHandler(**dev_dict, auto_connect=False)
+        net_connect._modify_connection_params()
+        net_connect.establish_connection()
+        timings["auth"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        net_connect._try_session_preparation()
+        timings["prompt"] = round(time.perf_counter() - start, 3)
+    except Exception:
+        if own_sock:
+            dev_dict["sock"].close()
+        slot.release()
+        raise
+    with _session_pool_lock:
+        _session_slots[id(net_connect)] = slot
+    return net_connect
+
+
+def iter_show_output(
+    dev_dict,
+    cmd_list,
+    debug=False,
+    records=None,
+    timings=None,
+    max_failures=MAX_CONSECUTIVE_FAILURES,
+    pipeline=0,
+):
+    """
+    Connect to a network device with Netmiko and yield a (cmd, section) tuple as each show command finishes.
+
+    Each section is the "!--- cmd" header followed by the command output, exactly as it appears in
+    the saved transcript.  Nothing is yielded if the device cannot be reached.  If records is a
+    list, a record with the offset, length, duration and status of every command is appended to it.
+    If timings is a dict, the connection phase durations are added to it (see connect_timed).
+    After max_failures consecutive command failures the session is assumed dead and the
+    remaining commands are not sent (None never gives up).  With pipeline > 1 the commands
+    are sent pipeline at a time (see iter_pipelined_output).
+    """
+
+    start = time.perf_counter()
+    try:
+        net_connect = connect_timed(dev_dict, timings)
+    except (
+        OSError,
+        paramiko.SSHException,
+        NetmikoTimeoutException,
+        NetmikoAuthenticationException,
+    ) as e:
         print(f"Cannot connect to device {dev_dict['ip']}.")
         print(e)
+        status = f"connect failed: {type(e).__name__}"
+        record_section(records, None, "", time.perf_counter() - start, status)
+        return
 
-    for cmd in cmd_list:
+    failures = 0
+    try:
+        if pipeline and pipeline > 1:
+            yield from iter_pipelined_output(
+                net_connect, dev_dict, cmd_list, pipeline, debug, records
+            )
+            return
+        for cmd in cmd_list:
+            if max_failures and failures >= max_failures:
+                print(
+                    f"Giving up on device {dev_dict['ip']} after {failures} failed commands."
+                )
+                break
+            if debug:
+                print(f"--- Show Command: {cmd}")
+            start = time.perf_counter()
+            try:
+                output = net_connect.send_command(cmd.strip())
+            except Exception as e:
+                print(f"Cannot execute command {cmd} on device {dev_dict['ip']}.")
+                status = f"failed: {type(e).__name__}"
+                record_section(records, cmd, "", time.perf_counter() - start, status)
+                failures += 1
+                continue
+            failures = 0
+            section = f"\n!--- {cmd} \n{output}"
+            record_section(records, cmd, section, time.perf_counter() - start)
+            yield cmd, section
+    finally:
+        disconnect_quietly(net_connect)
+
+
+def iter_pipelined_output(
+    net_connect,
+    dev_dict,
+    cmd_list,
+    batch_size,
+    debug=False,
+    records=None,
+    read_timeout=PIPELINE_READ_TIMEOUT,
+):
+    """
+    Write show commands to the channel batch_size at a time and yield a (cmd, section) tuple as each prompt comes back.
+
+    Instead of waiting a round trip for every command, the whole batch is sent at once and the
+    returned stream is split into sections at the prompts.  A prompt only ends a section when it
+    is followed by the echo of the next command of the batch (or ends the stream after the last
+    one), so output lines that happen to start with the hostname do not split a section.  The
+    session state is unknown after a read timeout, so the remaining commands are not sent.
+    """
+    prompt = f"(?<=[\r\n]){re.escape(net_connect.base_prompt)}[^\r\n#>]{{0,20}}[>#]"
+    for i in range(0, len(cmd_list), batch_size):
+        batch = cmd_list[i : i + batch_size]
         if debug:
-            print(f"--- Show Command: {cmd}")
-        try:
-            output = net_connect.send_command(cmd.strip())
-            response += f"\n!--- {cmd} \n{output}"
-        except Exception as e:
-            print(f"Cannot execute command {cmd} on device {dev_dict['ip']}.")
-            # continue
+            print(f"--- Show Commands: {', '.join(batch)}")
+        net_connect.write_channel(
+            "".join(f"{cmd.strip()}{net_connect.RETURN}" for cmd in batch)
+        )
+        buffer = ""
+        start = time.perf_counter()
+        for n, cmd in enumerate(batch):
+            if n + 1 < len(batch):
+                end = re.compile(f"{prompt}(?=[ ]*{re.escape(batch[n + 1].strip())})")
+            else:
+                end = re.compile(f"{prompt}\\s*$")
+            match = end.search(buffer)
+            while match is None:
+                if time.perf_counter() - start > read_timeout:
+                    print(f"Cannot execute command {cmd} on device {dev_dict['ip']}.")
+                    status = f"failed: {ReadTimeout.__name__}"
+                    record_section(
+                        records, cmd, "", time.perf_counter() - start, status
+                    )
+                    return
+                data = net_connect.read_channel()
+                if data:
+                    buffer += data
+                    match = end.search(buffer)
+                else:
+                    time.sleep(PIPELINE_POLL_INTERVAL)
+
+            raw, buffer = buffer[: match.start()], buffer[match.end() :]
+            # Drop anything left over before the echoed command line, the echo itself and the
+            # start of the prompt line, like send_command
+            lines = net_connect.normalize_linefeeds(raw).split("\n")[:-1]
+            while lines and not lines[0].strip():
+                lines = lines[1:]
+            if lines and cmd.strip() in lines[0]:
+                lines = lines[1:]
+            output = "\n".join(lines)
+            section = f"\n!--- {cmd} \n{output}"
+            record_section(records, cmd, section, time.perf_counter() - start)
+            start = time.perf_counter()
+            yield cmd, section
+
+
+def conn_and_get_output(
+    dev_dict,
+    cmd_list,
+    debug=False,
+    records=None,
+    timings=None,
+    max_failures=MAX_CONSECUTIVE_FAILURES,
+    pipeline=0,
+):
+    """
+    Connect to a network device with Netmiko and run a list of show commands, returning the concatenated output.
+    """
+
+    return "".join(
+        section
+        for _, section in iter_show_output(
+            dev_dict,
+            cmd_list,
+            debug,
+            records=records,
+            timings=timings,
+            max_failures=max_failures,
+            pipeline=pipeline,
+        )
+    )
 
-    return response
+
+def stream_output(
+    dev_dict,
+    cmd_list,
+    writer,
+    debug=False,
+    records=None,
+    timings=None,
+    max_failures=MAX_CONSECUTIVE_FAILURES,
+    pipeline=0,
+):
+    """
+    Run a list of show commands and hand each section to writer as soon as it finishes.
+
+    writer is an open text file or any object with write() and flush() methods, such as a
+    dedup_store.DedupWriter.  Returns the number of characters written.
+    """
+
+    written = 0
+    for _, section in iter_show_output(
+        dev_dict,
+        cmd_list,
+        debug,
+        records=records,
+        timings=timings,
+        max_failures=max_failures,
+        pipeline=pipeline,
+    ):
+        writer.write(section)
+        writer.flush()
+        written += len(section)
+    return written
+
+
+def stream_output_to_file(
+    dev_dict,
+    cmd_list,
+    filename,
+    debug=False,
+    records=None,
+    timings=None,
+    max_failures=MAX_CONSECUTIVE_FAILURES,
+    pipeline=0,
+):
+    """
+    Run a list of show commands and append each section to filename as soon as it finishes.
+
+    The file is flushed after every command so memory use stays flat regardless of the
+    transcript size.  Returns the number of characters written.
+    """
+
+    with open(filename, "w", encoding="utf-8") as f:
+        return stream_output(
+            dev_dict,
+            cmd_list,
+            f,
+            debug,
+            records=records,
+            timings=timings,
+            max_failures=max_failures,
+            pipeline=pipeline,
+        )
 
 
 def load_environment(debug=False):
@@ -243,50 +711,27 @@ def create_devobj_from_json_list(dev):
         'secret' : sec,
         'port' : 8181
     }
+
+    The device_type and credentials come from the ordered rules in device_rules.yml
+    (see device_rules.py), which are loaded and compiled once per process.
     """
-    dotenv.load_dotenv()
-    dev_obj = {}
-    # print(os.environ)
-    usr = os.environ["NET_USR"]
-    pwd = os.environ["NET_PWD"]
-
-    core_dev = r"(ar|as|ds|cs){1}\d\d"
-    dev_obj.update({"ip": dev.strip()})
-    dev_obj.update({"username": usr})
-    dev_obj.update({"password": pwd})
-    dev_obj.update({"secret": pwd})
-    dev_obj.update({"port": 22})
-    if re.search(core_dev, dev, re.IGNORECASE):
-        dev_obj.update({"device_type": "cisco_ios"})
-    elif re.search(r"-srv\d\d", dev, re.IGNORECASE):
-        dev_obj.update({"device_type": "cisco_nxos"})
-    elif re.search(r"-sp\d\d", dev, re.IGNORECASE):
-        dev_obj.update({"device_type": "silverpeak"})
-    elif re.search(r"-wlc\d\d", dev, re.IGNORECASE):
-        dev_obj.update({"device_type": "cisco_wlc"})
-    elif re.search("10.1.10.109", dev, re.IGNORECASE):
-        dev_obj.update({"device_type": "cisco_wlc"})
-        dev_obj.update({"username": "adminro"})
-        dev_obj.update({"password": "Readonly1"})
-        dev_obj.update({"secret": "Readonly1"})
-        # dev_obj.update({'username': 'admin'})
-        # dev_obj.update({'password': 'A123m!'})
-        # dev_obj.update({'secret': 'A123m!'})
-    elif re.search("10.1.10.", dev, re.IGNORECASE) or re.search(
-        "1.1.1.", dev, re.IGNORECASE
-    ):
-        dev_obj.update({"device_type": "cisco_ios"})
-    elif re.search("10.", dev, re.IGNORECASE):
-        dev_obj.update({"device_type": "cisco_ios"})
-    else:
-        dev_obj.update({"device_type": "unknown"})
+    dev_obj = device_rules.build_dev_obj(dev)
+
+    # A device type learned on an earlier run takes precedence over the hostname guess
+    device_type = facts_cache.verified_device_type(facts_cache.lookup(dev))
+    if device_type:
+        dev_obj.update({"device_type": device_type})
 
     return dev_obj
 
 
-def get_show_cmd_parsed(dev, shcmd, save_2json=False, level=0, debug=False):
+def get_show_cmd_parsed(
+    dev, shcmd, save_2json=False, level=0, debug=False, export=None
+):
     """
     Run a parsed show command on a device, optionally saving JSON output, with simple verbosity control via level.
+
+    If export is an export_rows.RowExporter, the parsed rows are also appended to its file for the command.
     """
 
     if level == 0:
@@ -298,7 +743,7 @@ def get_show_cmd_parsed(dev, shcmd, save_2json=False, level=0, debug=False):
 
     outdir = "local"
 
-    devdict = create_cat_devobj_from_json_list(dev)
+    devdict = create_devobj_from_json_list(dev)
 
     if debug:
         print(f"devdict is {devdict}")
@@ -317,38 +762,192 @@ def get_show_cmd_parsed(dev, shcmd, save_2json=False, level=0, debug=False):
         print(f"Saving JSON to {output_dir}")
         with open(output_dir, "w") as f:
             json.dump(resp, f, indent=4)
+    if export is not None:
+        export.add(
+            dev,
+            shcmd,
+            resp,
+            timestamp=datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+            device_type=devdict["device_type"],
+        )
     # else:
     #     print(f"\n\n\txxx Skip Device {dev} Type {devdict['device_type']}")
 
     return resp
 
 
-def conn_and_get_output_parsed(dev_dict, cmd, debug=False):
+def session_key(dev_dict):
     """
-    Connect to a device, run a single show command using TextFSM parsing, and return the structured output.
+    Return the (ip, port, username) key used to pool sessions for a device dictionary.
     """
+    return dev_dict["ip"], str(dev_dict.get("port", 22)), dev_dict.get("username", "")
 
-    os.environ["NET_TEXTFSM"] = "./ntc-templates/ntc_templates/templates"
+
+def evict_idle_sessions(max_idle=SESSION_IDLE_TIMEOUT, debug=False):
+    """
+    Disconnect and remove pooled sessions that have been idle for longer than max_idle seconds.
+    """
+    now = time.monotonic()
+    expired = []
+    with _session_pool_lock:
+        for key, idle_list in list(_session_pool.items()):
+            keep = []
+            for net_connect, last_used in idle_list:
+                if now - last_used > max_idle:
+                    expired.append((key, net_connect))
+                else:
+                    keep.append((net_connect, last_used))
+            if keep:
+                _session_pool[key] = keep
+            else:
+                del _session_pool[key]
+
+    for key, net_connect in expired:
+        if debug:
+            print(f"Closing idle session to {key[0]}")
+        disconnect_quietly(net_connect)
+
+
+def pop_idle_session(semaphores):
+    """
+    Remove and return the longest idle pooled session holding one of the session limit semaphores, or None.
+
+    The caller disconnects it with disconnect_quietly to free its slot for another login.
+    """
+    with _session_pool_lock:
+        oldest = None
+        for key, idle_list in _session_pool.items():
+            for i, (net_connect, last_used) in enumerate(idle_list):
+                slot = _session_slots.get(id(net_connect))
+                if slot is None or not any(s in semaphores for s in slot.semaphores):
+                    continue
+                if oldest is None or last_used < oldest[2]:
+                    oldest = (key, i, last_used)
+        if oldest is None:
+            return None
+        key, i, _ = oldest
+        net_connect = _session_pool[key].pop(i)[0]
+        if not _session_pool[key]:
+            del _session_pool[key]
+    return net_connect
+
+
+def disconnect_quietly(net_connect):
+    """
+    Disconnect a Netmiko session, ignoring errors from sessions that are already dead, and free its session slot.
+    """
+    try:
+        net_connect.disconnect()
+    except Exception:
+        pass
+    with _session_pool_lock:
+        slot = _session_slots.pop(id(net_connect), None)
+    if slot is not None:
+        slot.release()
+
+
+def get_session(dev_dict, debug=False):
+    """
+    Return a live Netmiko session for the device, reusing an idle pooled session when one passes a health check.
+
+    The session is checked out exclusively; hand it back with release_session() when done.
+    Raises the Netmiko connection exceptions (or OSError) if a new session cannot be established.
+    """
+    evict_idle_sessions(debug=debug)
+    key = session_key(dev_dict)
+
+    while True:
+        with _session_pool_lock:
+            idle_list = _session_pool.get(key, [])
+            net_connect = idle_list.pop()[0] if idle_list else None
+        if net_connect is None:
+            break
+        if net_connect.is_alive():
+            if debug:
+                print(f"Reusing session to {dev_dict['ip']}")
+            return net_connect
+        disconnect_quietly(net_connect)
+
+    if debug:
+        print(f"Opening new session to {dev_dict['ip']}")
+    return connect_timed(dev_dict)
+
+
+def release_session(dev_dict, net_connect):
+    """
+    Return a session obtained from get_session() to the pool so the next command can reuse it.
+    """
+    key = session_key(dev_dict)
+    with _session_pool_lock:
+        _session_pool.setdefault(key, []).append((net_connect, time.monotonic()))
+
+
+def close_session(dev_dict):
+    """
+    Disconnect the idle pooled sessions for one device once it will not be queried again.
+    """
+    with _session_pool_lock:
+        idle_list = _session_pool.pop(session_key(dev_dict), [])
+    for net_connect, _ in idle_list:
+        disconnect_quietly(net_connect)
+
+
+def close_sessions():
+    """
+    Disconnect every pooled session.  Registered to run automatically at interpreter exit.
+    """
+    with _session_pool_lock:
+        idle = [nc for idle_list in _session_pool.values() for nc, _ in idle_list]
+        _session_pool.clear()
+    for net_connect in idle:
+        disconnect_quietly(net_connect)
+
+
+atexit.register(close_sessions)
+
+
+def conn_and_get_output_parsed(dev_dict, cmd, debug=False, reuse_session=True):
+    """
+    Connect to a device, run a single show command using TextFSM parsing, and return the structured output.
+
+    With reuse_session (the default) the authenticated session is kept in a pool keyed by
+    (ip, port, username) so repeated commands against the same device share one login.
+    Parsing uses the process-wide compiled template cache in textfsm_cache.
+    """
 
     response = ""
     output = ""
 
     try:
-        net_connect = netmiko.ConnectHandler(**dev_dict)
-    except NetmikoTimeoutException as e:
+        if reuse_session:
+            net_connect = get_session(dev_dict, debug=debug)
+        else:
+            net_connect = connect_timed(dev_dict)
+    except (NetmikoTimeoutException, OSError, paramiko.SSHException) as e:
         print(f"Cannot connect to device {dev_dict['ip']}. Connection Timed Out!")
         print(e)
+        return output
     except NetmikoAuthenticationException as e:
         print(f"Cannot connect to device {dev_dict['ip']}. Authentication Exception!")
         print(e)
+        return output
 
     if debug:
         print(f"--- Show Command: {cmd}")
     try:
-        output = net_connect.send_command(cmd.strip(), use_textfsm=True)
+        output = net_connect.send_command(cmd.strip())
+        output = textfsm_cache.parse_output(dev_dict["device_type"], cmd, output)
     except Exception as e:
         print(f"Cannot execute command {cmd} on device {dev_dict['ip']}.")
         print(f"{e}\n")
+        # Do not hand a session in an unknown state back to the pool
+        disconnect_quietly(net_connect)
+        return output
+
+    if reuse_session:
+        release_session(dev_dict, net_connect)
+    else:
+        disconnect_quietly(net_connect)
 
     return output
 